@@ -1,12 +1,584 @@
+import errno
+import io
+import os
+import queue
+import random
+import selectors
+import threading
 import time
 from struct import *
 from socket import *
 import sys
+from congestion import *
+from timerwheel import *
+from ringbuffer import *
+from compressor import *
 
 # Header format
 header_format = "!IIHH"
+# Precompiled header format, used on the per-packet paths
+header_struct = Struct(header_format)
+# Value of the range handshake option, offset and file size
+range_struct = Struct("!QQ")
+
+# Whether the platform supports scatter-gather sends (not available on Windows)
+HAS_SENDMSG = hasattr(socket, "sendmsg")
+
+# Linux UDP segmentation offload socket options (linux/udp.h), the socket module does not export them
+UDP_SEGMENT = 103
+UDP_GRO = 104
+# Largest number of packets in one segmentation offload send (UDP_MAX_SEGMENTS of the kernel)
+GSO_MAX_SEGMENTS = 64
+# Largest number of bytes in one segmentation offload send, the packets must fit in a single 64 KiB UDP datagram
+GSO_MAX_BYTES = 65000
+# Size of the receive buffer for the coalesced datagrams of a GRO socket
+GRO_BUFFER_SIZE = 65535
+
+# Default payload size of a data packet, fills a 1500 byte Ethernet frame after the IP, UDP and DRTP headers
+DEFAULT_MSS = 1460
+# Largest payload size, a 65507 byte UDP payload minus the 12 byte header
+MAX_MSS = 65495
+# Size of the largest packet with the default payload size: 12 byte header + 1460 bytes of payload
+MAX_PACKET_SIZE = 1472
+# Size of the IPv4 and UDP headers in front of a DRTP packet
+IP_UDP_HEADER_SIZE = 28
+# Link MTUs tried in turn by path MTU probing when the probe SYN of a larger size is not answered
+MTU_CANDIDATES = (9000, 4352, 1500, 1280)
+
+# Linux path MTU discovery socket options (linux/in.h), the socket module does not export them
+IP_MTU_DISCOVER = 10
+IP_MTU = 14
+IP_PMTUDISC_WANT = 1    # The default, set DF but fragment locally once the path MTU is known to be smaller
+IP_PMTUDISC_DO = 2      # Always set DF and never fragment, a send larger than the known path MTU fails
+# Number of pre-allocated receive buffers in a ReceiveBufferPool, also the number of datagrams the event loop
+# reads from a socket in one go
+RECV_POOL_SLOTS = 64
+# Number of packets a sender sends in one go before the event loop handles the ACKs that arrived meanwhile
+SEND_BURST = 16
+
+# Retransmission timeout defaults in seconds
+INITIAL_RTO = 0.5
+MIN_RTO = 0.01
+MAX_RTO = 10.0
+
+# Receive window in packets advertised in ACK and SYN-ACK packets
+ADVERTISED_WINDOW = 64
+
+# Number of bytes the receiver buffers before handing them to the output sink
+WRITE_BUFFER_SIZE = 64 * 1024
+# Number of bytes handed to the output sink that may wait to be written, the receive window shrinks as it fills
+WRITE_BACKLOG_SIZE = 4 * 1024 * 1024
+# Largest value of the 16 bit window field of the header
+MAX_WINDOW = 65535
+# Number of duplicate ACKs that signal a lost packet and trigger a fast retransmit
+DUPACK_THRESHOLD = 3
+# Number of in-order data packets a receiver acknowledges with one cumulative ACK
+ACK_EVERY = 2
+# Number of seconds a receiver delays the ACK of fewer than ACK_EVERY in-order packets
+ACK_DELAY = 0.002
+
+# Number of seconds before an unanswered SYN is resent
+SYN_TIMEOUT = 0.5
+# Number of times an unanswered FIN is resent before the sender gives up
+FIN_RETRIES = 5
+# Number of seconds a server keeps an idle session, finished sessions are kept as long to acknowledge a resent FIN
+SESSION_TIMEOUT = 30.0
+# Largest number of data packets per parity packet, the group size has to fit in its handshake option
+MAX_FEC_GROUP = 255
+
+# Handshake options, carried in the payload of SYN and SYN-ACK packets
+OPTION_SACK = 1     # Selective acknowledgements, ACKs carry a bitmap of the packets received above ack_num
+OPTION_CONNECTION_ID = 2    # 32 bit id chosen by the sender, its packets carry it in their ack field
+OPTION_RANGE = 3    # Byte offset of the data in the file and size of the whole file, 64 bits each, for striped transfers
+OPTION_MSS = 4      # Largest payload size in bytes, 16 bits, the SYN-ACK answers with the size both sides agreed on
+OPTION_FEC = 5      # Number of data packets per parity packet of forward error correction, 8 bits
+OPTION_COMPRESSION = 6      # Id of the codec the data is compressed with in blocks, 8 bits, see compressor.py
+OPTION_DELTA = 7    # Block size of a delta transfer in bytes, 32 bits, the SYN-ACK answers with the size agreed on
+OPTION_RESUME = 8   # Size of the file in bytes, 64 bits, the SYN-ACK answers with the offset the receiver has the
+                    # file up to, 64 bits, and the digest of the data before it, see checkpoint.py
+OPTION_BATCH = 9    # The data is a batch of files, each with a header of its name, permission bits and size, no value
+OPTION_END = 0      # Ends the options, the rest of the payload is padding, e.g. of a path MTU probe
+
+
+class BufferedSink:
+    """
+    A bounded write buffer in front of a file object or a callback. In-order payloads are appended to the buffer
+    and whenever the buffer reaches buffer_size bytes it is handed to a writer thread, which writes it to the
+    target. At most max_backlog bytes wait for the writer thread, after that flushing blocks until the target has
+    caught up, so the receiver's memory use stays flat regardless of the size of the transfer. The free space of
+    the sink is advertised to the sender as the receive window
+
+    Args:
+        target (file object or callable): Either an object with a write() method or a function taking a bytes-like object
+        buffer_size (int): The number of bytes to buffer before flushing to the target
+        max_backlog (int): The number of flushed bytes that may wait for the writer thread
+        offset (int): The position in the target file to write from, for the stripes of a striped transfer
+        compressed (bool): Whether the data is a stream of compressed blocks, the writer thread decompresses them
+            before writing to the target
+    """
+
+    def __init__(self, target, buffer_size=WRITE_BUFFER_SIZE, max_backlog=WRITE_BACKLOG_SIZE, offset=0,
+                 compressed=False):
+        # Accept both file-like objects and plain callbacks
+        self.write_func = target.write if hasattr(target, "write") else target
+        # Write at the offset with positioned writes, so the file position shared with other writers of the same
+        # file does not matter. Seek instead on platforms without pwrite() and for file objects without a descriptor
+        self.fd = None
+        self.position = offset
+        if offset:
+            if hasattr(os, "pwrite") and hasattr(target, "fileno"):
+                self.fd = target.fileno()
+                self.write_func = self.write_at
+            elif hasattr(target, "seek"):
+                target.seek(offset)
+        self.decoder = None
+        if compressed:
+            self.decoder = BlockDecoder(self.write_func)
+            self.write_func = self.decoder.write
+        self.buffer_size = buffer_size
+        self.max_backlog = max_backlog
+        self.buffer = bytearray()
+        self.bytes_written = 0
+
+        # Blocks waiting for the writer thread and their total size
+        self.blocks = queue.Queue()
+        self.backlog = 0
+        self.backlog_changed = threading.Condition()
+        self.error = None
+        self.writer = None
+        self.start_writer()
+
+    def start_writer(self):
+        """
+        Starts the writer thread, see write_blocks()
+
+        Returns:
+            None
+        """
+        self.writer = threading.Thread(target=self.write_blocks, daemon=True)
+        self.writer.start()
+
+    def write(self, data):
+        """
+        Appends data to the write buffer and flushes it to the target if the buffer is full
+
+        Args:
+            data (bytes): The payload to write
+
+        Returns:
+            None
+        """
+        self.buffer += data
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Hands all buffered data to the writer thread, waits if the backlog is full
+
+        Returns:
+            None
+        """
+        if self.error is not None:
+            raise self.error
+
+        if self.buffer:
+            # Give the current buffer away and start a new one, so the target may keep a reference to it
+            data, self.buffer = self.buffer, bytearray()
+            with self.backlog_changed:
+                while self.backlog and self.backlog + len(data) > self.max_backlog:
+                    self.backlog_changed.wait()
+                self.backlog += len(data)
+            self.blocks.put(data)
+            self.bytes_written += len(data)
+
+    def close(self, complete=True):
+        """
+        Flushes the buffer and waits until the writer thread has written everything to the target
+
+        Args:
+            complete (bool): Whether the stream ended, a compressed block that was cut off is only an error then
+
+        Returns:
+            None
+        """
+        self.flush()
+        self.blocks.put(None)
+        self.writer.join()
+        if self.error is not None:
+            raise self.error
+        # Count the decompressed bytes written to the target, not the bytes received
+        if self.decoder is not None:
+            if complete:
+                self.decoder.close()
+            self.bytes_written = self.decoder.bytes_written
+
+    def free_space(self):
+        """
+        Returns the number of bytes the sink can still take before flushing has to wait for the target
+
+        Returns:
+            int: The free space in bytes
+        """
+        return max(0, self.max_backlog - self.backlog - len(self.buffer))
+
+    def write_at(self, data):
+        """
+        Writes data at the current position of the target file descriptor
+
+        Args:
+            data (bytes-like object): The data to write
+
+        Returns:
+            None
+        """
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(self.fd, view, self.position)
+            self.position += written
+            view = view[written:]
+
+    def write_blocks(self):
+        """
+        Writer thread, writes the flushed blocks to the target in order until close() is called
+
+        Returns:
+            None
+        """
+        while True:
+            data = self.blocks.get()
+            if data is None:
+                return
+
+            # Keep draining the queue after an error so flush() never waits forever, the error is raised by the receiver
+            if self.error is None:
+                try:
+                    self.write_func(data)
+                except Exception as e:
+                    self.error = e
+
+            with self.backlog_changed:
+                self.backlog -= len(data)
+                self.backlog_changed.notify()
+
+
+class RTOEstimator:
+    """
+    Adaptive retransmission timer following RFC 6298. The smoothed RTT and RTT variance are updated from RTT
+    samples, the timeout is doubled on every retransmission timeout and always kept within [min_rto, max_rto].
+    Callers must only take samples from segments that were never retransmitted (Karn's rule)
+
+    Args:
+        initial_rto (float): The timeout in seconds used before the first RTT sample
+        min_rto (float): The lower bound of the timeout in seconds
+        max_rto (float): The upper bound of the timeout in seconds
+    """
+
+    # Smoothing factors and variance multiplier from RFC 6298
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+    K = 4
+    # Clock granularity in seconds
+    GRANULARITY = 0.001
+
+    def __init__(self, initial_rto=INITIAL_RTO, min_rto=MIN_RTO, max_rto=MAX_RTO):
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.srtt = None
+        self.rttvar = None
+        self.timeout = self.clamp(initial_rto)
+
+    def clamp(self, rto):
+        """
+        Keeps the given timeout within the configured bounds
+
+        Args:
+            rto (float): The timeout in seconds
+
+        Returns:
+            float: The clamped timeout in seconds
+        """
+        return max(self.min_rto, min(self.max_rto, rto))
+
+    def sample(self, rtt):
+        """
+        Updates the smoothed RTT, the RTT variance and the timeout with a new RTT measurement
+
+        Args:
+            rtt (float): The measured round trip time in seconds
+
+        Returns:
+            None
+        """
+        if self.srtt is None:
+            # First measurement
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * rtt
+
+        self.timeout = self.clamp(self.srtt + max(self.GRANULARITY, self.K * self.rttvar))
+
+    def backoff(self):
+        """
+        Doubles the timeout after a retransmission timeout
+
+        Returns:
+            None
+        """
+        self.timeout = self.clamp(self.timeout * 2)
+
+    def reset_backoff(self):
+        """
+        Undoes the backoff once an ACK acknowledges new data. Without this the timeout would stay backed off
+        until the next RTT sample, which can take long after a go-back-N retransmission (Karn's rule)
+
+        Returns:
+            None
+        """
+        if self.srtt is not None:
+            self.timeout = self.clamp(self.srtt + max(self.GRANULARITY, self.K * self.rttvar))
+
+
+class ReceiveBufferPool:
+    """
+    A ring of pre-allocated receive buffers that are filled with recvfrom_into, so receiving a packet does not
+    allocate a new bytes object. The payload returned by recv() is a memoryview into one of the buffers and is only
+    valid until the ring wraps around, so it must be copied if it is kept for longer than that
+
+    Args:
+        slots (int): The number of buffers in the ring
+        slot_size (int): The size of each buffer in bytes
+    """
+
+    def __init__(self, slots=RECV_POOL_SLOTS, slot_size=MAX_PACKET_SIZE):
+        self.slot_size = slot_size
+        self.views = [memoryview(bytearray(slot_size)) for _ in range(slots)]
+        self.next_slot = 0
+        self.gro_view = None    # Buffer of recv_coalesced(), allocated on first use
+
+    def recv(self, sock):
+        """
+        Receives a packet into the next free buffer and decodes its header
+
+        Args:
+            sock (socket): The socket to receive the packet from
+
+        Returns:
+            tuple[int, int, int, int, memoryview, tuple]: The sequence number, acknowledgement number, flags and
+            window size from the header, a view of the payload and the address of the sender, None if the
+            datagram is too short to hold a header
+        """
+        view = self.views[self.next_slot]
+        self.next_slot = (self.next_slot + 1) % len(self.views)
+
+        nbytes, addr = sock.recvfrom_into(view)
+        # The buffer still holds the previous packet, a runt datagram must not be decoded from it
+        if nbytes < header_struct.size:
+            return None
+        seq_num, ack_num, flags, win = header_struct.unpack_from(view)
+        return seq_num, ack_num, flags, win, view[12:nbytes], addr
+
+    def recv_coalesced(self, sock):
+        """
+        Receives a datagram on a socket with UDP_GRO enabled, where the kernel may have coalesced several packets
+        of the same size into one buffer, and splits it into its packets. The payloads are views into a single
+        buffer that is reused by the next call, so they must be handled or copied before that
+
+        Args:
+            sock (socket): The socket to receive the packets from
+
+        Returns:
+            list[tuple[int, int, int, int, memoryview, tuple]]: The packets in the form returned by recv()
+        """
+        if self.gro_view is None:
+            self.gro_view = memoryview(bytearray(GRO_BUFFER_SIZE))
+        view = self.gro_view
+
+        nbytes, ancdata, msg_flags, addr = sock.recvmsg_into([view], CMSG_SPACE(4))
+        # The control message tells the size of the coalesced packets, only the last one may be shorter
+        segment_size = nbytes
+        for level, kind, data in ancdata:
+            if level == IPPROTO_UDP and kind == UDP_GRO:
+                segment_size = int.from_bytes(data[:4], sys.byteorder)
+
+        # An empty datagram or a segment size below the header size would split into runt packets
+        packets = []
+        if segment_size < header_struct.size:
+            return packets
+        for offset in range(0, nbytes, segment_size):
+            end = min(offset + segment_size, nbytes)
+            # Only the last segment may be too short to hold a header
+            if end - offset < header_struct.size:
+                break
+            seq_num, ack_num, flags, win = header_struct.unpack_from(view, offset)
+            packets.append((seq_num, ack_num, flags, win, view[offset + 12:end], addr))
+        return packets
+
+
+def open_sink(sink, offset=0, compressed=False, sink_class=BufferedSink):
+    """
+    Wraps the given output sink in a BufferedSink. If no sink is given the data is collected in memory
+
+    Args:
+        sink (file object, callable or None): Where to write the received data
+        offset (int): The position in the sink file to write from
+        compressed (bool): Whether the received data is compressed in blocks
+        sink_class (type): BufferedSink or a subclass, e.g. the AsyncSink of drtp_async.py
+
+    Returns:
+        tuple[BufferedSink, io.BytesIO or None]: The buffered sink and the in-memory buffer if no sink was given
+    """
+    memory = None
+    if sink is None:
+        memory = io.BytesIO()
+        sink = memory
+        offset = 0
+    return sink_class(sink, offset=offset, compressed=compressed), memory
+
+
+def receive_window(buffered_sink, buffered=0, capacity=ADVERTISED_WINDOW, mss=DEFAULT_MSS):
+    """
+    Computes the receive window to advertise to the sender, the number of packets the receiver can take without
+    having to drop them or to block on the output sink
 
-handshake_complete = False
+    Args:
+        buffered_sink (BufferedSink): The sink the received data is written to
+        buffered (int): The number of out-of-order packets held by the receiver, they still have to go to the sink
+        capacity (int): The largest window the receiver can accept, e.g. the size of its reorder buffer
+        mss (int): The payload size of a full packet
+
+    Returns:
+        int: The receive window in packets
+    """
+    free_packets = buffered_sink.free_space() // mss - buffered
+    return max(0, min(capacity, free_packets, MAX_WINDOW))
+
+
+def close_sink(buffered_sink, memory, complete=True):
+    """
+    Flushes and closes the sink and returns the result of the receive function
+
+    Args:
+        buffered_sink (BufferedSink): The sink used by the receive function
+        memory (io.BytesIO or None): The in-memory buffer returned by open_sink
+        complete (bool): Whether the sender's FIN ended the data, False if the transfer was interrupted
+
+    Returns:
+        bytes or int: The received data if it was collected in memory, otherwise the number of bytes written to the sink
+    """
+    buffered_sink.close(complete)
+    return sink_result(buffered_sink, memory)
+
+
+def sink_result(buffered_sink, memory):
+    """
+    Returns the result of the receive function once everything was written to the sink
+
+    Args:
+        buffered_sink (BufferedSink): The sink used by the receive function
+        memory (io.BytesIO or None): The in-memory buffer returned by open_sink
+
+    Returns:
+        bytes or int: The received data if it was collected in memory, otherwise the number of bytes written to the sink
+    """
+    if memory is not None:
+        return memory.getvalue()
+    return buffered_sink.bytes_written
+
+
+def encode_options(options):
+    """
+    Encodes handshake options as a sequence of kind (1 byte), length (1 byte) and value fields
+
+    Args:
+        options (dict[int, bytes]): The option values by option kind
+
+    Returns:
+        bytes: The encoded options, to be used as the payload of a SYN or SYN-ACK packet
+    """
+    encoded = bytearray()
+    for kind, value in options.items():
+        encoded += bytes((kind, len(value))) + value
+    return bytes(encoded)
+
+
+def decode_options(payload):
+    """
+    Decodes the handshake options in the payload of a SYN or SYN-ACK packet
+
+    Args:
+        payload (bytes): The payload of the packet
+
+    Returns:
+        dict[int, bytes]: The option values by option kind
+    """
+    options = {}
+    offset = 0
+    # Every option needs at least its kind and length bytes, a truncated option at the end is ignored
+    while offset + 2 <= len(payload):
+        kind, length = payload[offset], payload[offset + 1]
+        if kind == OPTION_END:
+            break
+        options[kind] = bytes(payload[offset + 2 : offset + 2 + length])
+        offset += 2 + length
+    return options
+
+
+def encode_sack(bits):
+    """
+    Encodes the out-of-order packets received above the cumulative ack_num as the payload of an ACK, where bit i
+    is set if packet ack_num + 1 + i has been received
+
+    Args:
+        bits (int): The bitmap of the out-of-order packets, e.g. from RingBuffer.bitmap()
+
+    Returns:
+        bytes: The bitmap in little-endian byte order, empty if no packets above ack_num have been received
+    """
+    return bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+
+
+def decode_sack(bitmap):
+    """
+    Decodes a bitmap created by encode_sack
+
+    Args:
+        bitmap (bytes): The payload of the ACK packet
+
+    Returns:
+        int: The bitmap, bit i is set if packet ack_num + 1 + i has been received
+    """
+    return int.from_bytes(bitmap, "little")
+
+
+def encode_range(data_range):
+    """
+    Encodes the value of a range option
+
+    Args:
+        data_range (tuple[int, int]): The byte offset of the data in the file and the size of the whole file
+
+    Returns:
+        bytes: The option value
+    """
+    return range_struct.pack(*data_range)
+
+
+def decode_range(value):
+    """
+    Decodes the value of a range option created by encode_range
+
+    Args:
+        value (bytes): The option value
+
+    Returns:
+        tuple[int, int] or None: The byte offset and the size of the whole file, None if the value is malformed
+    """
+    if len(value) != range_struct.size:
+        return None
+    return range_struct.unpack(value)
 
 
 def create_packet(seq_num, ack_num, flags, window_size, data):
@@ -45,512 +617,1820 @@ def parse_header(header):
 
 def parse_flags(flags):
     """
-    Parses the given flags integer and returns a tuple containing the SYN, ACK, and FIN flags
+    Parses the given flags integer and returns a tuple containing the SYN, ACK, FIN and parity flags
 
     Args:
         flags (int): An integer representing the flags of the packet
 
     Returns:
-        tuple: A tuple containing the SYN, ACK, and FIN flags
+        tuple: A tuple containing the SYN, ACK, FIN and parity flags
     """
     syn = (flags >> 3) & 1
     ack = (flags >> 2) & 1
     fin = (flags >> 1) & 1
+    parity = flags & 1
 
-    return syn, ack, fin
+    return syn, ack, fin, parity
 
 
-def send(sock, data, seq_num, addr):
+def send(sock, data, seq_num, addr, connection_id=0):
     """
-    Sends a packet with the given data, sequence number, and address using the provided socket
+    Sends a packet with the given data, sequence number, and address using the provided socket. The header and
+    the payload are handed to the kernel as two separate buffers, so the payload is never copied into a new packet
 
     Args:
         sock (socket): The socket to use for sending the packet
-        data (bytes): The data to include as payload in the packet
+        data (bytes or memoryview): The data to include as payload in the packet
         seq_num (int): The sequence number of the packet
         addr (tuple): A tuple representing the address to send the packet to
+        connection_id (int): The connection id, carried in the ack field since data packets acknowledge nothing
 
     Returns:
         None
     """
-    packet = create_packet(seq_num, 0, 0, 0, data)
-    sock.sendto(packet, addr)
+    header = header_struct.pack(seq_num, connection_id, 0, 0)
+    try:
+        if HAS_SENDMSG:
+            # Scatter-gather send of header and payload
+            sock.sendmsg([header, data], [], 0, addr)
+        else:
+            sock.sendto(header + data, addr)
+    # The send buffer of the non-blocking socket is full, the packet is lost and resent when its timer expires
+    except BlockingIOError:
+        pass
+
+
+def enable_gso(sock):
+    """
+    Checks whether the kernel supports UDP segmentation offload (UDP_SEGMENT, Linux 4.18 and later), which lets
+    send_batch() hand many packets to the kernel in one syscall
 
+    Args:
+        sock (socket): The UDP socket to send with
 
-def send_ack(sock, ack_num, addr):
+    Returns:
+        bool: True if send_batch() can be used on the socket
     """
-    Sends an acknowledgement packet with the given acknowledgement number and address using the provided socket
+    if not HAS_SENDMSG:
+        return False
+    try:
+        # A segment size of 0 leaves the socket unchanged, the option only has to be known
+        sock.setsockopt(IPPROTO_UDP, UDP_SEGMENT, 0)
+    except OSError:
+        return False
+    return True
+
+
+def enable_gro(sock):
+    """
+    Enables UDP receive offload (UDP_GRO, Linux 5.0 and later) on a socket, so the kernel hands packets of the same
+    flow to the receiver coalesced into one buffer. The event loop then reads the socket with recv_coalesced()
 
     Args:
-        sock (socket): The socket to use for sending the acknowledgement packet
-        ack_num (int): The acknowledgement number to include in the packet
-        addr (tuple): A tuple representing the address to send the acknowledgement packet to
+        sock (socket): The UDP socket to receive on
 
     Returns:
-        None
+        bool: True if the option was enabled, False if the kernel does not support it
     """
-    ack_msg = create_packet(0, ack_num, 4, 64, b"")  # flags = 0 1 0 0 = 4 --> ACK flag value
-    sock.sendto(ack_msg, addr)
+    try:
+        sock.setsockopt(IPPROTO_UDP, UDP_GRO, 1)
+    except OSError:
+        return False
+    return True
 
 
-def initiate_handshake(sock, addr):
+def gro_enabled(sock):
     """
-    Initiate the three-way handshake to establish connection with server/receiver host
+    Returns whether UDP_GRO is enabled on a socket
 
-    Arguments:
-        sock (socket): Client/sender socket to be used for communication with the server/receiver host
-        addr (tuple): IP address and port number of the server
+    Args:
+        sock (socket): The UDP socket
 
     Returns:
-        None
+        bool: True if the socket may receive coalesced packets
     """
-    global handshake_complete
+    try:
+        return bool(sock.getsockopt(IPPROTO_UDP, UDP_GRO))
+    # Not a real socket, e.g. a wrapper, or the kernel does not know the option
+    except (OSError, AttributeError):
+        return False
 
-    # If handshake has not yet been completed, establish connection
-    if not handshake_complete:
-        flags = 8  # 1 0 0 0 = SYN flag value
-        syn_packet = create_packet(0, 0, flags, 0, b"")  # Create SYN packet
-        sock.sendto(syn_packet, addr)  # Send SYN packet to destination address
-        print("Sent SYN packet with seq_num", 0)
 
-        while True:
-            # Set a timeout of 0.5 seconds for the socket for receiving SYN-ACK message
-            sock.settimeout(0.5)
-            try:
-                synack_msg, addr = sock.recvfrom(1472)  # Receive message from the destination address
-                header_from_msg = synack_msg[:12]  # Extract the header from the received message
-                seq_num, ack_num, flags, win = parse_header(header_from_msg)  # Parse the header fields
-                syn, ack, fin = parse_flags(flags)  # Parse the flags
-
-                # If received SYN-ACK message is valid, send final ACK packet and complete handshake
-                if syn and ack and not fin:
-                    print("Received SYN-ACK msg with ak_num", ack_num)
-                    flags = 4  # 0 1 0 0 = ACK flag value
-                    ack_packet = create_packet(0, 0, flags, 0, b'')  # Create final ACK packet
-                    sock.sendto(ack_packet, addr)  # Send ACK to destination address
-                    print("Sent final ACK packet with ack_num", 0)
-                    handshake_complete = True  # Set handshake_complete  to True
-                    break
+def send_batch(sock, packets, addr, connection_id=0):
+    """
+    Sends data packets in a single syscall with UDP segmentation offload. The headers and payloads are passed as one
+    scatter-gather list and the kernel splits it into one datagram per packet. Every packet except the last must
+    have a payload of the same size as the first
+
+    Args:
+        sock (socket): The socket to use for sending the packets, enable_gso() must have returned True for it
+        packets (list[tuple[int, bytes or memoryview]]): The sequence number and payload of each packet
+        addr (tuple): A tuple representing the address to send the packets to
+        connection_id (int): The connection id, carried in the ack field since data packets acknowledge nothing
 
-            # If timeout occurs, resend SYN packet
-            except timeout:
-                print(f"Timeout occurred. Resending SYN packet with seq_num 0")
-                flags = 8  # 1 0 0 0 = SYN flag value
-                syn_packet = create_packet(0, 0, flags, 0, b"")  # Create new SYN packet
-                sock.sendto(syn_packet, addr)  # Send new SYN packet to destination address
+    Returns:
+        None
+    """
+    buffers = []
+    for seq_num, data in packets:
+        buffers.append(header_struct.pack(seq_num, connection_id, 0, 0))
+        buffers.append(data)
+    segment_size = header_struct.size + len(packets[0][1])
+    try:
+        sock.sendmsg(buffers, [(IPPROTO_UDP, UDP_SEGMENT, segment_size.to_bytes(2, sys.byteorder))], 0, addr)
+    # The send buffer of the non-blocking socket is full, the packets are lost and resent when their timers expire
+    except BlockingIOError:
+        pass
+
+
+def path_mtu(addr):
+    """
+    Returns the MTU of the path to a host as known to the kernel, the MTU of the outgoing interface unless an ICMP
+    message reported a smaller one. Only supported on Linux
 
+    Args:
+        addr (tuple): IP address and port number of the host
 
-def handle_handshake(sock):
+    Returns:
+        int or None: The path MTU in bytes, None if the kernel does not tell
+    """
+    probe_sock = socket(AF_INET, SOCK_DGRAM)
+    try:
+        # The path MTU is a property of the route, which a connected socket has
+        probe_sock.connect(addr)
+        probe_sock.setsockopt(IPPROTO_IP, IP_MTU_DISCOVER, IP_PMTUDISC_DO)
+        return probe_sock.getsockopt(IPPROTO_IP, IP_MTU)
+    except OSError:
+        return None
+    finally:
+        probe_sock.close()
+
+
+def set_dont_fragment(sock, enabled):
     """
-    Perform the three-way handshake to establish connection with the sender
+    Sets whether every datagram sent from a socket is marked DF (don't fragment), so a datagram larger than the
+    path MTU is dropped instead of fragmented. Only supported on Linux
 
-    Arguments:
-        sock (socket): The receivers socket for communication with the sender
+    Args:
+        sock (socket): The UDP socket
+        enabled (bool): True to always set DF, False to return to the default of fragmenting when needed
 
     Returns:
-        None
+        bool: True if the option was set
     """
-    # Import global variable
-    global handshake_complete
+    try:
+        sock.setsockopt(IPPROTO_IP, IP_MTU_DISCOVER, IP_PMTUDISC_DO if enabled else IP_PMTUDISC_WANT)
+    except (OSError, AttributeError):
+        return False
+    return True
 
-    # If the handshake is not completed yet
-    if not handshake_complete:
-        # Keep looping until the handshake is complete
-        while True:
-            try:
-                # Receive SYN packet from sender
-                syn_packet, addr = sock.recvfrom(1472)
-                header = syn_packet[:12]        # Extract the header from the packet
-                syn, ack, fin = parse_flags(parse_header(header)[2])    # Parse the flags from the header
-
-                # If SYN flag is set and no other flags are set
-                if syn and not ack and not fin:
-                    print("Received SYN msg")
-                    # Create a SYN-ACK packet and send back to sender
-                    syn_ack_msg = create_packet(0, 0, 12, 64, b"")
-                    sock.sendto(syn_ack_msg, addr)
-
-                # If ACK flag is set and no other flags are set
-                elif not syn and ack and not fin:
-                    print("Received final ACK msg")
-                    # Set handshake to True and exit loop
-                    handshake_complete = True
-                    break
 
-            # If any error occurs, print the error and exit the program
-            except Exception as e:
-                print("Error:", e)
-                sys.exit()
+def scale_receive_buffer(sock, mss):
+    """
+    Enlarges the receive buffer of a socket so it holds as many packets of a large payload size as it holds of
+    DEFAULT_MSS. The kernel charges a datagram by the memory it occupies, so the default buffer only holds a dozen
+    jumbo packets and a window of them would overflow it. The size is capped by the kernel's limit
 
+    Args:
+        sock (socket): The UDP socket
+        mss (int): The largest payload size received on the socket
 
-def close_conn(sock, addr, next_seq_num):
+    Returns:
+        None
     """
-    Closes the connection between the client and server
+    if mss <= DEFAULT_MSS:
+        return
+    try:
+        size = sock.getsockopt(SOL_SOCKET, SO_RCVBUF)
+        sock.setsockopt(SOL_SOCKET, SO_RCVBUF, size * mss // DEFAULT_MSS)
+    # Not a real socket, e.g. a wrapper
+    except (OSError, AttributeError):
+        pass
 
-    Arguments:
-        sock (socket): Client/sender socket to close the connection
-        addr (tuple): IP address and port number of the server
-        next_seq_num (int): Current sequence number to continue from
+
+def send_ack(sock, ack_num, addr, seq_num=0, sack=b"", window=ADVERTISED_WINDOW):
+    """
+    Sends an acknowledgement packet with the given acknowledgement number and address using the provided socket
+
+    Args:
+        sock (socket): The socket to use for sending the acknowledgement packet
+        ack_num (int): The acknowledgement number to include in the packet
+        addr (tuple): A tuple representing the address to send the acknowledgement packet to
+        seq_num (int): The sequence number of an out-of-order packet that is acknowledged on its own, 0 if none
+        sack (bytes): SACK bitmap from encode_sack, only sent if SACK was negotiated in the handshake
+        window (int): The receive window in packets to advertise
 
     Returns:
         None
     """
-    flags = 2  # 0 0 1 0 = FIN flag value
-    # Create packet with current sequence number and to destination address
-    fin_msg = create_packet(next_seq_num, 0, flags, 0, b"")
-    sock.sendto(fin_msg, addr)
+    ack_msg = create_packet(seq_num, ack_num, 4, window, sack)  # flags = 0 1 0 0 = 4 --> ACK flag value
+    try:
+        sock.sendto(ack_msg, addr)
+    # The send buffer of the non-blocking socket is full, the next ACK is cumulative and replaces this one
+    except BlockingIOError:
+        pass
 
-    fin_ack_received = False
 
-    while not fin_ack_received:
-        # Set timeout of 0.5 seconds for the socket
-        sock.settimeout(0.5)
 
+
+class EventLoop:
+    """
+    Drives DRTP connections and servers from non-blocking sockets with a selector (epoll on Linux). A ready
+    socket is drained of up to RECV_POOL_SLOTS datagrams in one go, and the senders fill their windows in bursts
+    of SEND_BURST packets, so ACKs are handled as soon as they arrive instead of after the whole window was sent.
+    The endpoints are objects with sock and mss attributes and handle_packet(), next_deadline(), on_timer() and
+    fill_window() methods, i.e. DRTPConnection and DRTPServer
+    """
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.endpoints = []
+        self.recv_buffers = ReceiveBufferPool()
+        self.gro_socks = set()      # The sockets with UDP_GRO enabled, read with recv_coalesced()
+        self.condition = None       # Stops the draining of a socket once it holds, see run_until()
+
+    def add(self, endpoint):
+        """
+        Starts driving an endpoint, its socket is made non-blocking
+
+        Args:
+            endpoint (DRTPConnection or DRTPServer): The endpoint
+
+        Returns:
+            None
+        """
+        endpoint.sock.setblocking(False)
+        # The receive buffers must hold a full packet of the largest payload size of the endpoints
+        packet_size = header_struct.size + endpoint.mss
+        if packet_size > self.recv_buffers.slot_size:
+            self.recv_buffers = ReceiveBufferPool(slot_size=packet_size)
+        scale_receive_buffer(endpoint.sock, endpoint.mss)
+        if gro_enabled(endpoint.sock):
+            self.gro_socks.add(endpoint.sock)
+        self.selector.register(endpoint.sock, selectors.EVENT_READ, endpoint)
+        self.endpoints.append(endpoint)
+
+    def close(self):
+        """
+        Stops driving all endpoints, their sockets are left open
+
+        Returns:
+            None
+        """
+        self.selector.close()
+        self.endpoints = []
+
+    def run_until(self, condition):
+        """
+        Runs the loop until the condition holds. The datagrams that arrive after it holds are left on the socket,
+        e.g. the SYN of the next connection on the same socket
+
+        Args:
+            condition (callable): Returns True once the loop should stop
+
+        Returns:
+            None
+        """
+        self.condition = condition
         try:
-            # Receive message from the destination address
-            fin_ack_msg, addr = sock.recvfrom(1472)
-            header_from_msg = fin_ack_msg[:12]      # Extract the header from the message
-            seq_num, ack_num, flags, win = parse_header(header_from_msg)    # Parse the header
-            syn, ack, fin = parse_flags(flags)      # Parse the flags
-
-            # If only ACK flag is set with the correct ack_num
-            if ack and not syn and not fin and ack_num == next_seq_num:
-                print("Received ACK msg for FIN msg with ack_num", ack_num)
-                # Increment sequence number, close the socket and exit loop
-                next_seq_num += 1
-                sock.close()
-                fin_ack_received = True
+            while not condition():
+                self.run_once()
+        finally:
+            self.condition = None
+
+    def run_forever(self):
+        """
+        Runs the loop until interrupted
+
+        Returns:
+            None
+        """
+        while True:
+            self.run_once()
+
+    def run_once(self):
+        """
+        Sends the next burst of every window, handles the datagrams that arrived and runs the expired timers. The
+        selector only blocks if no sender has more to send, until the earliest timer of the endpoints
+
+        Returns:
+            None
+        """
+        sending = False
+        for endpoint in self.endpoints:
+            if endpoint.fill_window(SEND_BURST):
+                sending = True
+
+        now = time.monotonic()
+        wait = None
+        if sending:
+            wait = 0
+        else:
+            for endpoint in self.endpoints:
+                deadline = endpoint.next_deadline()
+                if deadline is not None and (wait is None or deadline - now < wait):
+                    wait = max(deadline - now, 0)
+
+        for key, events in self.selector.select(wait):
+            self.read(key.fileobj, key.data)
+
+        now = time.monotonic()
+        for endpoint in self.endpoints:
+            deadline = endpoint.next_deadline()
+            if deadline is not None and deadline <= now:
+                endpoint.on_timer()
+
+    def read(self, sock, endpoint):
+        """
+        Hands the datagrams waiting on a socket to its endpoint
+
+        Args:
+            sock (socket): The ready socket
+            endpoint (DRTPConnection or DRTPServer): The endpoint of the socket
+
+        Returns:
+            None
+        """
+        if sock in self.gro_socks:
+            # Every datagram may hold many packets, they are handled before the buffer is reused
+            for _ in range(RECV_POOL_SLOTS):
+                try:
+                    packets = self.recv_buffers.recv_coalesced(sock)
+                except (BlockingIOError, InterruptedError):
+                    return
+                for packet in packets:
+                    endpoint.handle_packet(*packet)
+                if self.condition is not None and self.condition():
+                    return
+            return
+
+        for _ in range(RECV_POOL_SLOTS):
+            try:
+                packet = self.recv_buffers.recv(sock)
+            except (BlockingIOError, InterruptedError):
+                return
+            if packet is not None:
+                endpoint.handle_packet(*packet)
+            if self.condition is not None and self.condition():
                 return
 
-            # If ACK flag is not set and with lower ack_num
-            elif not ack and ack_num < next_seq_num:
-                print("Received duplicate ACK msg with ack_num", ack_num)
-                flags = 2  # Set the flag value to FIN
-                # Create a new packet and resend to the destination address
-                fin_msg = create_packet(next_seq_num, 0, flags, 0, b"")
-                sock.sendto(fin_msg, addr)
-
-        # If a timeout occurs, resend the FIN packet
-        except timeout:
-            print(f"Timeout occurred. Resending FIN msg")
-            sock.sendto(fin_msg, addr)
 
+class DRTPConnection:
+    """
+    The state of one DRTP connection, either the sending or the receiving side of a transfer. Every connection
+    holds its own sequence numbers, windows, retransmission timer and buffers, so any number of connections can
+    run in one process. Incoming packets are passed to handle_packet() and expired timers to on_timer(). The
+    blocking connect(), send(), recv() and close() methods drive both from the socket, an event loop can drive
+    them itself by waiting until next_deadline()
 
-def RECV_SAW(sock, skip_ack):
+    Args:
+        sock (socket): The UDP socket used to send packets to the peer
+        addr (tuple): IP address and port number of the peer, None on the receiving side until the SYN arrives
+        method (str): The reliability method, "SAW", "GBN" or "SR"
+        window_size (int): The sliding window of the sender and the reorder buffer of an SR receiver in packets
+        rto (RTOEstimator): Retransmission timer, a default one is created if None
+        cc (CongestionController): Congestion controller, a fixed window of window_size packets is used if None
+        pacer (Pacer): Spreads the packets evenly over time, packets are sent back to back if None
+        sack (bool): Whether the sender asks the receiver for selective acknowledgements in the handshake
+        sink (file object or callable): Where the receiver writes in-order data, if None the data is kept in memory
+        skip_ack (bool): Whether the receiver ignores the first data packet, for test cases
+        ack_every (int): The number of in-order packets the receiver acknowledges at once, 1 for stop-and-wait
+            and ACK_EVERY for the other methods if None
+        ack_delay (float): The number of seconds the receiver waits for the next in-order packet before it
+            acknowledges fewer than ack_every packets
+        gso (bool): Whether the sender sends the new packets of a burst in one syscall with UDP segmentation
+            offload, if the kernel supports it. Paced senders send every packet on its own
+        mss (int): The largest payload size of a data packet. The sender offers it in the handshake and the
+            receiver answers with the smaller of it and its own, which both sides then use
+        probe_mtu (bool): Whether the sender lowers its offered payload size to what the path to the receiver
+            carries. The SYN is padded to a full packet and sent with DF, a probe that is not answered is retried
+            with the next smaller common MTU
+        fec (int): The number of data packets per parity packet the sender offers in the handshake, 0 for no
+            forward error correction. The packets are split into groups of fec consecutive sequence numbers and
+            the XOR of each group is sent after it, the receiver rebuilds a single lost packet per group from it
+        compression (str): The codec the sender offers to compress the data with in the handshake, a name of
+            CODEC_IDS, or None. The data is compressed in blocks and incompressible blocks are sent raw, the
+            receiver decompresses them as they are written to its sink
+        delta (int): The block size of a delta transfer, see delta.py, 0 for a normal transfer. The sender offers
+            it in the handshake and a receiver with a non-zero delta answers with the smaller of it and its own, the
+            sender finds out from delta whether the receiver accepted
+        resume_size (int): The size of the file the sender offers to resume in the handshake, 0 for a normal
+            transfer. The receiving side takes it from the SYN
+        checkpoint (tuple[int, bytes]): The offset a receiver that resumes transfers has the file up to and the
+            digest of the data before it, None if it does not resume transfers. The receiver answers an offer with
+            it and writes the data from the offset, the sender takes it from the SYN-ACK and is None if the
+            receiver did not accept. A resuming receiver also ends an interrupted transfer when the sender restarts
+            with a new connection id, see interrupt()
+        batch (bool): Whether the data is a batch of files, see batch.py. The sender offers it in the handshake
+            and a receiver with batch accepts, the sender finds out from batch whether the receiver accepted
+        sink_class (type): The buffer the receiver writes the sink through, BufferedSink or a subclass
+        skip_seq_num (bool): Whether the sender skips sending the packet with sequence number 5, for test cases
+        connection_id (int): The id the sender's packets carry so a server can tell its sessions apart, a random
+            id is chosen by connect() if 0, the receiving side takes it from the SYN
+        data_range (tuple[int, int]): The byte offset of the sent data in the file and the size of the whole file,
+            if the data is one stripe of a striped transfer. The sender offers it in the handshake and the receiver
+            writes the data at the offset of its sink file
     """
-    Receives data packets sent by the sender and sends ACK packets to confirm receipt of each packet
 
-    Arguments:
-        sock (socket): Receiver socket for receiving packets from server
-        skip_ack (bool): Whether to skip the first ACK message (for test case)
+    __slots__ = (
+        "sock", "addr", "method", "window_size", "rto", "cc", "pacer", "sack", "sink", "skip_ack", "skip_seq_num",
+        "connection_id", "data_range", "gso", "mss", "probe_mtu", "fec", "compression", "delta",
+        "resume_size", "checkpoint", "batch", "sink_class", "state", "options", "use_sack",
+        # Sending side
+        "rwnd", "next_seq_num", "base_seq_num", "unacked_packets", "send_times", "timers", "dup_acks",
+        "recover_seq_num", "persist_deadline", "pacing_deadline", "control_deadline", "control_retries", "data",
+        "data_offset", "source", "encoder",
+        # Receiving side
+        "expected_seq_num", "out_of_order", "received_data", "memory", "result", "ack_every", "ack_delay",
+        "pending_acks", "ack_deadline", "fec_parity", "interrupted",
+        # Both sides, the XOR of the payloads and of the payload sizes of the current FEC group
+        "fec_xor", "fec_lengths",
+    )
+
+    def __init__(self, sock, addr=None, method="GBN", window_size=5, rto=None, cc=None, pacer=None, sack=False,
+                 sink=None, skip_ack=False, skip_seq_num=False, connection_id=0, data_range=None, ack_every=None,
+                 ack_delay=ACK_DELAY, gso=False, mss=DEFAULT_MSS, probe_mtu=False, fec=0, compression=None,
+                 delta=0, resume_size=0, checkpoint=None, batch=False, sink_class=BufferedSink):
+        self.sock = sock
+        self.addr = addr
+        self.method = method
+        self.window_size = window_size
+        # Use a default retransmission timer and congestion controller if none are given, stop-and-wait has a
+        # single packet in flight
+        self.rto = rto if rto is not None else RTOEstimator()
+        self.cc = cc if cc is not None else FixedWindow(1 if method == "SAW" else window_size)
+        self.pacer = pacer
+        self.sack = sack
+        self.sink = sink
+        self.sink_class = sink_class
+        self.skip_ack = skip_ack
+        self.skip_seq_num = skip_seq_num
+        self.connection_id = connection_id
+        self.data_range = data_range
+        # Fall back to a syscall per packet if the kernel does not support segmentation offload
+        self.gso = gso and pacer is None and enable_gso(sock)
+        if gso and not self.gso:
+            print("UDP segmentation offload is not available, sending every packet on its own")
+        self.mss = mss
+        self.probe_mtu = probe_mtu
+        # Stop-and-wait has a single packet in flight, there is no group to protect
+        self.fec = fec if method != "SAW" else 0
+        self.compression = compression
+        self.delta = delta
+        self.resume_size = resume_size
+        self.checkpoint = checkpoint
+        self.batch = batch
+
+        # "CLOSED", "SYN_SENT", "SYN_RECEIVED", "ESTABLISHED" or "FIN_SENT"
+        self.state = "CLOSED"
+        self.options = {}       # Handshake options both sides agreed on
+        self.use_sack = False
+
+        # Sending side
+        self.rwnd = ADVERTISED_WINDOW   # The last window advertised by the receiver
+        self.next_seq_num = 1
+        self.base_seq_num = 1
+        self.unacked_packets = RingBuffer()     # Data of the unacked packets, keyed by sequence number
+        self.send_times = {}        # Send times of the packets that were not retransmitted (Karn's rule), 0 is the SYN
+        self.timers = TimerWheel()  # Retransmission timer of every unacked packet
+        self.dup_acks = 0           # Number of ACKs in a row that did not acknowledge new packets
+        self.recover_seq_num = 0    # Highest packet sent when the last loss was detected, ends fast recovery
+        self.persist_deadline = 0.0     # When the next window probe may be sent while the receiver's window is zero
+        self.pacing_deadline = None     # When the pacer lets the sender go on, None if the pacer does not hold it back
+        self.control_deadline = None    # Retransmission deadline of the SYN or the FIN
+        self.control_retries = 0
+        self.data = memoryview(b"")     # Slices of a memoryview do not copy the data
+        self.data_offset = 0
+        self.source = None      # Iterator over the buffers to send after data, e.g. compressed blocks or a delta
+        self.encoder = None     # The BlockEncoder of the data if it is compressed
+
+        # Receiving side
+        self.expected_seq_num = 1   # Sequence number of the next in-order packet
+        self.out_of_order = RingBuffer()    # Out-of-order packets buffered by an SR receiver, based at expected_seq_num
+        self.received_data = None   # Buffered writer of the in-order data, opened when the SYN arrives
+        self.memory = None
+        self.result = None          # The received data or the number of bytes written, set once the FIN arrives
+        # Stop-and-wait has a single packet in flight, every packet is acknowledged right away
+        self.ack_every = ack_every if ack_every is not None else (1 if method == "SAW" else ACK_EVERY)
+        self.ack_delay = ack_delay
+        self.pending_acks = 0       # Number of in-order packets received since the last ACK
+        self.ack_deadline = None    # When the delayed ACK of the pending packets is sent
+        self.fec_parity = {}        # The (last sequence number, XOR of sizes, XOR) of the parity packets by FEC group
+        self.interrupted = False    # Whether the transfer ended without the sender's FIN, see interrupt()
+
+        # The XOR of the payloads as an int, of the packets sent by the sender or delivered in order by the receiver
+        self.fec_xor = 0
+        self.fec_lengths = 0
+
+    def connect(self):
+        """
+        Performs the three-way handshake with the receiver, the SYN is resent until a SYN-ACK arrives
+
+        Returns:
+            dict[int, bytes]: The handshake options accepted by the receiver
+        """
+        self.start_connect()
+        self.run(lambda: self.state != "SYN_SENT")
+        return self.options
+
+    def start_connect(self):
+        """
+        Sends the SYN without waiting, the handshake completes once the SYN-ACK is passed to handle_packet()
+
+        Returns:
+            None
+        """
+        if not self.connection_id:
+            self.connection_id = random.randint(1, 0xFFFFFFFF)
+
+        if self.probe_mtu:
+            # Start probing with the largest payload the kernel's path MTU allows, it is the MTU of the interface
+            # unless a router reported a smaller one
+            mtu = path_mtu(self.addr)
+            if mtu is not None:
+                self.mss = min(self.mss, mtu - IP_UDP_HEADER_SIZE - header_struct.size)
+            if not set_dont_fragment(self.sock, True):
+                print("Path MTU probing is not available, offering a payload size of", self.mss)
+                self.probe_mtu = False
+
+        self.state = "SYN_SENT"
+        self.send_syn()
+
+    def send(self, data):
+        """
+        Sends data to the receiver and returns once all of it has been acknowledged, the connection is
+        established first if needed
+
+        Args:
+            data (bytes or memoryview): The data to send
+
+        Returns:
+            None
+        """
+        if self.state == "CLOSED":
+            self.connect()
+
+        self.start_send(data)
+        self.run(self.sent)
+        self.finish_send()
+
+    def start_send(self, data):
+        """
+        Starts sending data without waiting, the rest is sent by fill_window() as ACKs open the window
+
+        Args:
+            data (bytes, memoryview or iterator): The data to send, or an iterator over the buffers to send
+
+        Returns:
+            None
+        """
+        # Compressed blocks are sent as the compressor thread produces them
+        if self.compression:
+            self.encoder = BlockEncoder(data, CODEC_IDS[self.compression])
+            self.source = self.encoder
+            self.data = memoryview(b"")
+        # The buffers of an iterator are taken as the window opens, e.g. a delta computed while it is sent
+        elif hasattr(data, "__next__"):
+            self.source = data
+            self.data = memoryview(b"")
+        else:
+            self.data = memoryview(data)
+        self.data_offset = 0
+        self.fill_window()
+
+    def sent(self):
+        """
+        Returns whether all of the data has been sent and acknowledged
+
+        Returns:
+            bool: True once the receiver has acknowledged all of the data
+        """
+        return self.data_offset >= len(self.data) and self.source is None and not self.unacked_packets
+
+    def finish_send(self):
+        """
+        Releases the sent data, so a memory mapped file can be closed
+
+        Returns:
+            None
+        """
+        if self.encoder is not None:
+            print(self.encoder.summary())
+            self.encoder = None
+        self.data = memoryview(b"")
+
+    def recv(self):
+        """
+        Receives data from the sender until its FIN arrives
+
+        Returns:
+            bytes or int: All of the received data if no sink was given, else the number of bytes written to the sink
+        """
+        self.run(lambda: self.result is not None)
+        return self.result
+
+    def close(self):
+        """
+        Closes the sending side of the connection. The FIN is resent with the backed off retransmission timeout
+        until it is acknowledged, or until it was resent FIN_RETRIES times. The receiving side is closed by the
+        sender's FIN
+
+        Returns:
+            None
+        """
+        self.start_close()
+        self.run(lambda: self.state != "FIN_SENT")
+
+    def start_close(self):
+        """
+        Sends the FIN without waiting, the connection is closed once its ACK is passed to handle_packet() or
+        once it was resent FIN_RETRIES times
+
+        Returns:
+            None
+        """
+        if self.state != "ESTABLISHED" or self.received_data is not None:
+            return
+
+        self.state = "FIN_SENT"
+        self.control_retries = 0
+        self.send_fin()
+        print("FIN msg sent. Waiting for ACK...")
+
+    def run(self, condition):
+        """
+        Drives the connection from its socket with an EventLoop until the condition holds
+
+        Args:
+            condition (callable): Returns True once the connection is done
+
+        Returns:
+            None
+        """
+        loop = EventLoop()
+        loop.add(self)
+        try:
+            loop.run_until(condition)
+        finally:
+            loop.close()
+
+    def next_deadline(self):
+        """
+        Returns when on_timer() has to be called next
+
+        Returns:
+            float or None: The deadline on the time.monotonic() clock, None if no timer is running
+        """
+        if self.ack_deadline is not None:
+            return self.ack_deadline
+        if self.state in ("SYN_SENT", "FIN_SENT"):
+            return self.control_deadline
+        deadline = None
+        if self.timers:
+            deadline = self.timers.next_deadline()
+        # Nothing is in flight while there is data left only if the receiver's window is zero or the pacer holds
+        # the sender back
+        elif self.data_offset < len(self.data) and self.pacing_deadline is None:
+            return self.persist_deadline
+        # The event loop sleeps until the pacer lets the sender go on
+        if self.pacing_deadline is not None and (deadline is None or self.pacing_deadline < deadline):
+            deadline = self.pacing_deadline
+        return deadline
+
+    def handle_packet(self, seq_num, ack_num, flags, window, payload, addr):
+        """
+        Handles a packet received from the peer
+
+        Args:
+            seq_num (int): The sequence number of the packet
+            ack_num (int): The acknowledgement number of the packet
+            flags (int): The flags of the packet
+            window (int): The window advertised in the packet
+            payload (bytes or memoryview): The payload of the packet
+            addr (tuple): The address the packet came from
+
+        Returns:
+            None
+        """
+        syn, ack, fin, parity = parse_flags(flags)
+
+        if syn and ack:
+            self.on_syn_ack(ack_num, window, payload, addr)
+        elif syn:
+            self.on_syn(payload, addr)
+        # The receiving side opened its sink when the SYN arrived
+        elif self.received_data is not None:
+            if ack:
+                if self.state == "SYN_RECEIVED":
+                    print("Received final ACK msg")
+                    self.state = "ESTABLISHED"
+            elif fin:
+                self.on_fin(seq_num, addr)
+            elif parity:
+                self.on_parity(seq_num, window, payload)
+            else:
+                self.on_data(seq_num, payload)
+        elif ack:
+            self.on_ack(seq_num, ack_num, window, payload)
+
+    def on_timer(self):
+        """
+        Resends the SYN, the FIN or the data packets whose retransmission timer has expired, or sends the
+        delayed ACK on the receiving side
+
+        Returns:
+            None
+        """
+        now = time.monotonic()
+
+        if self.ack_deadline is not None:
+            if now >= self.ack_deadline:
+                self.acknowledge()
+            return
+
+        if self.state == "SYN_SENT":
+            if now >= self.control_deadline:
+                print("Timeout occurred. Resending SYN packet with seq_num 0")
+                # The probe may have been too large for the path, retry with the next smaller size
+                if self.probe_mtu:
+                    self.next_probe_size()
+                self.send_syn()
+                # A retransmitted SYN gives no valid RTT sample
+                self.send_times.pop(0, None)
+
+        elif self.state == "FIN_SENT":
+            if now < self.control_deadline:
+                return
+            if self.control_retries >= FIN_RETRIES:
+                print("Timeout occurred while waiting for ACK for FIN msg. Exiting...")
+                self.state = "CLOSED"
+                return
+            print("Timeout occurred. Resending FIN msg")
+            self.control_retries += 1
+            self.rto.backoff()
+            self.send_fin()
+
+        elif self.state == "ESTABLISHED":
+            # Nothing expired if the persist timer woke the sender up, the next window probe is sent by fill_window()
+            expired = self.timers.expire(now)
+            if not expired:
+                return
 
-    Returns:
-        bytes: Concatenated data from the received packets
-    """
-    # Perform handshake with sender
-    handle_handshake(sock)
+            print("Timeout occurred. Resending packets", expired)
+            # Back off the retransmission timer, retransmitted packets no longer give valid RTT samples
+            self.rto.backoff()
+            self.cc.on_timeout()
+            self.dup_acks = 0
+            self.recover_seq_num = self.next_seq_num - 1
+
+            # Selective repeat only resends the packets whose own timer expired, the other receivers discarded
+            # everything after the first lost packet, so all unacked packets are resent
+            if self.method != "SR":
+                expired = list(self.unacked_packets)
+            for seq_num in expired:
+                self.retransmit(seq_num)
+
+    def send_syn(self):
+        """
+        Sends the SYN packet, offering the handshake options of this sender
+
+        Returns:
+            None
+        """
+        options = {OPTION_CONNECTION_ID: self.connection_id.to_bytes(4, "big")}
+        if self.sack:
+            options[OPTION_SACK] = b""
+        if self.data_range is not None:
+            options[OPTION_RANGE] = encode_range(self.data_range)
+        if self.fec:
+            options[OPTION_FEC] = bytes((self.fec,))
+        if self.compression:
+            options[OPTION_COMPRESSION] = bytes((CODEC_IDS[self.compression],))
+        if self.delta:
+            options[OPTION_DELTA] = self.delta.to_bytes(4, "big")
+        if self.resume_size:
+            options[OPTION_RESUME] = self.resume_size.to_bytes(8, "big")
+        if self.batch:
+            options[OPTION_BATCH] = b""
+
+        flags = 8  # 1 0 0 0 = SYN flag value
+        while True:
+            options[OPTION_MSS] = self.mss.to_bytes(2, "big")
+            syn_packet = create_packet(0, self.connection_id, flags, 0, encode_options(options))
+            if self.probe_mtu:
+                # Pad the SYN to the size of a full data packet, sent with DF it only arrives if the path carries
+                # packets of the offered size
+                syn_packet += bytes(header_struct.size + self.mss - len(syn_packet))
+            try:
+                self.sock.sendto(syn_packet, self.addr)
+                break
+            except OSError as e:
+                # The kernel already knows that the path MTU is smaller, probe with the next size right away
+                if not (self.probe_mtu and e.errno == errno.EMSGSIZE and self.next_probe_size()):
+                    raise
+        print("Sent SYN packet with seq_num", 0)
+        self.send_times[0] = time.monotonic()
+        self.control_deadline = self.send_times[0] + SYN_TIMEOUT
+
+    def next_probe_size(self):
+        """
+        Lowers the offered payload size to fit the next smaller MTU of MTU_CANDIDATES
+
+        Returns:
+            bool: True if the size was lowered, False if the smallest size is already offered
+        """
+        for mtu in MTU_CANDIDATES:
+            mss = mtu - IP_UDP_HEADER_SIZE - header_struct.size
+            if mss < self.mss:
+                print(f"No answer to a path MTU probe of {self.mss} bytes, probing with {mss} bytes")
+                self.mss = mss
+                return True
+        return False
+
+    def send_fin(self):
+        """
+        Sends the FIN packet with the next sequence number
+
+        Returns:
+            None
+        """
+        flags = 2  # 0 0 1 0 = FIN flag value
+        fin_packet = create_packet(self.next_seq_num, self.connection_id, flags, 0, b"")
+        self.sock.sendto(fin_packet, self.addr)
+        self.control_deadline = time.monotonic() + self.rto.timeout
+
+    def fill_window(self, limit=None):
+        """
+        Sends new packets while the number of unacknowledged packets is less than the window. The window is the
+        smaller of the congestion window and the receiver's window. If the receiver has no room left and nothing
+        is in flight, a single window probe is sent each time the persist timer expires. A paced sender stops
+        when the pacer holds the next packet back, next_deadline() then tells when to go on
+
+        Args:
+            limit (int): The largest number of packets to send, no limit if None
+
+        Returns:
+            bool: True if the limit stopped the sender while the window still had room
+        """
+        self.pacing_deadline = None
+        self.refill()
+        window = self.cc.window(self.rwnd)
+        if window == 0 and self.next_seq_num == self.base_seq_num and self.data_offset < len(self.data):
+            now = time.monotonic()
+            if now >= self.persist_deadline:
+                print("Receiver window is zero. Sending window probe")
+                window = 1
+                self.persist_deadline = now + self.rto.timeout
+
+        end_seq_num = self.base_seq_num + window
+        if limit is not None and self.next_seq_num + limit < end_seq_num:
+            end_seq_num = self.next_seq_num + limit
+        batch = []  # Packets collected for one segmentation offload send
+        batch_limit = max(1, min(GSO_MAX_SEGMENTS, GSO_MAX_BYTES // (header_struct.size + self.mss)))
+        while self.next_seq_num < end_seq_num and self.data_offset < len(self.data):
+            if self.pacer is not None:
+                now = time.monotonic()
+                if not self.pacer.ready(now):
+                    self.pacing_deadline = self.pacer.next_send_time
+                    break
+
+            # Slices the next chunk of data (up to mss bytes) to be sent from data
+            chunk_data = self.data[self.data_offset : self.data_offset + self.mss]
+
+            # Skip sending packet with sequence number 5 if skip_seq_num is True
+            if self.skip_seq_num and self.next_seq_num == 5:
+                self.skip_seq_num = False
+                print("Skipping seq_num =", self.next_seq_num)
+            elif self.gso:
+                # Only the last chunk of the data is short, so it always ends the batch
+                batch.append((self.next_seq_num, chunk_data))
+                self.send_times[self.next_seq_num] = time.monotonic()
+                if len(batch) == batch_limit:
+                    self.send_batch(batch)
+                    batch = []
+            else:
+                if self.pacer is not None:
+                    self.pacer.on_send(len(chunk_data), self.cc.cwnd, self.rto.srtt, now)
+                send(self.sock, chunk_data, self.next_seq_num, self.addr, self.connection_id)
+                self.send_times[self.next_seq_num] = time.monotonic()
+
+            # Add the packet to the unacked packets, start its timer and move past its data
+            self.unacked_packets.put(self.next_seq_num, chunk_data)
+            self.timers.schedule(self.next_seq_num, time.monotonic() + self.rto.timeout)
+            self.next_seq_num += 1
+            self.data_offset += len(chunk_data)
+            self.refill()
+
+            # Send the parity packet after the last packet of a FEC group, and after the last packet of the data
+            # so the end of a transfer is protected too. The batch is sent first, the parity has to follow its group
+            if self.fec:
+                self.add_to_parity(self.next_seq_num - 1, chunk_data)
+                if (self.next_seq_num - 1) % self.fec == 0 or self.data_offset >= len(self.data):
+                    if batch:
+                        self.send_batch(batch)
+                        batch = []
+                    self.send_parity()
+
+        if batch:
+            self.send_batch(batch)
+        # The event loop does not come back right away to a sender held back by the pacer
+        if self.pacing_deadline is not None:
+            return False
+        return self.next_seq_num < self.base_seq_num + window and self.data_offset < len(self.data)
+
+    def refill(self):
+        """
+        Takes the next buffers from the source once less than a full packet of data is left to send. The rest of
+        the data is joined with them, so every packet but the last one of the transfer is full
+
+        Returns:
+            None
+        """
+        while self.source is not None and len(self.data) - self.data_offset < self.mss:
+            buffer = next(self.source, None)
+            if buffer is None:
+                self.source = None
+            elif self.data_offset < len(self.data):
+                self.data = memoryview(bytes(self.data[self.data_offset:]) + buffer)
+                self.data_offset = 0
+            else:
+                self.data = memoryview(buffer)
+                self.data_offset = 0
 
-    # Initialize variables
-    expected_seq_num = 1
-    received_data = b""     # Concatenated data of all received packets
+    def send_batch(self, batch):
+        """
+        Sends new packets in one syscall with segmentation offload, or one by one if the kernel rejects the batch,
+        e.g. because the network device cannot offload checksums
 
-    while True:
-        # Receive packet from sender
-        msg, addr = sock.recvfrom(1472)
-        header_from_msg = msg[:12]              # Extract the header from the received message 
-        seq_num, ack_num, flags, win = parse_header(header_from_msg)    # Parse the header fields
-        syn, ack, fin = parse_flags(flags)      # Parse the flags
+        Args:
+            batch (list[tuple[int, memoryview]]): The sequence number and data of each packet
+
+        Returns:
+            None
+        """
+        if len(batch) > 1:
+            try:
+                send_batch(self.sock, batch, self.addr, self.connection_id)
+                return
+            except OSError as e:
+                print("UDP segmentation offload failed, sending every packet on its own. Error:", e)
+                self.gso = False
+
+        for seq_num, chunk_data in batch:
+            send(self.sock, chunk_data, seq_num, self.addr, self.connection_id)
+
+    def add_to_parity(self, seq_num, payload):
+        """
+        Adds a packet to the XOR of its FEC group, the packets of a group are added in sequence number order
+
+        Args:
+            seq_num (int): The sequence number of the packet
+            payload (bytes or memoryview): The data of the packet
+
+        Returns:
+            None
+        """
+        # The XOR is taken of the payloads as little-endian ints, which zero-pads the shorter payloads at the end
+        if (seq_num - 1) % self.fec == 0:
+            self.fec_xor = self.fec_lengths = 0
+        self.fec_xor ^= int.from_bytes(payload, "little")
+        self.fec_lengths ^= len(payload)
+
+    def send_parity(self):
+        """
+        Sends the parity packet of the FEC group of the last packet sent. Its sequence number is that of the last
+        packet of the group so far, its window field is the XOR of the payload sizes and its payload is the XOR
+        of the payloads. Parity packets are neither acknowledged nor resent
+
+        Returns:
+            None
+        """
+        parity_data = self.fec_xor.to_bytes((self.fec_xor.bit_length() + 7) // 8, "little")
+        flags = 1  # 0 0 0 1 = parity flag value
+        parity_packet = create_packet(self.next_seq_num - 1, self.connection_id, flags, self.fec_lengths, parity_data)
+        # The parity has to follow its group, it is not held back but takes from the pacing budget of the next packets
+        if self.pacer is not None:
+            self.pacer.on_send(len(parity_data), self.cc.cwnd, self.rto.srtt, time.monotonic())
+        try:
+            self.sock.sendto(parity_packet, self.addr)
+        # The send buffer of the non-blocking socket is full, the group is then only protected by retransmissions
+        except BlockingIOError:
+            pass
+
+    def retransmit(self, seq_num):
+        """
+        Resends an unacked packet and restarts its timer
+
+        Args:
+            seq_num (int): The sequence number of the packet
+
+        Returns:
+            None
+        """
+        packet_data = self.unacked_packets.get(seq_num)
+        # Retransmissions are not held back, they take from the pacing budget of the new packets
+        if self.pacer is not None:
+            self.pacer.on_send(len(packet_data), self.cc.cwnd, self.rto.srtt, time.monotonic())
+        send(self.sock, packet_data, seq_num, self.addr, self.connection_id)
+        self.send_times.pop(seq_num, None)
+        self.timers.schedule(seq_num, time.monotonic() + self.rto.timeout)
+
+    def on_syn_ack(self, ack_num, window, payload, addr):
+        """
+        Completes the handshake on the sending side when the SYN-ACK arrives, and sends the final ACK
+
+        Args:
+            ack_num (int): The acknowledgement number of the SYN-ACK
+            window (int): The receive window advertised by the receiver
+            payload (bytes or memoryview): The options accepted by the receiver
+            addr (tuple): The address of the receiver
+
+        Returns:
+            None
+        """
+        if self.state == "SYN_SENT":
+            print("Received SYN-ACK msg with ak_num", ack_num)
+            # Only take an RTT sample if the SYN was not retransmitted
+            send_time = self.send_times.pop(0, None)
+            if send_time is not None:
+                self.rto.sample(time.monotonic() - send_time)
+            # Selective acknowledgements are only used if the receiver accepted them
+            self.options = decode_options(payload)
+            self.use_sack = OPTION_SACK in self.options
+            self.rwnd = window
+
+            # Use the payload size the receiver agreed on, a receiver without the option takes the default size
+            agreed_mss = int.from_bytes(self.options.get(OPTION_MSS, b""), "big") or DEFAULT_MSS
+            self.mss = min(self.mss, agreed_mss)
+            if self.pacer is not None:
+                self.pacer.packet_size = self.mss
+            # Parity packets are only sent if the receiver can rebuild packets from them
+            self.fec = int.from_bytes(self.options.get(OPTION_FEC, b""), "big")
+            # The data is sent raw if the receiver does not support the codec
+            if self.compression and OPTION_COMPRESSION not in self.options:
+                print(f"The receiver does not support {self.compression} compression, sending the data raw")
+                self.compression = None
+            # A receiver without a copy of the file does not accept a delta transfer
+            self.delta = int.from_bytes(self.options.get(OPTION_DELTA, b""), "big")
+            # The receiver has the file up to the offset of its checkpoint if it accepted to resume
+            self.checkpoint = None
+            if len(self.options.get(OPTION_RESUME, b"")) >= 8:
+                resume = self.options[OPTION_RESUME]
+                self.checkpoint = int.from_bytes(resume[:8], "big"), resume[8:]
+            # A receiver that does not take batches would write the stream to a single file
+            self.batch = OPTION_BATCH in self.options
+            # The probe is over, the data packets may be fragmented again if the path changes
+            if self.probe_mtu:
+                set_dont_fragment(self.sock, False)
+            self.state = "ESTABLISHED"
+
+        # Send the final ACK, again if the SYN-ACK is a duplicate
+        flags = 4  # 0 1 0 0 = ACK flag value
+        ack_packet = create_packet(0, self.connection_id, flags, 0, b"")
+        self.sock.sendto(ack_packet, addr)
+        print("Sent final ACK packet with ack_num", self.connection_id)
+
+    def on_syn(self, payload, addr):
+        """
+        Answers the sender's SYN with a SYN-ACK, echoing the offered options this receiver supports
+
+        Args:
+            payload (bytes or memoryview): The options offered by the sender
+            addr (tuple): The address of the sender
+
+        Returns:
+            None
+        """
+        # A SYN with a new connection id during the transfer comes from a sender that restarted, a resuming
+        # receiver ends the transfer so the sender can resume on a new connection
+        if self.checkpoint is not None and self.state == "ESTABLISHED" and self.result is None:
+            connection_id = int.from_bytes(decode_options(payload).get(OPTION_CONNECTION_ID, b""), "big")
+            if connection_id != self.connection_id:
+                self.interrupt()
+            return
+
+        # A SYN after the handshake is a stale duplicate
+        if self.state not in ("CLOSED", "SYN_RECEIVED") or self.result is not None:
+            return
+
+        print("Received SYN msg")
+        self.addr = addr
+
+        # Accept the offered options this receiver supports, selective acknowledgements need the reorder buffer
+        supported_options = (OPTION_CONNECTION_ID, OPTION_RANGE, OPTION_MSS, OPTION_COMPRESSION)
+        if self.method == "SR":
+            supported_options += (OPTION_SACK,)
+        # Forward error correction needs more than one packet in flight
+        if self.method != "SAW":
+            supported_options += (OPTION_FEC,)
+        if self.delta:
+            supported_options += (OPTION_DELTA,)
+        if self.checkpoint is not None:
+            supported_options += (OPTION_RESUME,)
+        if self.batch:
+            supported_options += (OPTION_BATCH,)
+        offered_options = decode_options(payload)
+        self.options = {kind: value for kind, value in offered_options.items() if kind in supported_options}
+        self.use_sack = OPTION_SACK in self.options
+        self.connection_id = int.from_bytes(self.options.get(OPTION_CONNECTION_ID, b""), "big")
+        self.state = "SYN_RECEIVED"
+
+        # Agree on the smaller payload size of both sides, a sender without the option uses the default size
+        offered_mss = int.from_bytes(self.options.get(OPTION_MSS, b""), "big") or DEFAULT_MSS
+        self.mss = min(self.mss, offered_mss)
+        if OPTION_MSS in self.options:
+            self.options[OPTION_MSS] = self.mss.to_bytes(2, "big")
+
+        # Rebuild lost packets from the parity packets in groups of the offered size
+        self.fec = int.from_bytes(self.options.get(OPTION_FEC, b""), "big")
+        if not 0 < self.fec <= MAX_FEC_GROUP:
+            self.fec = 0
+            self.options.pop(OPTION_FEC, None)
+
+        # Decompress the data if the codec is available here
+        if int.from_bytes(self.options.get(OPTION_COMPRESSION, b""), "big") not in CODECS:
+            self.options.pop(OPTION_COMPRESSION, None)
+
+        # Agree on the smaller block size of a delta transfer, 0 if the sender did not offer one
+        self.delta = min(self.delta, int.from_bytes(self.options.get(OPTION_DELTA, b""), "big"))
+        if self.delta:
+            self.options[OPTION_DELTA] = self.delta.to_bytes(4, "big")
+        else:
+            self.options.pop(OPTION_DELTA, None)
+
+        # Answer an offer to resume with the checkpoint, the sender sends the data after its offset
+        self.resume_size = int.from_bytes(self.options.get(OPTION_RESUME, b""), "big")
+        if self.resume_size:
+            self.options[OPTION_RESUME] = self.checkpoint[0].to_bytes(8, "big") + self.checkpoint[1]
+        else:
+            self.options.pop(OPTION_RESUME, None)
+
+        # The data of a stripe is written at its offset in the sink file, resumed data at the checkpoint
+        if OPTION_RANGE in self.options:
+            self.data_range = decode_range(self.options[OPTION_RANGE])
+            if self.data_range is None:
+                del self.options[OPTION_RANGE]
+        if self.received_data is None:
+            offset = self.data_range[0] if self.data_range is not None else 0
+            if OPTION_RESUME in self.options:
+                offset = self.checkpoint[0]
+            self.received_data, self.memory = open_sink(self.sink, offset, OPTION_COMPRESSION in self.options,
+                                                        self.sink_class)
+
+        # Create a SYN-ACK packet advertising the room in the output sink and send it back to the sender
+        flags = 12  # 1 1 0 0 = SYN and ACK flag values
+        syn_ack_msg = create_packet(0, 0, flags, self.advertised_window(), encode_options(self.options))
+        self.sock.sendto(syn_ack_msg, addr)
+
+    def on_data(self, seq_num, payload):
+        """
+        Handles a data packet on the receiving side. In-order data is written to the sink, an SR receiver buffers
+        out-of-order packets within its window and the other receivers discard them, unless they rebuild lost
+        packets with FEC. Every packet is answered with a cumulative ACK, so a missing packet shows up as
+        duplicate ACKs at the sender
+
+        Args:
+            seq_num (int): The sequence number of the packet
+            payload (bytes or memoryview): The data of the packet
+
+        Returns:
+            None
+        """
+        # The first data packet completes the handshake if the final ACK was lost
+        if self.state == "SYN_RECEIVED":
+            self.state = "ESTABLISHED"
+        elif self.state != "ESTABLISHED":
+            return
 
-        # If flag is True, skip the first ACK message
-        if skip_ack:
+        # Runs skip_ack test case
+        if self.skip_ack:
+            self.skip_ack = False
             print("Skipping first ACK msg")
-            skip_ack = False
-            continue
+            return
 
-        # If received packet has correct sequence number
-        if not fin and not syn and not ack and seq_num == expected_seq_num:
+        if seq_num == self.expected_seq_num:
             print("Received in-order with seq_num =", seq_num)
-            # Extract payload from the packet
-            app_data = msg[12:]
-            # Send an ACK message with received seq_num
-            send_ack(sock, expected_seq_num, addr)
-            # Increment the expected sequence number
-            expected_seq_num += 1
-            received_data += app_data
-
-        # If received packet does not have correct sequence number
-        elif not fin and not syn and not ack and seq_num != expected_seq_num:
-            # Send a duplicate ACK message to the sender, if received a duplicate packet
-            if seq_num == expected_seq_num - 1:
-                print("Received duplicate packet with seq_num =", seq_num)
-                send_ack(sock, expected_seq_num - 1, addr)
-
-            # Else ignore received packet
+            filled_gap = self.deliver(payload)
+
+            # A parity packet that could not rebuild its group may be able to once this packet is in
+            if self.fec and (seq_num - 1) // self.fec in self.fec_parity:
+                self.recover((seq_num - 1) // self.fec)
+
+            # Acknowledge the in-order packets at once, the ack is cumulative. The ACK is delayed until ack_every
+            # packets are pending or the delay timer expires, a packet that fills a gap is acknowledged right away
+            # so the sender learns about the recovery without waiting
+            self.pending_acks += 1
+            if filled_gap or self.pending_acks >= self.ack_every:
+                self.acknowledge()
+            elif self.ack_deadline is None:
+                self.ack_deadline = time.monotonic() + self.ack_delay
+
+        # If the packet was already received, its ACK was lost, so acknowledge the last in-order packet again
+        elif seq_num < self.expected_seq_num:
+            print("Received duplicate packet with seq_num =", seq_num)
+            self.acknowledge()
+
+        # An out-of-order packet within the receive window is buffered, copied out of the reusable receive buffer,
+        # and acknowledged on its own. A receiver with FEC buffers them for every method, they are needed to
+        # rebuild a lost packet of their group
+        elif (self.method == "SR" or self.fec) and seq_num < self.expected_seq_num + self.reorder_window():
+            print("Received out-of-order with seq_num =", seq_num)
+            self.out_of_order.put(seq_num, bytes(payload))
+            group = (seq_num - 1) // self.fec if self.fec else -1
+            if group in self.fec_parity:
+                self.recover(group)
+                # The packet completed the group and the rebuilt packet filled the gap, which was acknowledged
+                if seq_num < self.expected_seq_num:
+                    return
+
+            # The parity packet that follows the group of the gap may still rebuild it. The ACK is delayed like
+            # an in-order ACK, duplicate ACKs would make the sender resend the packet before the parity arrives
+            if self.fec and group == (self.expected_seq_num - 1) // self.fec and group not in self.fec_parity:
+                if self.ack_deadline is None:
+                    self.ack_deadline = time.monotonic() + self.ack_delay
+            else:
+                self.acknowledge(seq_num)
+
+        # Discard the packet and acknowledge the last in-order packet again, the ACK also tells the sender the
+        # current window
+        else:
+            print("Received out-of-order with seq_num =", seq_num)
+            self.acknowledge()
+
+    def deliver(self, payload):
+        """
+        Writes the in-order packet to the sink, followed by the buffered packets that are now in order
+
+        Args:
+            payload (bytes or memoryview): The data of the packet with sequence number expected_seq_num
+
+        Returns:
+            bool: True if buffered packets followed it, i.e. the packet filled a gap
+        """
+        filled_gap = len(self.out_of_order) > 0
+        self.out_of_order.advance(self.expected_seq_num + 1)
+        for in_order_payload in [payload] + self.out_of_order.pop_in_order():
+            self.received_data.write(in_order_payload)
+            # The in-order packets of the group are kept as their XOR, the sink has taken the data
+            if self.fec:
+                # The group before is complete, its parity packet is no longer needed
+                if (self.expected_seq_num - 1) % self.fec == 0:
+                    self.fec_parity.pop((self.expected_seq_num - 1) // self.fec - 1, None)
+                self.add_to_parity(self.expected_seq_num, in_order_payload)
+            self.expected_seq_num += 1
+        return filled_gap
+
+    def on_parity(self, seq_num, window, payload):
+        """
+        Handles a parity packet on the receiving side, a single lost packet of its FEC group is rebuilt from it
+        right away. A parity packet of a group that lost more packets is kept until retransmissions leave a
+        single packet missing
+
+        Args:
+            seq_num (int): The sequence number of the last packet of the group
+            window (int): The XOR of the payload sizes of the group
+            payload (bytes or memoryview): The XOR of the payloads of the group
+
+        Returns:
+            None
+        """
+        if not self.fec or self.result is not None or seq_num < self.expected_seq_num:
+            return
+
+        group = (seq_num - 1) // self.fec
+        self.fec_parity[group] = (seq_num, window, int.from_bytes(payload, "little"))
+        # The parity cannot rebuild the gap, send the delayed duplicate ACK so the sender resends the packets
+        if not self.recover(group) and group == (self.expected_seq_num - 1) // self.fec and self.ack_deadline is not None:
+            self.acknowledge()
+
+    def recover(self, group):
+        """
+        Rebuilds the missing packet of a FEC group from its parity packet, if no other packet of the group is missing.
+        The XOR of the parity with the other packets of the group is the missing packet
+
+        Args:
+            group (int): The group, the packets with sequence numbers group * fec + 1 to (group + 1) * fec
+
+        Returns:
+            bool: False if more than one packet of the group is missing and the parity packet is kept
+        """
+        last_seq_num, lengths, parity = self.fec_parity[group]
+        first_seq_num = group * self.fec + 1
+        # The packets of the group already written to the sink are kept as their XOR
+        if first_seq_num < self.expected_seq_num:
+            parity ^= self.fec_xor
+            lengths ^= self.fec_lengths
+
+        missing_seq_num = None
+        for seq_num in range(max(first_seq_num, self.expected_seq_num), last_seq_num + 1):
+            buffered_payload = self.out_of_order.get(seq_num)
+            if buffered_payload is None:
+                if missing_seq_num is not None:
+                    return False
+                missing_seq_num = seq_num
             else:
-                print("Received out-of-order packet. Ignoring")
+                parity ^= int.from_bytes(buffered_payload, "little")
+                lengths ^= len(buffered_payload)
+        del self.fec_parity[group]
+        if missing_seq_num is None:
+            return True
 
-        # If FIN flag is set, send back an ACK message, close the socket, and return received data
-        elif fin and not ack and not syn and seq_num == expected_seq_num:
-            print("Received FIN msg with seq_num", seq_num)
-            send_ack(sock, expected_seq_num, addr)
-            sock.close()
-            return received_data
+        try:
+            rebuilt_payload = parity.to_bytes(lengths, "little")
+        # The parity does not match the packets, e.g. a corrupted packet, the missing packet is resent instead
+        except OverflowError:
+            return True
+        print("Rebuilt with FEC seq_num =", missing_seq_num)
+        if missing_seq_num == self.expected_seq_num:
+            self.deliver(rebuilt_payload)
+            self.acknowledge()
+        else:
+            self.out_of_order.put(missing_seq_num, rebuilt_payload)
+        return True
+
+    def on_fin(self, seq_num, addr):
+        """
+        Handles the sender's FIN, which closes the receiving side once all data before it has arrived
+
+        Args:
+            seq_num (int): The sequence number of the FIN
+            addr (tuple): The address of the sender
+
+        Returns:
+            None
+        """
+        if seq_num != self.expected_seq_num:
+            return
+
+        # The ACK for the FIN was lost, acknowledge it again
+        if self.result is not None:
+            send_ack(self.sock, seq_num, addr)
+            return
+
+        print("Received FIN msg with seq_num", seq_num)
+        send_ack(self.sock, seq_num, addr)
+        self.pending_acks = 0
+        self.ack_deadline = None
+        self.state = "CLOSED"
+        self.result = close_sink(self.received_data, self.memory)
+
+    def interrupt(self):
+        """
+        Ends the receiving side without the sender's FIN, e.g. because the sender restarted. The data received
+        in order so far is written to the sink, the out-of-order packets are dropped
+
+        Returns:
+            None
+        """
+        print("The sender restarted, ending the interrupted transfer")
+        self.pending_acks = 0
+        self.ack_deadline = None
+        self.state = "CLOSED"
+        self.interrupted = True
+        self.result = close_sink(self.received_data, self.memory, complete=False)
+
+    def acknowledge(self, seq_num=0):
+        """
+        Sends a cumulative ACK for the in-order data received so far, which also covers any delayed ACK
+
+        Args:
+            seq_num (int): The sequence number of an out-of-order packet that is acknowledged on its own, 0 if none
+
+        Returns:
+            None
+        """
+        self.pending_acks = 0
+        self.ack_deadline = None
+        sack = encode_sack(self.out_of_order.bitmap(self.expected_seq_num)) if self.use_sack else b""
+        send_ack(self.sock, self.expected_seq_num - 1, self.addr, seq_num, sack, self.advertised_window())
+
+    def advertised_window(self):
+        """
+        Returns the receive window of the receiving side, limited by the room in the output sink and by the
+        reorder buffer
+
+        Returns:
+            int: The receive window in packets
+        """
+        if self.method == "SAW":
+            capacity = 1    # Stop-and-wait has room for a single packet
+        else:
+            capacity = self.reorder_window()
+        return receive_window(self.received_data, len(self.out_of_order), capacity, self.mss)
+
+    def reorder_window(self):
+        """
+        Returns the number of packets from expected_seq_num on the receiving side may buffer
+
+        Returns:
+            int: The window size of an SR receiver, ADVERTISED_WINDOW for a receiver that buffers packets for FEC,
+                MAX_WINDOW for a GBN receiver, which buffers nothing, so only the room in its sink limits it
+        """
+        if self.method == "SR":
+            return self.window_size
+        if self.fec:
+            return ADVERTISED_WINDOW
+        return MAX_WINDOW
+
+    def on_ack(self, seq_num, ack_num, window, payload):
+        """
+        Handles an ACK on the sending side. The ack_num acknowledges every packet up to and including itself,
+        the seq_num is set if an out-of-order packet above ack_num is acknowledged on its own and the SACK bitmap
+        lists every out-of-order packet the receiver holds. Duplicate ACKs trigger a fast retransmit
+
+        Args:
+            seq_num (int): The sequence number of an out-of-order packet acknowledged on its own, 0 if none
+            ack_num (int): The cumulative acknowledgement number
+            window (int): The receive window advertised by the receiver
+            payload (bytes or memoryview): The SACK bitmap, if SACK was negotiated
+
+        Returns:
+            None
+        """
+        if self.state == "FIN_SENT":
+            # Exits if ack for FIN is received
+            if ack_num == self.next_seq_num:
+                print("ACK for FIN msg received. Exiting...")
+                self.state = "CLOSED"
+            return
+        if self.state != "ESTABLISHED":
+            return
+
+        self.rwnd = window
+
+        acked = list(range(self.base_seq_num, min(ack_num, self.next_seq_num - 1) + 1))
+        if seq_num > ack_num:
+            acked.append(seq_num)
+        if self.use_sack:
+            # Only the SACKed packets that are still unacked, the bitmap repeats the ones acknowledged before
+            acked.extend(self.unacked_packets.select(decode_sack(payload), ack_num + 1))
+
+        newly_acked = 0
+        rtt = None
+        now = time.monotonic()
+        for acked_seq_num in acked:
+            if self.unacked_packets.pop(acked_seq_num) is None:
+                continue
+            print("ACK msg: ack_num =", acked_seq_num)
+
+            # The most recently sent packet that was sent only once gives the RTT sample
+            send_time = self.send_times.pop(acked_seq_num, None)
+            if send_time is not None and (rtt is None or now - send_time < rtt):
+                rtt = now - send_time
+
+            # Stop the timer of the acknowledged packet
+            self.timers.cancel(acked_seq_num)
+            newly_acked += 1
+
+        # Update the retransmission timer and grow the congestion window by the number of newly acknowledged packets
+        if rtt is not None:
+            self.rto.sample(rtt)
+        elif newly_acked:
+            self.rto.reset_backoff()
+        if newly_acked:
+            self.cc.on_ack(newly_acked, rtt)
+
+        # A duplicate ACK does not move ack_num, it acknowledges a packet that arrived out of order above a
+        # missing one. After DUPACK_THRESHOLD of them the missing packet is taken as lost and resent without
+        # waiting for its timer, and the window is halved once per loss event instead of restarting from slow
+        # start (fast recovery). Stop-and-wait has a single packet in flight, one duplicate ACK is enough
+        lost_seq_num = None
+        old_base_seq_num = self.base_seq_num
+        if ack_num == old_base_seq_num - 1 and old_base_seq_num in self.unacked_packets:
+            print("Received duplicate ACK msg with ack_num", ack_num)
+            self.dup_acks += 1
+            threshold = 1 if self.method == "SAW" else DUPACK_THRESHOLD
+            if self.dup_acks == threshold and ack_num >= self.recover_seq_num:
+                self.recover_seq_num = self.next_seq_num - 1
+                self.cc.on_loss()
+                lost_seq_num = old_base_seq_num
+        elif ack_num >= old_base_seq_num:
+            self.dup_acks = 0
+
+        # Slide the window up to the lowest unacked packet
+        first_unacked = self.unacked_packets.first()
+        self.base_seq_num = first_unacked if first_unacked is not None else self.next_seq_num
+        self.unacked_packets.advance(self.base_seq_num)
+
+        # An ACK that moves ack_num but not past recover_seq_num shows that the next packet was lost in the same
+        # loss event, resend it right away unless it was already retransmitted
+        if ack_num >= old_base_seq_num and self.base_seq_num <= self.recover_seq_num and self.base_seq_num in self.send_times:
+            lost_seq_num = self.base_seq_num
+
+        if lost_seq_num is not None:
+            # Selective repeat resends the missing packet, the other receivers discarded everything after it
+            if self.method == "SR":
+                print("Fast retransmit of seq_num =", lost_seq_num)
+                self.retransmit(lost_seq_num)
+            else:
+                print("Fast retransmit from seq_num =", lost_seq_num)
+                for unacked_seq_num in list(self.unacked_packets):
+                    self.retransmit(unacked_seq_num)
 
 
-def SEND_SAW(sock, addr, data):
+class DRTPServer:
     """
-    Sends data using the Selective Acknowledgment Protocol
-
-    Arguments:
-        sock (socket): Socket object to use for sending and receiving data
-        addr (tuple): IP address and port number of the server/receiver
-        data (bytes): File data to be sent in bytes
+    A long-running receiver that serves many senders at once on a single socket. Every datagram is routed to
+    the session of its sender, keyed on the sender's address and connection id, and each session is a
+    DRTPConnection that does its own handshake and writes to its own sink. Sessions that stay idle for
+    SESSION_TIMEOUT seconds are removed, unfinished ones are closed as aborted. A session that fails, e.g. on an
+    error of its sink, is aborted the same way and the other sessions go on
 
-    Returns:
-        Void
+    Args:
+        sock (socket): The bound UDP socket to receive on
+        method (str): The reliability method of the sessions, "SAW", "GBN" or "SR"
+        window_size (int): The reorder buffer of an SR receiver in packets
+        open_session (callable): Called with the sender's address and connection id when a new session starts,
+            returns the sink the session writes to
+        end_session (callable): Called with the DRTPConnection when a session has received the FIN or was
+            aborted, its result is None if it was aborted. May be None
+        skip_ack (bool): Whether every session ignores its first data packet, for test cases
+        ack_every (int): The number of in-order packets a session acknowledges at once, a default for the
+            method if None
+        ack_delay (float): The number of seconds a session delays the ACK of fewer than ack_every packets
+        mss (int): The largest payload size the sessions accept
+        sink_class (type): The buffer the sessions write their sinks through, BufferedSink or a subclass
     """
-    # Initiate three-way handshake with the receiver
-    initiate_handshake(sock, addr)
-
-    # Initialize variables
-    sequence_num = 1
-    last_sent_packet = {}
 
-    # Loop until there is no data to send
-    while True:
-        # Initialize the estimated RTT 
-        est_rtt = 0.5
-
-        # If no more data, close the connection and exit loop
-        if not data:
-            close_conn(sock, addr, sequence_num)
-            break
+    def __init__(self, sock, method, window_size, open_session, end_session=None, skip_ack=False, ack_every=None,
+                 ack_delay=ACK_DELAY, mss=DEFAULT_MSS, sink_class=BufferedSink):
+        self.sock = sock
+        self.method = method
+        self.window_size = window_size
+        self.open_session = open_session
+        self.end_session = end_session
+        self.skip_ack = skip_ack
+        self.ack_every = ack_every
+        self.ack_delay = ack_delay
+        self.mss = mss
+        self.sink_class = sink_class
+        self.sessions = {}      # Sessions keyed on (addr, connection id)
+        self.last_seen = {}     # When a datagram for each session last arrived
+        self.next_expiry_check = time.monotonic() + SESSION_TIMEOUT
+
+    def serve_forever(self):
+        """
+        Receives datagrams and runs the timers of the sessions until interrupted
+
+        Returns:
+            None
+        """
+        loop = EventLoop()
+        loop.add(self)
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+
+    def next_deadline(self):
+        """
+        Returns when on_timer() has to be called next
+
+        Returns:
+            float: The earliest timer of the sessions or the next check for idle sessions, on the time.monotonic() clock
+        """
+        deadline = self.next_expiry_check
+        for connection in self.sessions.values():
+            session_deadline = connection.next_deadline()
+            if session_deadline is not None and session_deadline < deadline:
+                deadline = session_deadline
+        return deadline
+
+    def on_timer(self):
+        """
+        Runs the expired timers of the sessions, called by the event loop
+
+        Returns:
+            None
+        """
+        self.run_timers()
+
+    def fill_window(self, limit=None):
+        """
+        The sessions only receive, so there is nothing to send
+
+        Args:
+            limit (int): Unused
+
+        Returns:
+            bool: Always False
+        """
+        return False
+
+    def handle_packet(self, seq_num, ack_num, flags, window, payload, addr):
+        """
+        Routes a datagram to the session of its sender, a SYN from an unknown sender starts a new session
+
+        Args:
+            seq_num (int): The sequence number of the packet
+            ack_num (int): The acknowledgement number of the packet, the connection id in packets from a sender
+            flags (int): The flags of the packet
+            window (int): The window advertised in the packet
+            payload (bytes or memoryview): The payload of the packet
+            addr (tuple): The address the packet came from
+
+        Returns:
+            DRTPConnection or None: The session the datagram was routed to, None if it was dropped
+        """
+        syn, ack, fin, parity = parse_flags(flags)
+
+        # The SYN carries the connection id as an option, the sender's other packets in their ack field
+        if syn and not ack:
+            connection_id = int.from_bytes(decode_options(payload).get(OPTION_CONNECTION_ID, b""), "big")
+        else:
+            connection_id = ack_num
+        key = (addr, connection_id)
+
+        connection = self.sessions.get(key)
+        if connection is None:
+            # Packets of a session that was already removed are dropped
+            if not syn or ack:
+                return None
+            print(f"New session from {addr[0]}:{addr[1]} with connection id {connection_id}")
+            sink = self.open_session(addr, connection_id)
+            connection = DRTPConnection(self.sock, addr, self.method, self.window_size, sink=sink,
+                                        skip_ack=self.skip_ack, ack_every=self.ack_every, ack_delay=self.ack_delay,
+                                        mss=self.mss, sink_class=self.sink_class)
+            self.sessions[key] = connection
+
+        self.last_seen[key] = time.monotonic()
+        finished = connection.result is not None
+        # An error, e.g. of the session's sink, only ends that session
+        try:
+            connection.handle_packet(seq_num, ack_num, flags, window, payload, addr)
+        except Exception as e:
+            self.remove_session(key, e)
+            return None
+
+        # The session is kept after its FIN, to acknowledge the FIN again if the ACK is lost
+        if not finished and connection.result is not None and self.end_session is not None:
+            self.end_session(connection)
+        return connection
+
+    def run_timers(self):
+        """
+        Runs the expired timers of the sessions and removes the sessions that have been idle for too long
+
+        Returns:
+            None
+        """
+        now = time.monotonic()
+        for key, connection in list(self.sessions.items()):
+            deadline = connection.next_deadline()
+            if deadline is not None and deadline <= now:
+                try:
+                    connection.on_timer()
+                except Exception as e:
+                    self.remove_session(key, e)
+
+        if now < self.next_expiry_check:
+            return
+        self.next_expiry_check = now + 1.0
+        for key in [key for key, last_seen in self.last_seen.items() if now - last_seen > SESSION_TIMEOUT]:
+            self.remove_session(key)
+
+    def remove_session(self, key, error=None):
+        """
+        Removes a session, closing its sink and reporting it as aborted if it did not receive the FIN
+
+        Args:
+            key (tuple): The (addr, connection id) of the session
+            error (Exception): The error that ended the session, None if it was idle or the server is closing
+
+        Returns:
+            None
+        """
+        connection = self.sessions.pop(key)
+        del self.last_seen[key]
+        # A finished session was already reported
+        if connection.result is not None:
+            return
+        if error is not None:
+            print(f"Session from {key[0][0]}:{key[0][1]} with connection id {key[1]} failed: {error}")
+        else:
+            print(f"Session from {key[0][0]}:{key[0][1]} with connection id {key[1]} timed out")
+        # The data was cut off, a compressed block that was cut off with it is not an error
+        if connection.received_data is not None:
+            try:
+                close_sink(connection.received_data, connection.memory, complete=False)
+            except Exception as e:
+                # The sink may fail again with the error that ended the session
+                if e is not error:
+                    print("Error writing the received data:", e)
+        if self.end_session is not None:
+            self.end_session(connection)
 
-        # Send the next packet of data (upt to 1460bytes) with the current sequence number
-        send(sock, data[:1460], sequence_num, addr)
-        last_sent_packet[sequence_num] = data[:1460]
-        # Remove the sent data from the buffer
-        data = data[1460:]
+    def close(self):
+        """
+        Removes all sessions, the unfinished ones are reported as aborted
 
-        # Record the time the packet was sent
-        send_time = time.monotonic()
+        Returns:
+            None
+        """
+        for key in list(self.sessions):
+            self.remove_session(key)
 
-        # Wait for ACK message from the receiver
-        received_ack = False
 
-        while not received_ack:
-            # Set the timeout to the estimated RTT times 4
-            sock.settimeout(est_rtt)
+def RECV_SAW(sock, skip_ack, sink=None, mss=DEFAULT_MSS):
+    """
+    Receives data packets sent by the sender and sends ACK packets to confirm receipt of each packet
 
-            try:
-                # Receive message from destination address
-                ack_msg, addr = sock.recvfrom(1472)     
-                header_from_msg = ack_msg[:12]          # Extract the header from the received message
-                seq_num, ack_num, flags, win = parse_header(header_from_msg)  # Parse the header fields
-                syn, ack, fin = parse_flags(flags)      # Parse the flags
+    Arguments:
+        sock (socket): Receiver socket for receiving packets from server
+        skip_ack (bool): Whether to skip the first ACK message (for test case)
+        sink (file object or callable): Where in-order data is written as it arrives, if None the data is kept in memory
+        mss (int): The largest payload size to accept
 
-                # If received ACK message is valid, update sequence number, empty sent packet list and set received_ack to True
-                if ack and ack_num == sequence_num:
-                    print("ACK msg: ack_num =", ack_num)
+    Returns:
+        bytes or int: Concatenated data from the received packets if no sink was given, else the number of bytes written
+    """
+    connection = DRTPConnection(sock, None, "SAW", 1, sink=sink, skip_ack=skip_ack, mss=mss)
+    received = connection.recv()
+    sock.close()
+    return received
 
-                    # Calculate the roundtrip time and update the estimated RTT to 4RTT
-                    rtt = time.monotonic() - send_time
-                    est_rtt = 4 * rtt
 
-                    sequence_num += 1
-                    received_ack = True
-                    last_sent_packet = {}
+def SEND_SAW(sock, addr, data, rto=None, data_range=None, mss=DEFAULT_MSS, probe_mtu=False, compression=None):
+    """
+    Sends data using the Stop-and-Wait protocol
 
-                # If the acknowledgement message is a duplicate, resend the previous packet with the previous sequence number
-                elif ack and ack_num == sequence_num - 1:
-                    print("Received duplicate ACK msg with ack_num", ack_num)
-                    send(sock, data[:1460], sequence_num - 1, addr)
+    Arguments:
+        sock (socket): Socket object to use for sending and receiving data
+        addr (tuple): IP address and port number of the server/receiver
+        data (bytes or memoryview): File data to be sent
+        rto (RTOEstimator): Retransmission timer, a default one is created if None
+        data_range (tuple[int, int]): The byte offset of the data in the file and the size of the file, if the data
+            is one stripe of a striped transfer
+        mss (int): The largest payload size to offer in the handshake
+        probe_mtu (bool): Whether to lower the offered payload size to what the path carries, see DRTPConnection
+        compression (str): The codec to compress the data with if the receiver supports it, None to send it raw
 
-            # If timeout occurs while waiting for ACK message, resend the pakcet with the current sequence number
-            except timeout:
-                print("Timeout occurred. Resending packet with seq_num =", sequence_num)
-                send(sock, last_sent_packet[sequence_num], sequence_num, addr)
+    Returns:
+        Void
+    """
+    connection = DRTPConnection(sock, addr, "SAW", 1, rto, data_range=data_range, mss=mss, probe_mtu=probe_mtu,
+                                compression=compression)
+    connection.send(data)
+    connection.close()
+    sock.close()
 
 
-def RECV_GBN(sock, skip_ack):
+def RECV_GBN(sock, skip_ack, sink=None, ack_every=None, ack_delay=ACK_DELAY, mss=DEFAULT_MSS):
     """
     Receive data using Go back N protocol
 
     Arguments:
         sock (socket): Socket object to receive data with
         skip_ack (bool): Whether to skip sending ACK message or not for test case
+        sink (file object or callable): Where in-order data is written as it arrives, if None the data is kept in memory
+        ack_every (int): The number of in-order packets acknowledged at once, ACK_EVERY if None
+        ack_delay (float): The number of seconds to delay the ACK of fewer than ack_every packets
+        mss (int): The largest payload size to accept
 
     Returns:
-        Concatenated received data in bytes
+        Concatenated received data in bytes if no sink was given, else the number of bytes written to the sink
     """
-    # Perform three-way handshake
-    handle_handshake(sock)
-
-    # Initialize variables
-    expected_seq_num = 1
-    received_data = b""
+    connection = DRTPConnection(sock, None, "GBN", sink=sink, skip_ack=skip_ack, ack_every=ack_every, ack_delay=ack_delay,
+                                mss=mss)
+    received = connection.recv()
+    sock.close()
+    return received
 
-    # Continuously receive packets and send back ACK messages if received packets are in-order
-    while True:
-        message, addr = sock.recvfrom(1472)
-        seq_num, ack_num, flags, win = parse_header(message[:12])
-        syn, ack, fin = parse_flags(flags)
-
-        # Runs skip_ack test case
-        if skip_ack:
-            skip_ack = False
-            print("Skipping first ACK msg")
-            continue
-
-        # If a new SYN message received, redo three-way handshake
-        if syn:
-            handle_handshake(sock)
-
-        # If received packet has correct sequence number
-        elif not ack and seq_num >= expected_seq_num:
-            if not fin and seq_num == expected_seq_num:
-                print("Received in-order with seq_num =", seq_num)
-                received_data += message[12:]
-                expected_seq_num += 1
-                send_ack(sock, seq_num, addr)
-
-            elif fin and not ack and seq_num == expected_seq_num:
-                print("Received FIN msg with seq_num", seq_num)
-                send_ack(sock, seq_num, addr)
-                sock.close()
-                return received_data
-            
-            else:
-                print("Received out-of-order with seq_num =", seq_num)
-                # Discarding out-of-order packets
-                pass
 
-
-def SEND_GBN(send_sock, addr, data, window_size, skip_seq_num):
+def SEND_GBN(send_sock, addr, data, window_size, skip_seq_num, rto=None, sack=False, cc=None, pacer=None, data_range=None,
+             gso=False, mss=DEFAULT_MSS, probe_mtu=False, fec=0, compression=None):
     """
     Sends data using the Go-Back-N protocol
 
     Arguments:
         sock (socket): Socket object to use for sending and receiving data
         addr (tuple): IP address and port number of the server/receiver
-        data (bytes): File data to be sent in bytes
+        data (bytes or memoryview): File data to be sent
         window_size (int): The size of the sliding window/the number of packets in flight
         skip_seq_num (bool): Whether to skip a sequence number or not for test cases
+        rto (RTOEstimator): Retransmission timer, a default one is created if None
+        sack (bool): Whether to ask the receiver for selective acknowledgements in the handshake
+        cc (CongestionController): Congestion controller, a fixed window of window_size packets is used if None
+        pacer (Pacer): Spreads the packets evenly over time, packets are sent back to back if None
+        data_range (tuple[int, int]): The byte offset of the data in the file and the size of the file, if the data
+            is one stripe of a striped transfer
+        gso (bool): Whether to send the packets in batches with UDP segmentation offload, if the kernel supports it
+        mss (int): The largest payload size to offer in the handshake
+        probe_mtu (bool): Whether to lower the offered payload size to what the path carries, see DRTPConnection
+        fec (int): The number of data packets per parity packet to offer in the handshake, 0 for no FEC
+        compression (str): The codec to compress the data with if the receiver supports it, None to send it raw
 
     Returns:
         Void
     """
-    # Initiate three-way handshake
-    initiate_handshake(send_sock, addr)
-
-    # Initialize variables
-    next_seq_num = 1
-    base_seq_num = 1
-    unacked_packets = {}
-    data_offset = 0
-    fin_sent = False
-    
-    # Loop until FIN message is sent
-    while not fin_sent:
-        # Initialize the estimated RTT 
-        est_rtt = 0.5
-
-        # Send packets while the number of unacknowledged packets is less than the window size
-        while next_seq_num < base_seq_num + window_size:
-            # Calculate the size of the next chunk of data to send
-            chunk_size = min(1460, len(data) - data_offset)
-            # If no more data and no more unacknowledged packets, send FIN message
-            if chunk_size == 0:
-                if not unacked_packets:
-                    # All sent packets have been acknowledged, send FIN message
-                    fin_packet = create_packet(next_seq_num, 0, 2, 0, b"")
-                    send_sock.sendto(fin_packet, addr)
-                    print("FIN msg sent. Waiting for ACK...")
-                    fin_sent = True
-                    break
-                
-                #  If there are unacknowledged packets, break out of the inner loop to wait for acknowledgements
-                else:
-                    break
-
-            # Slices the next chunk of data to be sent from data
-            chunk_data = data[data_offset : data_offset + chunk_size]
-
-            # Skip sending packet with sequence number 5 if skip_seq_num is True.
-            if skip_seq_num and next_seq_num == 5:
-                skip_seq_num = False
-                print("Skipping seq_num =", next_seq_num)
-                unacked_packets[next_seq_num] = chunk_data
-                next_seq_num += 1
-                data_offset += chunk_size
-                continue
-            
-            # Record packet send time
-            send_time = time.monotonic() 
-
-            # Send the packet, add its data to unacked_packets and increment sequence number and data_offset
-            send(send_sock, chunk_data, next_seq_num, addr)
-            unacked_packets[next_seq_num] = chunk_data
-            next_seq_num += 1
-            data_offset += chunk_size
-
-        # If FIN message not sent, wait for acknowledgement for sent packet
-        if not fin_sent:
-            # Set timeout for receiving ACK message
-            send_sock.settimeout(est_rtt)
-            try:
-                # Receive ACK message, parse header and flags
-                ack_msg, addr = send_sock.recvfrom(1472)
-                seq_num, ack_num, flags, win = parse_header(ack_msg[:12])
-                syn, ack, fin = parse_flags(flags)
-
-                # If ACK is received and within current window, update base_seq_num and remove acked packets from unacked packets
-                if ack and ack_num >= base_seq_num:
-                    print("ACK msg: ack_num =", ack_num)
-
-                    # Calculate the roundtrip time and update the estimated RTT to 4RTT
-                    rtt = time.monotonic() - send_time
-                    est_rtt = 4 * rtt
-                    
-                    # Update base_seq_num
-                    base_seq_num = ack_num + 1
-
-                    # Update unacked packets list
-                    new_unacked_packets = {}
-                    for seq_num, packet_data in unacked_packets.items():
-                        if seq_num >= base_seq_num:
-                            new_unacked_packets[seq_num] = packet_data
-
-                    unacked_packets = new_unacked_packets
-
-            # Resend all unacked packets with original payload that timed out
-            except timeout:
-                print("Timeout occurred. Resending packets")
-                for seq_num, packet_data in unacked_packets.items():
-                    new_packet = create_packet(seq_num, 0, 0, 0, packet_data)
-                    send_sock.sendto(new_packet, addr)
-                
-    # Wait for ACK for the FIN message
-    while True:
-        send_sock.settimeout(est_rtt)
-
-        try:
-            # Receive ACK message, parse header and flags
-            ack_msg, addr = send_sock.recvfrom(1472)
-            seq_num, ack_num, flags, win = parse_header(ack_msg[:12])
-            syn, ack, fin = parse_flags(flags)
-
-            # Exits if ack for FIN is received
-            if ack and ack_num == next_seq_num:
-                print("ACK for FIN msg received. Exiting...")
-                break
-
-        except timeout:   # Exits due to timeout
-            print("Timeout occurred while waiting for ACK for FIN msg. Exiting...")
-            break
+    connection = DRTPConnection(send_sock, addr, "GBN", window_size, rto, cc, pacer, sack, skip_seq_num=skip_seq_num,
+                                data_range=data_range, gso=gso, mss=mss, probe_mtu=probe_mtu, fec=fec,
+                                compression=compression)
+    connection.send(data)
+    connection.close()
 
 
-def RECV_SR(sock, skip_ack, window_size):
+def RECV_SR(sock, skip_ack, window_size, sink=None, ack_every=None, ack_delay=ACK_DELAY, mss=DEFAULT_MSS):
     """
     Receives data from the sender using Selective Repeat protocol
 
@@ -558,182 +2438,49 @@ def RECV_SR(sock, skip_ack, window_size):
         sock (socket): Socket object to receive data with
         skip_ack (bool): Whether to skip sending ACK message or not for test case
         window_size (int): The size of the sliding window/the number of packets in flight
+        sink (file object or callable): Where in-order data is written as it arrives, if None the data is kept in memory
+        ack_every (int): The number of in-order packets acknowledged at once, ACK_EVERY if None
+        ack_delay (float): The number of seconds to delay the ACK of fewer than ack_every packets
+        mss (int): The largest payload size to accept
 
     Returns:
-        A table of all of the received data in bytes, it is used application.py to transfer all the data to a file
+        All of the received data in bytes if no sink was given, else the number of bytes written to the sink
     """
-    # Perform three-way handshake
-    handle_handshake(sock)
-
-    # Initialize variables
-    expected_seq_num = 1  # expected sequence number of the next in-order packet
-    received_data = b""
-    unacked_packets = {}  # dictionary of unacknowledged packets, the keys are the sequence no. of the packets
+    connection = DRTPConnection(sock, None, "SR", window_size, sink=sink, skip_ack=skip_ack, ack_every=ack_every,
+                                ack_delay=ack_delay, mss=mss)
+    received = connection.recv()
+    sock.close()
+    return received
 
-    while True:
-        message, addr = sock.recvfrom(1472)  # Receives a packet
-        seq_num, ack_num, flags, win = parse_header(message[:12])  # Parses header of packet
-        syn, ack, fin = parse_flags(flags)  # Parse flags from the header
 
-        if skip_ack:  # Runs skip_ack test case
-            skip_ack = False
-            print("Skipping first ACK msg")
-            continue
-
-        if syn:  # Perfoms handshake again if syn flag is used
-            handle_handshake(sock)
-
-        # Process packet if received packet is not an ACK and its sequence number is greater/equal to the expected sequence no.
-        # and the no. of unacknowledged packets is less than the window size
-        elif not ack and seq_num >= expected_seq_num and len(unacked_packets) < window_size:
-            if not fin and seq_num == expected_seq_num:
-                print("Received in-order with seq_num =", seq_num)
-                received_data += message[12:]  # Add packet data to received data
-                expected_seq_num += 1  # Update expected seq num to next in order packet
-
-                send_ack(sock, seq_num, addr)  # Acknowledge the last received packet
-
-                # Send acks for any other received but unacked packets
-                while expected_seq_num in unacked_packets:
-                    received_data += unacked_packets[expected_seq_num]  # Add unacked packet to received data
-                    expected_seq_num += 1
-                    del unacked_packets[expected_seq_num - 1]  # Remove acked packet from unacked packets list
-                    send_ack(sock, expected_seq_num - 1, addr)
-
-            # Close connection if packet is a FIN and sequence no. and expected sequence no. is equal
-            elif fin and not ack and seq_num == expected_seq_num:
-                print("Received FIN msg with seq_num", seq_num)
-                send_ack(sock, seq_num, addr)
-                sock.close()
-                return received_data
-            
-            else:  # Packet is out of order and is added to unacked_packets
-                print("Received out-of-order with seq_num =", seq_num)
-                # Send an acknowledgment for the last received in-order packet
-                send_ack(sock, expected_seq_num - 1, addr)
-                # Add the out-of-order packet to the unacknowledged list
-                unacked_packets[seq_num] = message[12:]
-
-                # Send acks for any other received but unacknowledged packets in order
-                while expected_seq_num in unacked_packets:
-                    received_data += unacked_packets[expected_seq_num]
-                    expected_seq_num += 1
-                    del unacked_packets[expected_seq_num - 1]
-                    send_ack(sock, expected_seq_num - 1, addr)
-
-
-def SEND_SR(send_sock, addr, data, window_size, skip_seq_num):
+def SEND_SR(send_sock, addr, data, window_size, skip_seq_num, rto=None, sack=False, cc=None, pacer=None, data_range=None,
+             gso=False, mss=DEFAULT_MSS, probe_mtu=False, fec=0, compression=None):
     """
     Sends data to the receiver using the Selective Repeat protocol
 
     Arguments:
         send_sock (socket): Socket object to use for sending and receiving data
         addr (tuple): IP address and port number of the server/receiver
-        data (bytes): File data to be sent in bytes
+        data (bytes or memoryview): File data to be sent
         window_size (int): The size of the sliding window/the number of packets in flight
         skip_seq_num (bool): Whether to skip a sequence number or not for test cases
+        rto (RTOEstimator): Retransmission timer, a default one is created if None
+        sack (bool): Whether to ask the receiver for selective acknowledgements in the handshake
+        cc (CongestionController): Congestion controller, a fixed window of window_size packets is used if None
+        pacer (Pacer): Spreads the packets evenly over time, packets are sent back to back if None
+        data_range (tuple[int, int]): The byte offset of the data in the file and the size of the file, if the data
+            is one stripe of a striped transfer
+        gso (bool): Whether to send the packets in batches with UDP segmentation offload, if the kernel supports it
+        mss (int): The largest payload size to offer in the handshake
+        probe_mtu (bool): Whether to lower the offered payload size to what the path carries, see DRTPConnection
+        fec (int): The number of data packets per parity packet to offer in the handshake, 0 for no FEC
+        compression (str): The codec to compress the data with if the receiver supports it, None to send it raw
 
     Returns:
         Void
     """
-    # Initiate three-way handshake
-    initiate_handshake(send_sock, addr)
-
-    # Initialize variables
-    next_seq_num = 1
-    base_seq_num = 1
-    unacked_packets = {}
-    data_offset = 0
-    fin_sent = False
-    
-    # Loop until FIN message is sent
-    while not fin_sent:
-        # Initialize the estimated RTT
-        est_rtt = 0.5
-
-        # Send packets while the number of unacknowledged packets is less than the window size
-        while next_seq_num < base_seq_num + window_size:
-            # Calculate the size of the next chunk of data to send
-            chunk_size = min(1460, len(data) - data_offset)
-            # If no more data and no more unacknowledged packets, send FIN message
-            if chunk_size == 0:  
-                if not unacked_packets:
-                    # All data has been sent and acknowledged, send FIN message
-                    fin_packet = create_packet(next_seq_num, 0, 2, 0, b"")
-                    send_sock.sendto(fin_packet, addr)
-                    print("FIN msg sent. Waiting for ACK...")
-                    fin_sent = True
-                    break
-
-                #  If there are unacknowledged packets, break out of the inner loop to wait for acknowledgements
-                else:
-                    break
-
-            # Slices the next chunk of data to be sent from data
-            chunk_data = data[data_offset : data_offset + chunk_size]
-
-            # Skip sending packet with sequence number 5 if skip_seq_num is True.
-            if skip_seq_num and next_seq_num == 5:
-                skip_seq_num = False
-                print("Skipping seq_num =", next_seq_num)
-                unacked_packets[next_seq_num] = chunk_data
-                next_seq_num += 1
-                data_offset += chunk_size
-                continue
-            
-            # Record packet send time
-            send_time = time.monotonic()    
-
-            # Send the packet, add it to unacked packets and update next seq num and data offset
-            send(send_sock, chunk_data, next_seq_num, addr)
-            unacked_packets[next_seq_num] = chunk_data
-            next_seq_num += 1
-            data_offset += chunk_size
-
-        # If FIN message not sent, wait for acknowledgement for sent packet
-        if not fin_sent:
-            # Set timeout for receiving ACK message
-            send_sock.settimeout(est_rtt)
-            try:
-                # Receive ACK message, parse header and flags
-                ack_msg, addr = send_sock.recvfrom(1472)
-                seq_num, ack_num, flags, win = parse_header(ack_msg[:12])
-                syn, ack, fin = parse_flags(flags)
-
-                # If ACK is received and within current window, update base_seq_num and remove acked packets from unacked packets
-                if ack and ack_num >= base_seq_num:
-                    print("ACK msg: ack_num =", ack_num)
-
-                    # Calculate the roundtrip time and update the estimated RTT to 4RTT
-                    rtt = time.monotonic() - send_time
-                    est_rtt = 4 * rtt
-
-                    # Remove acknowledged packets from unacked_packets and update base_seq_num 
-                    if ack_num in unacked_packets:
-                        del unacked_packets[ack_num]
-                        base_seq_num = ack_num + 1
-
-            # Resend unacked packets that timed out
-            except timeout:
-                print("Timeout occurred. Resending packets")
-                for seq_num, packet_data in unacked_packets.items():
-                    new_packet = create_packet(seq_num, 0, 0, 0, packet_data)
-                    send_sock.sendto(new_packet, addr)
-
-    # Wait for ACK for the FIN message
-    while True:
-        send_sock.settimeout(est_rtt)
-
-        try:
-            ack_msg, addr = send_sock.recvfrom(1472)
-            seq_num, ack_num, flags, win = parse_header(ack_msg[:12])
-            syn, ack, fin = parse_flags(flags)
-
-            # Exits if ack for FIN is received
-            if ack and ack_num == next_seq_num:
-                print("ACK for FIN msg received. Exiting...")
-                break
-
-        except timeout:  # Exits due to timeout
-            print("Timeout occurred while waiting for ACK for FIN msg. Exiting...")
-            break
+    connection = DRTPConnection(send_sock, addr, "SR", window_size, rto, cc, pacer, sack, skip_seq_num=skip_seq_num,
+                                data_range=data_range, gso=gso, mss=mss, probe_mtu=probe_mtu, fec=fec,
+                                compression=compression)
+    connection.send(data)
+    connection.close()
@@ -1,9 +1,15 @@
+import os
 import time
+import mmap
+import multiprocessing
 from socket import *
 import ipaddress
 import argparse
 import sys
 from DRTP import *
+from delta import *
+from checkpoint import *
+from batch import *
 
 def check_ip(ip_address):
     '''
@@ -53,9 +59,10 @@ def check_port(port_number):
     return port_number
 
 
-def run_server(ip_address, port, reliable_method, window_size, test):
+def run_server(ip_address, port, reliable_method, window_size, test, multi=False, stripes=1, ack_every=None,
+               ack_delay=ACK_DELAY, gro=False, mss=DEFAULT_MSS, delta=False, resume=False, batch=False):
     '''
-    Receives data using the specified reliability function and saves the received file to "received_file.jpg"
+    Receives data using the specified reliability function and streams the received file to "received_file.jpg"
 
     Args:
         ip_address(IPv4Address): the IP address to bind the socket to
@@ -63,14 +70,27 @@ def run_server(ip_address, port, reliable_method, window_size, test):
         reliable_method(str): the reliability function to use, "SAW", "GBN", or "SR"
         window_size(int): the size of the sliding window, which is only used for "SR"
         test(boolean): whether or not to enable test mode, which is only used for "SAW" or "GBN"
+        multi(boolean): whether to keep serving and receive files from many clients at once, see serve_clients()
+        stripes(int): the number of stripes of a striped transfer, see receive_striped()
+        ack_every(int): the number of in-order packets acknowledged at once, a default for the method if None
+        ack_delay(float): the number of seconds to delay the ACK of fewer than ack_every packets
+        gro(boolean): whether to let the kernel coalesce the incoming packets with UDP receive offload (Linux)
+        mss(int): the largest payload size in bytes to accept from the client
+        delta(boolean): whether to keep the received file as the copy a client sends changes against, see receive_delta()
+        resume(boolean): whether to keep a checkpoint of the received file to resume from, see receive_resumable()
+        batch(boolean): whether to receive a batch of files into "received_files", see receive_batch()
 
     Returns:
         Void
     '''
     # Set the name and path of the file that the server will save the incoming data to
     file_path = "received_file.jpg"
-    # Initialize a variable to store the incoming data from the client
-    received_data = b""
+
+    # Receive the stripes of a striped transfer on consecutive ports if specified
+    if stripes > 1:
+        receive_striped(ip_address, port, reliable_method, window_size, test, stripes, file_path, ack_every, ack_delay,
+                        gro, mss)
+        return
 
     try:
         # Create a UDP socket for the server 
@@ -86,18 +106,41 @@ def run_server(ip_address, port, reliable_method, window_size, test):
         print("Failed to bind. Error:", e)
         sys.exit()
 
-    try:
-        # Call the appropriate function based on the reliability method specified, and receive the data accordingly
-        if reliable_method == "SAW":
-            received_data = RECV_SAW(server_socket, test)
-        elif reliable_method == "GBN":
-            received_data = RECV_GBN(server_socket, test)
-        elif reliable_method == "SR":
-            received_data = RECV_SR(server_socket, test, window_size)
+    # Enable receive offload if specified, the packets are received one by one if the kernel does not support it
+    if gro and not enable_gro(server_socket):
+        print("UDP receive offload is not available, receiving every packet on its own")
+
+    # Keep serving many clients at once if specified
+    if multi:
+        serve_clients(server_socket, reliable_method, window_size, test, ack_every, ack_delay, mss)
+        return
+
+    # Take the changes against the copy of the file if specified
+    if delta:
+        receive_delta(server_socket, reliable_method, window_size, test, file_path, ack_every, ack_delay, mss)
+        return
 
-        # Open the file at the specified path and write the received data to it
+    # Keep a checkpoint to resume from if specified
+    if resume:
+        receive_resumable(server_socket, reliable_method, window_size, test, file_path, ack_every, ack_delay, mss)
+        return
+
+    # Unpack a batch of files into a directory if specified
+    if batch:
+        receive_batch(server_socket, reliable_method, window_size, test, "received_files", file_path, ack_every,
+                      ack_delay, mss)
+        return
+
+    try:
+        # Open the file at the specified path, the received data is streamed to it as it arrives
         with open(file_path, "wb") as file:
-            file.write(received_data)
+            # Call the appropriate function based on the reliability method specified, and receive the data accordingly
+            if reliable_method == "SAW":
+                RECV_SAW(server_socket, test, file, mss)
+            elif reliable_method == "GBN":
+                RECV_GBN(server_socket, test, file, ack_every, ack_delay, mss)
+            elif reliable_method == "SR":
+                RECV_SR(server_socket, test, window_size, file, ack_every, ack_delay, mss)
 
         # Print a message to indicate that the file has been received and saved
         print(f"File received and saved to {file_path}")
@@ -107,7 +150,634 @@ def run_server(ip_address, port, reliable_method, window_size, test):
         sys.exit()
 
 
-def run_client(ip_address, port, reliable_method, file_path, window_size, test):
+def receive_delta(server_socket, reliable_method, window_size, test, file_path, ack_every=None, ack_delay=ACK_DELAY,
+                  mss=DEFAULT_MSS):
+    '''
+    Receives a new version of the file from a client that sends only the changes against the server's copy, see
+    delta.py. The client asks for a delta transfer in the handshake of an empty connection, the server answers
+    with the signatures of the blocks of its copy on a connection to the client, and the client then sends the
+    blocks it found in the copy as references and the rest as literal data. The file is rebuilt next to the copy
+    and replaces it once complete and once it has the digest of the client's file. A client that does not ask for a delta transfer sends the whole file
+
+    Args:
+        server_socket(socket): the bound UDP socket of the server
+        reliable_method(str): the reliability function to use, "SAW", "GBN", or "SR"
+        window_size(int): the size of the sliding window
+        test(boolean): whether or not to enable test mode
+        file_path(str): the path of the server's copy of the file, replaced by the new version
+        ack_every(int): the number of in-order packets acknowledged at once, a default for the method if None
+        ack_delay(float): the number of seconds to delay the ACK of fewer than ack_every packets
+        mss(int): the largest payload size in bytes to accept from the client
+
+    Returns:
+        Void
+    '''
+    # The new version is written next to the copy, which is read while the file is rebuilt
+    temp_path = file_path + ".delta"
+    try:
+        # Receive the request, a client without delta transfers sends the whole file on it
+        with open(temp_path, "wb") as file:
+            request = DRTPConnection(server_socket, None, reliable_method, window_size, sink=file, skip_ack=test,
+                                     ack_every=ack_every, ack_delay=ack_delay, mss=mss, delta=DELTA_MAX_BLOCK)
+            request.recv()
+        if not request.delta:
+            os.replace(temp_path, file_path)
+            print(f"File received and saved to {file_path}")
+            return
+
+        # A server without a copy sends no signatures and the client sends all of the file as literal data
+        basis = open(file_path, "rb") if os.path.exists(file_path) else None
+        try:
+            # Send the signatures of the copy back to the client on the same socket
+            signatures = block_signatures(basis, request.delta)
+            print(f"Sending the signatures of {(len(signatures) - basis_struct.size) // signature_struct.size} "
+                  f"blocks of {request.delta} bytes")
+            reply = DRTPConnection(server_socket, request.addr, reliable_method, window_size, mss=mss)
+            reply.send(signatures)
+            reply.close()
+
+            # Rebuild the file from the copy and the changes as they arrive
+            with open(temp_path, "wb") as file:
+                decoder = DeltaDecoder(file, basis, request.delta)
+                transfer = DRTPConnection(server_socket, None, reliable_method, window_size, sink=decoder,
+                                          skip_ack=test, ack_every=ack_every, ack_delay=ack_delay, mss=mss,
+                                          delta=request.delta)
+                delta_size = transfer.recv()
+                decoder.close()
+        finally:
+            if basis is not None:
+                basis.close()
+
+        # The copy is only replaced by a file that has the digest of the client's file, a copy that changed after
+        # its signatures were sent rebuilds a different file
+        if not decoder.matches():
+            os.remove(temp_path)
+            print(f"The rebuilt file does not match the client's file, {file_path} was left unchanged")
+            return
+        os.replace(temp_path, file_path)
+        print(f"File of {decoder.bytes_written} bytes rebuilt from {delta_size} bytes of changes and saved to "
+              f"{file_path}")
+
+    # If the user interrupts the program with Ctrl+C, exit gracefully
+    except KeyboardInterrupt:
+        sys.exit()
+
+    finally:
+        server_socket.close()
+
+
+def receive_resumable(server_socket, reliable_method, window_size, test, file_path, ack_every=None,
+                      ack_delay=ACK_DELAY, mss=DEFAULT_MSS):
+    '''
+    Receives a file and keeps a checkpoint of the part of it that is complete next to it, see checkpoint.py. A
+    client with --resume continues from the checkpoint of an earlier, interrupted run of the server. If the
+    client restarts during the transfer, the server ends the interrupted connection, saves a checkpoint and the
+    client continues from it on a new connection. The server receives until the whole file has arrived
+
+    Args:
+        see receive_delta() for the arguments
+
+    Returns:
+        Void
+    '''
+    try:
+        while True:
+            checkpoint = load_checkpoint(file_path)
+            if checkpoint[0]:
+                print(f"Found a checkpoint of {file_path} at byte {checkpoint[0]}")
+            # The partial file is kept, the data is written from the start or from the checkpoint
+            with open(file_path, "r+b" if os.path.exists(file_path) else "w+b") as file:
+                output = CheckpointedFile(file, file_path, checkpoint)
+                connection = DRTPConnection(server_socket, None, reliable_method, window_size, sink=output,
+                                            skip_ack=test, ack_every=ack_every, ack_delay=ack_delay, mss=mss,
+                                            checkpoint=output.checkpoint())
+                try:
+                    connection.recv()
+                # Keep what was written so far when the server is stopped
+                except KeyboardInterrupt:
+                    output.save()
+                    raise
+
+                if connection.interrupted:
+                    output.save()
+                    print(f"Saved a checkpoint at byte {output.offset}, waiting for the client to resume")
+                    continue
+                # The file is complete once the sender's FIN arrives, unless the client did not resume from the
+                # checkpoint because its file does not match
+                if OPTION_RESUME not in connection.options or output.offset == connection.resume_size:
+                    file.truncate(output.offset)
+                    break
+            print("The client's file does not match the checkpoint, starting over")
+            remove_checkpoint(file_path)
+
+        remove_checkpoint(file_path)
+        print(f"File received and saved to {file_path}")
+
+    # If the user interrupts the program with Ctrl+C, exit gracefully
+    except KeyboardInterrupt:
+        sys.exit()
+
+    finally:
+        server_socket.close()
+
+
+def receive_batch(server_socket, reliable_method, window_size, test, directory, file_path, ack_every=None,
+                  ack_delay=ACK_DELAY, mss=DEFAULT_MSS):
+    '''
+    Receives a batch of files on one connection and writes them into a directory as they arrive, see batch.py. A
+    client that does not send a batch sends a single file, which is written to the directory too
+
+    Args:
+        directory(str): the directory to write the files to
+        file_path(str): the name of the file a client without --batch sends
+        see receive_delta() for the other arguments
+
+    Returns:
+        Void
+    '''
+    try:
+        writer = BatchWriter(directory, file_path)
+        connection = DRTPConnection(server_socket, None, reliable_method, window_size, sink=writer, skip_ack=test,
+                                    ack_every=ack_every, ack_delay=ack_delay, mss=mss, batch=True)
+        connection.recv()
+        writer.close()
+        print(f"{writer.files} files of {writer.bytes_written} bytes received and saved to {directory}")
+
+    # If the user interrupts the program with Ctrl+C, exit gracefully
+    except KeyboardInterrupt:
+        sys.exit()
+
+    finally:
+        server_socket.close()
+
+
+def serve_clients(server_socket, reliable_method, window_size, test, ack_every=None, ack_delay=ACK_DELAY,
+                  mss=DEFAULT_MSS):
+    '''
+    Receives files from any number of clients at once until interrupted. Every upload is a session of its own,
+    told apart by the client's address and connection id, and is streamed to "received_file_<ip>_<port>_<id>.jpg"
+
+    Args:
+        server_socket(socket): the bound socket to receive on
+        reliable_method(str): the reliability function to use, "SAW", "GBN", or "SR"
+        window_size(int): the size of the sliding window, which is only used for "SR"
+        test(boolean): whether or not to enable test mode, which is only used for "SAW" or "GBN"
+        ack_every(int): the number of in-order packets acknowledged at once, a default for the method if None
+        ack_delay(float): the number of seconds to delay the ACK of fewer than ack_every packets
+        mss(int): the largest payload size in bytes to accept from a client
+
+    Returns:
+        Void
+    '''
+    # The open output file of every session
+    files = {}
+
+    def open_session(addr, connection_id):
+        # Open a file of its own for the new session
+        file = open(f"received_file_{addr[0]}_{addr[1]}_{connection_id}.jpg", "wb")
+        files[(addr, connection_id)] = file
+        return file
+
+    def end_session(connection):
+        # Close the file of the session and report whether the upload is complete
+        file = files.pop((connection.addr, connection.connection_id))
+        file.close()
+        if connection.result is None:
+            print(f"Upload to {file.name} aborted")
+        else:
+            print(f"File received and saved to {file.name}")
+
+    server = DRTPServer(server_socket, reliable_method, window_size, open_session, end_session, test, ack_every, ack_delay,
+                        mss)
+    print("Serving clients until interrupted")
+    try:
+        server.serve_forever()
+
+    # If the user interrupts the program with Ctrl+C, close the unfinished uploads and exit gracefully
+    except KeyboardInterrupt:
+        server.close()
+        server_socket.close()
+        sys.exit()
+
+
+def receive_stripe(ip_address, port, reliable_method, window_size, test, file_path, ack_every=None, ack_delay=ACK_DELAY,
+                   gro=False, mss=DEFAULT_MSS):
+    '''
+    Receives one stripe of a striped transfer on its own port and writes it at its offset in the output file,
+    runs in a worker process
+
+    Args:
+        ip_address(IPv4Address): the IP address to bind the socket to
+        port(int): the port number of the stripe
+        reliable_method(str): the reliability function to use, "SAW", "GBN", or "SR"
+        window_size(int): the size of the sliding window, which is only used for "SR"
+        test(boolean): whether or not to enable test mode, which is only used for "SAW" or "GBN"
+        file_path(str): the output file, which must already exist
+        ack_every(int): the number of in-order packets acknowledged at once, a default for the method if None
+        ack_delay(float): the number of seconds to delay the ACK of fewer than ack_every packets
+        gro(boolean): whether to let the kernel coalesce the incoming packets with UDP receive offload (Linux)
+        mss(int): the largest payload size in bytes to accept from the client
+
+    Returns:
+        tuple[int, int, int] or None: the offset of the stripe in the file, the number of bytes received and the
+        size of the whole file, None if the socket could not be bound
+    '''
+    try:
+        # Create a UDP socket for the stripe and bind it to its port
+        stripe_socket = socket(AF_INET, SOCK_DGRAM)
+        stripe_socket.bind((ip_address, port))
+    except Exception as e:
+        print("Failed to bind. Error:", e)
+        return None
+    if gro:
+        enable_gro(stripe_socket)
+
+    # The file is opened without truncating it, the other stripes are written to it at the same time
+    with open(file_path, "r+b") as file:
+        connection = DRTPConnection(stripe_socket, None, reliable_method, window_size, sink=file, skip_ack=test,
+                                    ack_every=ack_every, ack_delay=ack_delay, mss=mss)
+        received = connection.recv()
+    stripe_socket.close()
+
+    # A client that does not stripe sends the whole file from offset 0
+    offset, file_size = connection.data_range if connection.data_range is not None else (0, received)
+    return offset, received, file_size
+
+
+def receive_striped(ip_address, port, reliable_method, window_size, test, stripes, file_path, ack_every=None,
+                    ack_delay=ACK_DELAY, gro=False, mss=DEFAULT_MSS):
+    '''
+    Receives a file sent in stripes by a client started with the same number of stripes. Every stripe is a DRTP
+    session of its own on the ports port to port + stripes - 1, received by a pool of worker processes so the
+    transfer is not limited to one CPU core. The client tells each stripe's byte range in the handshake, the
+    stripes are written at their offsets and the file is complete once the stripes cover it
+
+    Args:
+        ip_address(IPv4Address): the IP address to bind the sockets to
+        port(int): the port number of the first stripe
+        reliable_method(str): the reliability function to use, "SAW", "GBN", or "SR"
+        window_size(int): the size of the sliding window, which is only used for "SR"
+        test(boolean): whether or not to enable test mode, which is only used for "SAW" or "GBN"
+        stripes(int): the number of stripes
+        file_path(str): the name and path of the output file
+        ack_every(int): the number of in-order packets acknowledged at once, a default for the method if None
+        ack_delay(float): the number of seconds to delay the ACK of fewer than ack_every packets
+        gro(boolean): whether to let the kernel coalesce the incoming packets with UDP receive offload (Linux)
+        mss(int): the largest payload size in bytes to accept from the client
+
+    Returns:
+        Void
+    '''
+    # Create the output file before the workers open it
+    open(file_path, "wb").close()
+    print(f"Server listening on {ip_address}:{port}-{port + stripes - 1}")
+
+    try:
+        with multiprocessing.Pool(stripes) as pool:
+            results = pool.starmap(receive_stripe, [(ip_address, port + i, reliable_method, window_size, test, file_path,
+                                                     ack_every, ack_delay, gro, mss) for i in range(stripes)])
+
+    # If the user interrupts the program with Ctrl+C, exit gracefully
+    except KeyboardInterrupt:
+        sys.exit()
+
+    # The file is complete if the stripes follow each other without a gap up to the end of the file
+    if None in results:
+        print("Striped transfer failed")
+        return
+    position = 0
+    for offset, received, file_size in sorted(results):
+        if offset != position:
+            break
+        position += received
+    if position != results[0][2]:
+        print(f"Striped transfer incomplete, {position} of {results[0][2]} bytes received in order")
+        return
+
+    # Print a message to indicate that the file has been received and saved
+    print(f"File received and saved to {file_path}")
+
+
+def open_file_view(file):
+    '''
+    Memory-maps the given file and returns a read-only view of it, so the sender can slice segments out of the
+    page cache without reading the whole file into memory
+
+    Args:
+        file(file object): the opened file to map
+
+    Returns:
+        tuple[memoryview or bytes, mmap or None]: the view of the file data and the mapping to close when done
+    '''
+    try:
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    # Empty files and non-regular files cannot be mapped, fall back to reading them
+    except (ValueError, OSError):
+        return file.read(), None
+
+    return memoryview(mapping), mapping
+
+
+def close_file_view(view, mapping):
+    '''
+    Releases a view returned by open_file_view and closes its mapping
+
+    Args:
+        view(memoryview or bytes): the view of the file data
+        mapping(mmap or None): the mapping of the file
+
+    Returns:
+        Void
+    '''
+    if mapping is None:
+        return
+
+    try:
+        view.release()
+        mapping.close()
+    # Segments sliced from the view may still be referenced, the mapping is then closed once they are freed
+    except BufferError:
+        pass
+
+
+def write_cwnd_log(cc, log_path):
+    '''
+    Writes the congestion window history of a transfer to a CSV file
+
+    Args:
+        cc(CongestionController): the congestion controller used for the transfer
+        log_path(str): the path of the CSV file
+
+    Returns:
+        Void
+    '''
+    with open(log_path, "w") as log:
+        log.write("time,cwnd\n")
+        for elapsed, cwnd in cc.history:
+            log.write(f"{elapsed:.6f},{cwnd}\n")
+
+
+def send_file_data(sender_sock, addr, reliable_method, data, window_size, test, min_rto, max_rto, sack, congestion_control,
+                   pace, pacing_rate, data_range=None, gso=False, mss=DEFAULT_MSS, probe_mtu=False,
+                   fec=0, compression=None, delta=False, resume=False, batch=False):
+    '''
+    Sends data with the given reliability function, see run_client() for the options
+
+    Args:
+        sender_sock(socket): the UDP socket to send with
+        addr(tuple): the IP address and port number of the server
+        data(memoryview or bytes): the data to send
+        data_range(tuple[int, int]): the offset of the data in the file and the size of the file, for a stripe
+        gso(boolean): whether to send batches of packets with UDP segmentation offload, only used for "GBN" and "SR"
+        mss(int): the largest payload size in bytes, lowered to what the server accepts
+        probe_mtu(boolean): whether to lower the payload size to the path MTU found with probes in the handshake
+        fec(int): the number of packets per XOR parity packet the server rebuilds a lost packet from, 0 for none
+        compression(str): the codec to compress the data with if the server supports it, None to send it raw
+        delta(boolean): whether to send only the changes against the server's copy of the file, see send_delta()
+        resume(boolean): whether to continue from the part of the file the server already has, see send_resumable()
+        batch(boolean): whether the data is a batch of files, a BatchEncoder, see send_file_batch()
+
+    Returns:
+        CongestionController: the congestion controller used for the transfer
+    '''
+    # Create the retransmission timer shared by the handshake, the data transfer and the teardown
+    rto = RTOEstimator(min_rto=min_rto, max_rto=max_rto)
+    # Create the congestion controller of the sliding window senders
+    cc = create_controller(congestion_control, window_size)
+    # Create the pacer, a fixed pacing rate implies pacing
+    pacer = None
+    if pace or pacing_rate:
+        pacer = Pacer(pacing_rate * 1000000 / 8 if pacing_rate else None)
+
+    # Send only the changes if specified
+    if delta:
+        send_delta(sender_sock, addr, reliable_method, data, window_size, test, rto, sack, cc, pacer, gso, mss,
+                   probe_mtu, fec, compression)
+    # Send only the part of the file the server does not have if specified
+    elif resume:
+        send_resumable(sender_sock, addr, reliable_method, data, window_size, test, rto, sack, cc, pacer, gso, mss,
+                       probe_mtu, fec, compression)
+    # Send many files on one connection if specified
+    elif batch:
+        send_file_batch(sender_sock, addr, reliable_method, data, window_size, test, rto, sack, cc, pacer, gso, mss,
+                        probe_mtu, fec, compression)
+    # Call the appropriate function to send the file based on the reliability method specified
+    elif reliable_method == "SAW":
+        SEND_SAW(sender_sock, addr, data, rto, data_range, mss, probe_mtu, compression)
+    elif reliable_method == "GBN":
+        SEND_GBN(sender_sock, addr, data, window_size, test, rto, sack, cc, pacer, data_range, gso, mss, probe_mtu,
+                 fec, compression)
+    elif reliable_method == "SR":
+        SEND_SR(sender_sock, addr, data, window_size, test, rto, sack, cc, pacer, data_range, gso, mss, probe_mtu,
+                 fec, compression)
+    return cc
+
+
+def open_sender(sender_sock, addr, reliable_method, window_size, test, rto, sack, cc, pacer, gso=False,
+                mss=DEFAULT_MSS, probe_mtu=False, fec=0, compression=None, **options):
+    '''
+    Creates the sending side of a connection with the options of send_file_data(), for the transfers that take
+    more than one connection or a handshake before the data is known
+
+    Args:
+        options(dict): further arguments of the connection, e.g. delta or resume_size
+        see send_file_data() and send_delta() for the other arguments
+
+    Returns:
+        DRTPConnection: the connection, not connected yet
+    '''
+    # Stop-and-wait has a single packet in flight
+    if reliable_method == "SAW":
+        window_size, cc, pacer, gso = 1, None, None, False
+    return DRTPConnection(sender_sock, addr, reliable_method, window_size, rto, cc, pacer, sack, skip_seq_num=test,
+                          gso=gso, mss=mss, probe_mtu=probe_mtu, fec=fec, compression=compression, **options)
+
+
+def send_file_batch(sender_sock, addr, reliable_method, data, window_size, test, rto, sack, cc, pacer, gso=False,
+                    mss=DEFAULT_MSS, probe_mtu=False, fec=0, compression=None):
+    '''
+    Sends a batch of files to a server with --batch on one connection, see receive_batch(). The handshake and the
+    teardown are paid once and the window stays open from one file to the next, so many small files are sent at
+    the speed of one large file. Nothing is sent if the server does not accept a batch
+
+    Args:
+        data(BatchEncoder): the files to send
+        see send_delta() for the other arguments
+
+    Returns:
+        Void
+    '''
+    connection = open_sender(sender_sock, addr, reliable_method, window_size, test, rto, sack, cc, pacer, gso, mss,
+                             probe_mtu, fec, compression, batch=True)
+    connection.connect()
+    # A server without --batch would save the batch as a single file
+    if not connection.batch:
+        print("Error: the server does not accept a batch of files, start it with --batch")
+        connection.close()
+        sys.exit()
+    connection.send(data)
+    connection.close()
+    print(data.summary())
+
+
+def send_resumable(sender_sock, addr, reliable_method, data, window_size, test, rto, sack, cc, pacer, gso=False,
+                   mss=DEFAULT_MSS, probe_mtu=False, fec=0, compression=None):
+    '''
+    Sends a file to a server with --resume, which keeps a checkpoint of the part of the file it has, see
+    receive_resumable(). The server answers the handshake with its checkpoint, and if the digest of the checkpoint
+    matches the start of the file only the rest of the file is sent. Otherwise the connection is closed without
+    data, the server drops its checkpoint and the whole file is sent on a new connection
+
+    Args:
+        see send_delta() for the arguments
+
+    Returns:
+        Void
+    '''
+    while True:
+        connection = open_sender(sender_sock, addr, reliable_method, window_size, test, rto, sack, cc, pacer, gso,
+                                 mss, probe_mtu, fec, compression, resume_size=len(data))
+        connection.connect()
+        # A server without --resume receives the whole file
+        if connection.checkpoint is None:
+            offset = 0
+            break
+        offset, digest = connection.checkpoint
+        if offset <= len(data) and prefix_digest(data, offset) == digest:
+            break
+        print("The server's partial file does not match this file, starting over")
+        connection.close()
+
+    if offset:
+        print(f"Resuming from byte {offset} of {len(data)}")
+    connection.send(data[offset:])
+    connection.close()
+
+
+def send_delta(sender_sock, addr, reliable_method, data, window_size, test, rto, sack, cc, pacer, gso=False,
+               mss=DEFAULT_MSS, probe_mtu=False, fec=0, compression=None):
+    '''
+    Sends a new version of a file to a server with --delta, which has a copy of the file, see receive_delta(). The
+    data is sent whole if the server does not accept a delta transfer
+
+    Args:
+        sender_sock(socket): the UDP socket to send with, the server's signatures are received on it too
+        addr(tuple): the IP address and port number of the server
+        data(memoryview or bytes): the new version of the file
+        rto(RTOEstimator): the retransmission timer shared by the connections
+        cc(CongestionController): the congestion controller shared by the connections, only used for "GBN" and "SR"
+        pacer(Pacer): spreads the packets evenly over time, only used for "GBN" and "SR"
+        see send_file_data() for the other options
+
+    Returns:
+        Void
+    '''
+    def open_connection(**options):
+        return open_sender(sender_sock, addr, reliable_method, window_size, test, rto, sack, cc, pacer, gso, mss,
+                           probe_mtu, fec, compression, **options)
+
+    # Ask for a delta transfer in the handshake, with a block size that suits the size of the file
+    request = open_connection(delta=delta_block_size(len(data)))
+    request.connect()
+    if not request.delta:
+        print("The server does not accept a delta transfer, sending the whole file")
+        request.send(data)
+        request.close()
+        return
+    request.close()
+
+    # The server answers with the signatures of its copy on a connection of its own
+    signatures = DRTPConnection(sender_sock, None, reliable_method, window_size, mss=mss).recv()
+    print(f"Received the signatures of {(len(signatures) - basis_struct.size) // signature_struct.size} blocks")
+
+    # Send the changes, the delta is worked out as the window opens
+    encoder = DeltaEncoder(data, signatures, request.delta)
+    transfer = open_connection(delta=request.delta)
+    transfer.send(encoder)
+    transfer.close()
+    print(encoder.summary())
+
+
+def send_stripe(ip_address, port, reliable_method, file_path, start, end, window_size, test, min_rto, max_rto, sack,
+                congestion_control, pace, pacing_rate, gso=False, mss=DEFAULT_MSS, probe_mtu=False, fec=0,
+                compression=None):
+    '''
+    Sends one stripe of a file to its own port of the server, runs in a worker process
+
+    Args:
+        port(int): the port number of the stripe
+        start(int): the offset of the first byte of the stripe
+        end(int): the offset after the last byte of the stripe
+        see run_client() for the other options
+
+    Returns:
+        Void
+    '''
+    # Every worker maps the file itself, only the stripe is sent from it
+    sender_sock = socket(AF_INET, SOCK_DGRAM)
+    with open(file_path, "rb") as f:
+        file_data, mapping = open_file_view(f)
+
+    try:
+        send_file_data(sender_sock, (ip_address, port), reliable_method, file_data[start:end], window_size, test,
+                       min_rto, max_rto, sack, congestion_control, pace, pacing_rate, (start, len(file_data)), gso,
+                       mss, probe_mtu, fec, compression)
+    finally:
+        sender_sock.close()
+        close_file_view(file_data, mapping)
+
+
+def send_striped(ip_address, port, reliable_method, file_path, window_size, test, min_rto, max_rto, sack,
+                 congestion_control, pace, pacing_rate, stripes, gso=False, mss=DEFAULT_MSS, probe_mtu=False,
+                 fec=0, compression=None):
+    '''
+    Splits a file into byte ranges of whole packets and sends each range as a DRTP session of its own to the ports
+    port to port + stripes - 1 of a server started with the same number of stripes. The stripes are sent by a pool
+    of worker processes, so the transfer is not limited to one CPU core
+
+    Args:
+        stripes(int): the number of stripes
+        see run_client() for the other options
+
+    Returns:
+        Void, prints the throughput of the whole transfer
+    '''
+    try:
+        file_size = os.path.getsize(file_path)
+    # Handle an OSError if the file cannot be found
+    except OSError:
+        print("Error opening file")
+        sys.exit()
+
+    # Round the stripes up to whole packets, so only the last packet of the last stripe is short
+    stripe_size = -(-file_size // stripes)
+    stripe_size = -(-stripe_size // mss) * mss
+    tasks = []
+    for i in range(stripes):
+        start, end = min(i * stripe_size, file_size), min((i + 1) * stripe_size, file_size)
+        tasks.append((ip_address, port + i, reliable_method, file_path, start, end, window_size, test, min_rto, max_rto,
+                      sack, congestion_control, pace, pacing_rate, gso, mss, probe_mtu, fec, compression))
+
+    try:
+        # Record the start time for sending the file
+        start_time = time.monotonic()
+
+        with multiprocessing.Pool(stripes) as pool:
+            pool.starmap(send_stripe, tasks)
+
+        # Calculate the elapsed time for sending the file and the throughput in Mbps
+        elapsed_time = time.monotonic() - start_time
+        throughput = (file_size * 8 / elapsed_time) / (1024**2)
+        print(f"\nBandwidth:{throughput:.2f}")
+
+    # If the user interrupts the program with Ctrl+C, exit gracefully
+    except KeyboardInterrupt:
+        sys.exit()
+
+
+def run_client(ip_address, port, reliable_method, file_path, window_size, test, min_rto=MIN_RTO, max_rto=MAX_RTO, sack=False,
+               congestion_control="fixed", cwnd_log=None, pace=False, pacing_rate=None, stripes=1, gso=False,
+               mss=DEFAULT_MSS, probe_mtu=False, fec=0, compression=None, delta=False, resume=False, batch=False):
     '''
     Sends a file from to a server using different reliability protocols (SAW, GBN, SR)
     
@@ -115,21 +785,49 @@ def run_client(ip_address, port, reliable_method, file_path, window_size, test):
         ip_address(IPv4Address): the IP address to bind the socket to
         port(int): the port number to bind the socket to
         reliable_method(str): the reliability function to use, "SAW", "GBN", or "SR"
-        file_path(str): the full path of the file to transfer
+        file_path(str or list[str]): the full path of the file to transfer, the files and directories of a batch
         window_size(int): the size of the sliding window, which is only used for "SR" and "GBN"
         test(boolean): whether or not to enable test mode, which is only used for "SAW" and "GBN"
+        min_rto(float): the lower bound of the retransmission timeout in seconds
+        max_rto(float): the upper bound of the retransmission timeout in seconds
+        sack(boolean): whether to ask the server for selective acknowledgements, which is only used for "GBN" and "SR"
+        congestion_control(str): the congestion controller to use, "fixed" or "reno", which is only used for "GBN" and "SR"
+        cwnd_log(str): the path of a CSV file to write the congestion window over time to, or None
+        pace(boolean): whether to pace the packets instead of sending the window in bursts, only used for "GBN" and "SR"
+        pacing_rate(float): the pacing rate in Mbit/s, if None the rate follows the congestion window
+        stripes(int): the number of stripes to send the file in parallel, see send_striped()
+        gso(boolean): whether to send batches of packets with UDP segmentation offload (Linux), only used for "GBN" and "SR"
+        mss(int): the largest payload size in bytes, lowered to what the server accepts
+        probe_mtu(boolean): whether to lower the payload size to the path MTU found with probes in the handshake
+        fec(int): the number of packets per XOR parity packet the server rebuilds a lost packet from, 0 for none,
+            only used for "GBN" and "SR"
+        compression(str): the codec to compress the file with if the server supports it, None to send it raw
+        delta(boolean): whether to send only the changes against the server's copy of the file
+        resume(boolean): whether to continue from the part of the file the server already has
+        batch(boolean): whether to send the files and directories in file_path on one connection
 
     Returns:
         Void, prints the calculated throughput of the data transmission
     '''
+    # Send the file in stripes from several processes if specified
+    if stripes > 1:
+        send_striped(ip_address, port, reliable_method, file_path, window_size, test, min_rto, max_rto, sack,
+                     congestion_control, pace, pacing_rate, stripes, gso, mss, probe_mtu, fec,
+                     compression)
+        return
+
     try:
         # Create a UDP socket for sending data
         sender_sock = socket(AF_INET, SOCK_DGRAM)
         addr = (ip_address, port)
 
-        # Open the file specified by the user
-        with open(file_path, "rb") as f:
-            file_data = f.read()
+        # List the files of a batch, they are read as they are sent
+        if batch:
+            file_data, mapping = BatchEncoder(file_path), None
+        # Open the file specified by the user and map it into memory
+        else:
+            with open(file_path, "rb") as f:
+                file_data, mapping = open_file_view(f)
 
     # Handle an IOError if the file cannot be opened
     except IOError:
@@ -140,24 +838,31 @@ def run_client(ip_address, port, reliable_method, file_path, window_size, test):
         # Record the start time for sending the file
         start_time = time.monotonic()
 
-        # Call the appropriate function to send the file based on the reliability method specified 
-        if reliable_method == "SAW":
-            SEND_SAW(sender_sock, addr, file_data)
-        elif reliable_method == "GBN":
-            SEND_GBN(sender_sock, addr, file_data, window_size, test)
-        elif reliable_method == "SR":
-            SEND_SR(sender_sock, addr, file_data, window_size, test)
+        # Send the file with the reliability method specified
+        cc = send_file_data(sender_sock, addr, reliable_method, file_data, window_size, test, min_rto, max_rto, sack,
+                            congestion_control, pace, pacing_rate, gso=gso, mss=mss, probe_mtu=probe_mtu,
+                            fec=fec, compression=compression, delta=delta, resume=resume, batch=batch)
 
         # Calculate the elapsed time for sending the file and the throughput in Mbps
         elapsed_time = time.monotonic() - start_time
         throughput = (len(file_data) * 8 / elapsed_time) / (1024**2)
         print(f"\nBandwidth:{throughput:.2f}")
 
+        # Report how the congestion window evolved during the transfer
+        if reliable_method != "SAW":
+            for line in cc.summary():
+                print(line)
+            if cwnd_log:
+                write_cwnd_log(cc, cwnd_log)
+
     # If the user interrupts the program with Ctrl+C, close socket and exit gracefully
     except KeyboardInterrupt:
         sender_sock.close()
         sys.exit()
 
+    finally:
+        close_file_view(file_data, mapping)
+
 
 # Main function to run the tool
 if __name__ == '__main__':
@@ -169,10 +874,30 @@ if __name__ == '__main__':
     parser.add_argument('-c', '--client', action='store_true', help='Run in client mode')
     parser.add_argument('-i', '--ip_address', type=check_ip, default='127.0.0.1', help='Choose IP address')
     parser.add_argument('-p', '--port', type=check_port, default=12000, help='Choose the port number')
-    parser.add_argument('-f', '--file_name', type=str, default='./testFile.jpg', help='File name to store the data in')
+    parser.add_argument('-f', '--file_name', type=str, nargs='+', default=['./testFile.jpg'], help='File name to store the data in, or the files and directories to send with --batch')
     parser.add_argument('-r', '--reliability', type=str.upper, choices=['SAW', 'GBN', 'SR'], default='SAW', help='Choose reliability of the data transfer')
     parser.add_argument('-t', '--test', type=str.upper, default=False, help='Choose which artificial test case')
     parser.add_argument('-w', '--window', type=int, default=5, help='Select window size (only in GBN & SR)')
+    parser.add_argument('--min-rto', type=float, default=MIN_RTO, help='Lower bound of the retransmission timeout in seconds')
+    parser.add_argument('--max-rto', type=float, default=MAX_RTO, help='Upper bound of the retransmission timeout in seconds')
+    parser.add_argument('--sack', action='store_true', help='Ask the server for selective acknowledgements (only in GBN & SR)')
+    parser.add_argument('--cc', type=str.lower, choices=list(CONGESTION_CONTROLLERS), default='fixed', help='Choose congestion control (only in GBN & SR)')
+    parser.add_argument('--cwnd-log', type=str, default=None, help='CSV file to write the congestion window over time to')
+    parser.add_argument('--pace', action='store_true', help='Pace packets at cwnd/SRTT instead of sending bursts (only in GBN & SR)')
+    parser.add_argument('--rate', type=float, default=None, help='Pace packets at a fixed rate in Mbit/s (only in GBN & SR)')
+    parser.add_argument('--multi', action='store_true', help='Keep serving and receive files from many clients at once (only in server mode)')
+    parser.add_argument('--ack-every', type=int, default=None, help='Number of in-order packets the server acknowledges at once (default: 2, 1 in SAW)')
+    parser.add_argument('--ack-delay', type=float, default=ACK_DELAY, help='Seconds the server delays the ACK of fewer packets')
+    parser.add_argument('--gso', action='store_true', help='Send batches of packets in one syscall with UDP segmentation offload (only in GBN & SR, Linux)')
+    parser.add_argument('--gro', action='store_true', help='Let the kernel coalesce incoming packets with UDP receive offload (only in server mode, Linux)')
+    parser.add_argument('--mss', type=int, default=DEFAULT_MSS, help='Largest payload size in bytes, both sides use the smaller of their values')
+    parser.add_argument('--probe-mtu', action='store_true', help='Lower the payload size to the path MTU found in the handshake (only in client mode)')
+    parser.add_argument('--fec', type=int, default=0, help='Send an XOR parity packet after every FEC data packets, 0 for none (only in GBN & SR)')
+    parser.add_argument('--compress', type=str.lower, choices=available_codecs(), default=None, help='Compress the file in blocks with this codec, incompressible blocks are sent raw')
+    parser.add_argument('--delta', action='store_true', help='Send only the changes against the server\'s copy of the file, or keep the received file as that copy (server)')
+    parser.add_argument('--resume', action='store_true', help='Continue from the part of the file the server kept, or keep a checkpoint of the received file to resume from (server)')
+    parser.add_argument('--batch', action='store_true', help='Send many files and directories on one connection, or receive them into received_files (server)')
+    parser.add_argument('-P', '--parallel', type=int, default=1, help='Number of stripes to transfer the file in parallel on consecutive ports')
 
     # parse the command-line arguments
     args = parser.parse_args()
@@ -186,14 +911,59 @@ if __name__ == '__main__':
         print('Error: you cannot run both server and client mode at once')
         sys.exit()
 
+    # if the stripes do not fit on the ports from the given port, print error message and exit program
+    if not 1 <= args.parallel <= 65536 - args.port:
+        print('Error: the number of stripes must be at least 1 and the stripes must fit on the ports up to 65535')
+        sys.exit()
+
+    # if the ACK policy is invalid, print error message and exit program
+    if (args.ack_every is not None and args.ack_every < 1) or args.ack_delay < 0:
+        print('Error: the server must acknowledge at least every packet and the ACK delay cannot be negative')
+        sys.exit()
+
+    # if the payload size does not fit in a UDP datagram, print error message and exit program
+    if not 1 <= args.mss <= MAX_MSS:
+        print(f'Error: the payload size must be between 1 and {MAX_MSS} bytes')
+        sys.exit()
+
+    # if the FEC group size does not fit in its handshake option, print error message and exit program
+    if not 0 <= args.fec <= MAX_FEC_GROUP:
+        print(f'Error: the number of packets per parity packet must be between 0 and {MAX_FEC_GROUP}')
+        sys.exit()
+
+    # if a delta transfer is combined with stripes or many clients, print error message and exit program
+    if args.delta and (args.parallel > 1 or args.multi):
+        print('Error: a delta transfer cannot be striped or served to many clients at once')
+        sys.exit()
+
+    # if a resumable transfer is combined with stripes, many clients or a delta transfer, print error message and exit program
+    if args.resume and (args.parallel > 1 or args.multi or args.delta):
+        print('Error: a resumable transfer cannot be striped, served to many clients at once or sent as a delta')
+        sys.exit()
+
+    # if a batch is combined with stripes, many clients, a delta or a resumable transfer, print error message and exit program
+    if args.batch and (args.parallel > 1 or args.multi or args.delta or args.resume):
+        print('Error: a batch of files cannot be striped, served to many clients at once, sent as a delta or resumed')
+        sys.exit()
+
+    # if several files or a directory are sent without --batch, print error message and exit program
+    if args.client and not args.batch and (len(args.file_name) > 1 or os.path.isdir(args.file_name[0])):
+        print('Error: several files or a directory can only be sent as a batch, use --batch')
+        sys.exit()
+    file_name = args.file_name if args.batch else args.file_name[0]
+
     # if the user specified -s flag, call run_server with the provided arguments
     if args.server:
         # if the user specified "SKIP_ACK" set 'True' for test
         if args.test == "SKIP_ACK":
-            run_server(args.ip_address, args.port, args.reliability, args.window, True)
+            run_server(args.ip_address, args.port, args.reliability, args.window, True, args.multi, args.parallel,
+                       args.ack_every, args.ack_delay, args.gro, args.mss, args.delta, args.resume,
+                       args.batch)
         # if test not specified set 'False' for test
         elif not args.test:
-            run_server(args.ip_address, args.port, args.reliability, args.window, False)
+            run_server(args.ip_address, args.port, args.reliability, args.window, False, args.multi, args.parallel,
+                       args.ack_every, args.ack_delay, args.gro, args.mss, args.delta, args.resume,
+                       args.batch)
         # If the user provided an invalid testing argument, print an error message and exit
         else:
             print("For server: type in 'skip_ack' as argument to test skipping ack message")
@@ -203,10 +973,16 @@ if __name__ == '__main__':
     if args.client:
         # if the user specified "LOSS" set 'True' for test
         if args.test == "LOSS":
-            run_client(args.ip_address, args.port, args.reliability, args.file_name, args.window, True)
+            run_client(args.ip_address, args.port, args.reliability, file_name, args.window, True, args.min_rto, args.max_rto, args.sack,
+                       args.cc, args.cwnd_log, args.pace, args.rate, args.parallel,
+                       args.gso, args.mss, args.probe_mtu, args.fec, args.compress, args.delta, args.resume,
+                       args.batch)
         # if test not specified set 'False' for test
         elif not args.test:
-            run_client(args.ip_address, args.port, args.reliability, args.file_name, args.window, False)
+            run_client(args.ip_address, args.port, args.reliability, file_name, args.window, False, args.min_rto, args.max_rto, args.sack,
+                       args.cc, args.cwnd_log, args.pace, args.rate, args.parallel,
+                       args.gso, args.mss, args.probe_mtu, args.fec, args.compress, args.delta, args.resume,
+                       args.batch)
         # If the user provided an invalid testing argument, print an error message and exit
         else:
             print("For client: type in 'loss' as argument to test skipping sequence number")
@@ -0,0 +1,222 @@
+import os
+from struct import Struct
+
+# Largest piece of a file read and sent at once
+BATCH_CHUNK_SIZE = 1024 * 1024
+
+# Start of the stream of a batch, a stream without it is a single file sent by a client without --batch
+BATCH_MAGIC = b"DRTPBAT1"
+# Header of every file of a batch, the size of the name, the permission bits and the size of the data. The name
+# and the data follow it
+file_header_struct = Struct("!HIQ")
+# Permission bits sent with a file, the setuid, setgid and sticky bits are never sent or applied
+PERMISSION_BITS = 0o777
+
+
+def collect_files(paths):
+    """
+    Lists the files to send in a batch, the files in a directory are named by their path from the directory's
+    parent so the directory is recreated on the receiver, like scp -r
+
+    Args:
+        paths (list[str]): The files and directories to send
+
+    Returns:
+        list[tuple[str, str]]: The path of every regular file and its name in the batch, with / as separator
+    """
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append((path, os.path.basename(path)))
+            continue
+        parent = os.path.dirname(os.path.normpath(path))
+        for directory, subdirectories, names in os.walk(path):
+            subdirectories.sort()
+            for name in sorted(names):
+                file_path = os.path.join(directory, name)
+                if os.path.isfile(file_path):
+                    files.append((file_path, os.path.relpath(file_path, parent).replace(os.sep, "/")))
+    return files
+
+
+class BatchEncoder:
+    """
+    An iterator over the stream of a batch of files, sent over one connection so the handshake and the teardown
+    are paid once for all of the files and the window stays open from one file to the next. Every file is a
+    header with its name, permission bits and size followed by its data, after BATCH_MAGIC at the start
+
+    Args:
+        paths (list[str]): The files and directories to send
+    """
+
+    def __init__(self, paths):
+        self.files = []     # The path, name, permission bits and size of every file
+        for path, name in collect_files(paths):
+            info = os.stat(path)
+            self.files.append((path, os.fsencode(name), info.st_mode & PERMISSION_BITS, info.st_size))
+        self.data_size = sum(size for path, name, mode, size in self.files)
+        self.chunks = self.encode()
+
+    def __len__(self):
+        # The size of the stream, the headers and names included
+        return len(BATCH_MAGIC) + sum(file_header_struct.size + len(name) + size
+                                      for path, name, mode, size in self.files)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.chunks)
+
+    def encode(self):
+        """
+        Generates the stream of the batch, the header of every file followed by its data in pieces of at most
+        BATCH_CHUNK_SIZE bytes
+
+        Returns:
+            generator: The pieces of the stream
+        """
+        yield BATCH_MAGIC
+        for path, name, mode, size in self.files:
+            yield file_header_struct.pack(len(name), mode, size) + name
+            remaining = size
+            with open(path, "rb") as f:
+                while remaining:
+                    chunk = f.read(min(remaining, BATCH_CHUNK_SIZE))
+                    # The size is already sent, a file that shrank cannot be sent correctly
+                    if not chunk:
+                        raise ValueError(f"{path} shrank while it was sent")
+                    remaining -= len(chunk)
+                    yield chunk
+
+    def summary(self):
+        """
+        Returns a line describing the batch
+
+        Returns:
+            str: The summary
+        """
+        return f"Sent {len(self.files)} files with {self.data_size} bytes of data in one connection"
+
+
+class BatchWriter:
+    """
+    Writes the files of a batch created by BatchEncoder into a directory as the stream arrives. A file is created
+    once its header has arrived and gets its permission bits, without those the umask takes away, once all of its
+    data is written. Names that would lead out of the directory are refused. A stream without BATCH_MAGIC is written whole to a single file
+
+    Args:
+        directory (str): The directory to write the files to, created if needed
+        single_name (str): The name of the file a stream without BATCH_MAGIC is written to
+    """
+
+    def __init__(self, directory, single_name):
+        self.directory = directory
+        self.single_name = single_name
+        self.batch = None           # Whether the stream is a batch, None until its start has arrived
+        self.pending = bytearray()     # The part of the stream that was not written yet
+        self.file = None            # The file being written
+        self.path = None
+        self.mode = 0
+        self.remaining = 0          # The number of bytes of the file still to come
+        self.files = 0
+        self.bytes_written = 0
+        # The umask can only be read by setting it, this happens before the writer thread of the sink starts
+        self.umask = os.umask(0)
+        os.umask(self.umask)
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, data):
+        """
+        Appends data to the stream and writes the files it completes or continues
+
+        Args:
+            data (bytes-like object): The next part of the stream
+
+        Returns:
+            None
+        """
+        self.pending += data
+        offset = 0
+        if self.batch is None:
+            if len(self.pending) < len(BATCH_MAGIC):
+                return
+            self.batch = self.pending.startswith(BATCH_MAGIC)
+            if self.batch:
+                offset = len(BATCH_MAGIC)
+            else:
+                # The whole stream is one file, it is written as a file of unknown size
+                self.open_file(self.single_name, 0o644, float("inf"))
+
+        while True:
+            if self.file is None:
+                if len(self.pending) - offset < file_header_struct.size:
+                    break
+                name_size, mode, size = file_header_struct.unpack_from(self.pending, offset)
+                end = offset + file_header_struct.size + name_size
+                if end > len(self.pending):
+                    break
+                self.open_file(os.fsdecode(bytes(self.pending[offset + file_header_struct.size : end])), mode, size)
+                offset = end
+
+            length = min(self.remaining, len(self.pending) - offset)
+            if length:
+                self.file.write(self.pending[offset : offset + length])
+                self.bytes_written += length
+                self.remaining -= length
+                offset += length
+            if self.remaining:
+                break
+            self.close_file()
+        del self.pending[:offset]
+
+    def open_file(self, name, mode, size):
+        """
+        Creates the next file of the batch and the directories it is in
+
+        Args:
+            name (str): The name of the file in the batch, with / as separator
+            mode (int): The permission bits of the file
+            size (int): The size of the file in bytes
+
+        Returns:
+            None
+        """
+        parts = name.split("/")
+        if os.path.isabs(name) or any(part in ("", ".", "..") for part in parts):
+            raise ValueError(f"Refusing to write {name!r} outside of {self.directory}")
+        self.path = os.path.join(self.directory, *parts)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.file = open(self.path, "wb")
+        self.mode = mode
+        self.remaining = size
+
+    def close_file(self):
+        """
+        Closes the file once all of its data is written and sets its permission bits
+
+        Returns:
+            None
+        """
+        self.file.close()
+        os.chmod(self.path, self.mode & PERMISSION_BITS & ~self.umask)
+        self.file = None
+        self.files += 1
+
+    def close(self):
+        """
+        Closes the single file, or checks that the stream of a batch ended after a whole file
+
+        Returns:
+            None
+        """
+        # A stream shorter than BATCH_MAGIC is a single file too
+        if self.batch is None:
+            self.batch = False
+            self.open_file(self.single_name, 0o644, float("inf"))
+            self.write(b"")
+        if not self.batch:
+            self.close_file()
+            return
+        if self.file is not None or self.pending:
+            raise ValueError(f"Batch ended within {self.path or 'a file header'}")
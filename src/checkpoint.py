@@ -0,0 +1,222 @@
+import hashlib
+import os
+import threading
+from struct import Struct, error as StructError
+
+# Number of bytes written between two checkpoints, every checkpoint flushes the file to disk
+CHECKPOINT_INTERVAL = 32 * 1024 * 1024
+# Number of bytes hashed at once when a partial file is checked
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# The offset the partial file is complete up to and the digest of the data before it
+checkpoint_struct = Struct("!Q16s")
+
+
+def new_hash():
+    """
+    Creates the hash of the data of a file before the offset of its checkpoint
+
+    Returns:
+        hashlib.blake2b: The empty hash, 16 byte digests
+    """
+    return hashlib.blake2b(digest_size=16)
+
+
+def prefix_digest(data, offset):
+    """
+    Computes the digest of the first bytes of some data, to compare with the digest of a checkpoint
+
+    Args:
+        data (bytes or memoryview): The data
+        offset (int): The number of bytes to hash
+
+    Returns:
+        bytes: The digest
+    """
+    digest = new_hash()
+    digest.update(data[:offset])
+    return digest.digest()
+
+
+def checkpoint_path(file_path):
+    """
+    Returns the path of the checkpoint of a file, it is kept next to the file
+
+    Args:
+        file_path (str): The path of the file
+
+    Returns:
+        str: The path of the checkpoint
+    """
+    return file_path + ".checkpoint"
+
+
+def load_checkpoint(file_path):
+    """
+    Reads the checkpoint of a partial file and checks it against the data in the file, e.g. a checkpoint that
+    is ahead of the data that reached the disk is not used
+
+    Args:
+        file_path (str): The path of the partial file
+
+    Returns:
+        tuple[int, hashlib.blake2b]: The offset to continue the file at and the hash of the data before it,
+            0 and the empty hash if there is no valid checkpoint
+    """
+    try:
+        with open(checkpoint_path(file_path), "rb") as f:
+            offset, digest = checkpoint_struct.unpack(f.read(checkpoint_struct.size))
+        with open(file_path, "rb") as f:
+            data_hash = new_hash()
+            remaining = offset
+            while remaining:
+                chunk = f.read(min(remaining, HASH_CHUNK_SIZE))
+                if not chunk:
+                    break
+                data_hash.update(chunk)
+                remaining -= len(chunk)
+    # A missing or truncated checkpoint or file is a new transfer
+    except (OSError, StructError) as e:
+        if not isinstance(e, FileNotFoundError):
+            print("Ignoring the checkpoint of", file_path, "-", e)
+        return 0, new_hash()
+
+    if remaining or data_hash.digest() != digest:
+        print("The checkpoint does not match the data in", file_path, "- starting over")
+        return 0, new_hash()
+    return offset, data_hash
+
+
+def fsync_directory(directory):
+    """
+    Flushes a directory to disk, so a file renamed into it stays renamed after a crash. Platforms that cannot
+    open a directory, e.g. Windows, skip it
+
+    Args:
+        directory (str): The path of the directory, "" for the current directory
+
+    Returns:
+        None
+    """
+    try:
+        fd = os.open(directory or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def remove_checkpoint(file_path):
+    """
+    Removes the checkpoint of a file, once the file is complete or its data is not wanted
+
+    Args:
+        file_path (str): The path of the file
+
+    Returns:
+        None
+    """
+    try:
+        os.remove(checkpoint_path(file_path))
+    except FileNotFoundError:
+        pass
+
+
+class CheckpointedFile:
+    """
+    Writes received data to a file and saves a checkpoint of the offset the file is complete up to and the hash
+    of the data before it every CHECKPOINT_INTERVAL bytes. The file is flushed to disk before the checkpoint is
+    replaced, so the checkpoint never runs ahead of the data. The data is written from the start of the file
+    unless the receiver continues at the checkpoint the file was opened with, see seek()
+
+    Args:
+        file (file object): The output file, opened for reading and writing
+        file_path (str): The path of the output file, the checkpoint is kept next to it
+        checkpoint (tuple[int, hashlib.blake2b]): The checkpoint to continue at from load_checkpoint()
+    """
+
+    def __init__(self, file, file_path, checkpoint):
+        self.file = file
+        self.path = checkpoint_path(file_path)
+        self.resume_offset, self.resume_hash = checkpoint
+        self.offset = 0
+        self.hash = new_hash()
+        self.next_checkpoint = CHECKPOINT_INTERVAL
+        # The writer thread of the sink writes while the main thread may save the checkpoint
+        self.lock = threading.Lock()
+        file.seek(0)
+
+    def checkpoint(self):
+        """
+        Returns the checkpoint the receiver offers in the handshake
+
+        Returns:
+            tuple[int, bytes]: The offset and the digest of the data before it
+        """
+        return self.resume_offset, self.resume_hash.digest()
+
+    def seek(self, offset):
+        """
+        Continues the file at the offset of its checkpoint, called by the sink when the sender resumes
+
+        Args:
+            offset (int): The offset, that of the checkpoint
+
+        Returns:
+            None
+        """
+        if offset != self.resume_offset:
+            raise ValueError(f"Cannot continue {self.path} at {offset}, the checkpoint is at {self.resume_offset}")
+        with self.lock:
+            self.file.seek(offset)
+            self.offset = offset
+            self.hash = self.resume_hash.copy()
+            self.next_checkpoint = offset + CHECKPOINT_INTERVAL
+
+    def write(self, data):
+        """
+        Writes data at the end of the complete part of the file, a checkpoint is saved every CHECKPOINT_INTERVAL
+        bytes
+
+        Args:
+            data (bytes-like object): The data
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.file.write(data)
+            self.hash.update(data)
+            self.offset += len(data)
+            if self.offset >= self.next_checkpoint:
+                self.save_locked()
+
+    def save(self):
+        """
+        Flushes the file to disk and saves a checkpoint at the data written so far
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.save_locked()
+
+    def save_locked(self):
+        """
+        Saves the checkpoint, the caller holds the lock. The new checkpoint replaces the old one atomically, and
+        it is on disk before the rename and the rename before this returns, so a crash leaves either checkpoint
+
+        Returns:
+            None
+        """
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        with open(self.path + ".tmp", "wb") as f:
+            f.write(checkpoint_struct.pack(self.offset, self.hash.digest()))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.path + ".tmp", self.path)
+        fsync_directory(os.path.dirname(self.path))
+        self.next_checkpoint = self.offset + CHECKPOINT_INTERVAL
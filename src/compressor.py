@@ -0,0 +1,278 @@
+import queue
+import threading
+import zlib
+from struct import Struct
+
+# Python may be built without lzma
+try:
+    import lzma
+except ImportError:
+    lzma = None
+# Zstandard is optional, it comes with the standard library from Python 3.14 on and from the zstandard package before
+try:
+    from compression import zstd
+except ImportError:
+    try:
+        import zstandard
+    except ImportError:
+        zstd = None
+    else:
+        zstd = zstandard.ZstdCompressor(), zstandard.ZstdDecompressor()
+
+# Size of the blocks the data is compressed in, every block is compressed on its own
+COMPRESS_BLOCK_SIZE = 1024 * 1024
+# Size of the sample of a block that is compressed first to tell whether the block is worth compressing
+SAMPLE_SIZE = 16 * 1024
+# A block whose sample does not shrink below this fraction of its size is sent raw, e.g. a JPEG or a zip file
+INCOMPRESSIBLE_RATIO = 0.9
+# Number of compressed blocks the compressor thread may have ready before the sender takes them
+ENCODE_AHEAD = 4
+
+# Header of every block, the codec id (0 if the block is raw) and the size of the block data that follows
+block_struct = Struct("!BI")
+
+# Codec ids, carried in the compression handshake option
+CODEC_IDS = {"zlib": 1, "lzma": 2, "zstd": 3}
+RAW_BLOCK = 0
+
+def bounded_decompress(decompressor, data, max_length):
+    """
+    Decompresses a block with a decompressor object, but to no more than max_length + 1 bytes, so a small block
+    from the peer cannot expand to gigabytes in memory
+
+    Args:
+        decompressor (object): A new zlib, lzma or zstd decompressor object
+        data (bytes): The compressed block
+        max_length (int): The largest size the block may have
+
+    Returns:
+        bytes: The block, more than max_length bytes if it decompresses to more
+    """
+    block = decompressor.decompress(data, max_length=max_length + 1)
+    if len(block) <= max_length and not decompressor.eof:
+        raise ValueError("Compressed block is truncated")
+    return block
+
+
+def bounded_read(reader, max_length):
+    """
+    Reads a block from a stream reader of the zstandard package, but no more than max_length + 1 bytes
+
+    Args:
+        reader (object): The reader
+        max_length (int): The largest size the block may have
+
+    Returns:
+        bytes: The block, more than max_length bytes if it decompresses to more
+    """
+    block = bytearray()
+    while len(block) <= max_length:
+        data = reader.read(max_length + 1 - len(block))
+        if not data:
+            break
+        block += data
+    return bytes(block)
+
+
+# Compression and decompression functions of the codecs available on this system, by codec id. The decompression
+# functions take the compressed block and the largest size it may have
+CODECS = {1: (lambda data: zlib.compress(data, 6),
+              lambda data, max_length: bounded_decompress(zlib.decompressobj(), data, max_length))}
+if lzma is not None:
+    # A low preset, the higher ones compress a few MB/s and would be slower than most links
+    CODECS[2] = (lambda data: lzma.compress(data, preset=1),
+                 lambda data, max_length: bounded_decompress(lzma.LZMADecompressor(), data, max_length))
+if zstd is not None:
+    if isinstance(zstd, tuple):
+        CODECS[3] = (zstd[0].compress, lambda data, max_length: bounded_read(zstd[1].stream_reader(data), max_length))
+    else:
+        CODECS[3] = (zstd.compress,
+                     lambda data, max_length: bounded_decompress(zstd.ZstdDecompressor(), data, max_length))
+
+
+def available_codecs():
+    """
+    Returns the names of the codecs that can be used on this system
+
+    Returns:
+        list[str]: The codec names, e.g. for the choices of a command-line option
+    """
+    return [name for name, codec_id in CODEC_IDS.items() if codec_id in CODECS]
+
+
+def compress_block(block, codec_id):
+    """
+    Compresses a block unless a sample of it shows that it does not compress, or the compressed block is not smaller
+
+    Args:
+        block (bytes or memoryview): The block
+        codec_id (int): The codec to compress with
+
+    Returns:
+        bytes: The block header followed by the compressed or the raw block
+    """
+    compress = CODECS[codec_id][0]
+    # The sample is compressed with the fastest zlib level, so an incompressible block costs little CPU
+    if len(block) > SAMPLE_SIZE:
+        sample = block[:SAMPLE_SIZE]
+        if len(zlib.compress(sample, 1)) > len(sample) * INCOMPRESSIBLE_RATIO:
+            return block_struct.pack(RAW_BLOCK, len(block)) + block
+
+    compressed = compress(block)
+    if len(compressed) >= len(block):
+        return block_struct.pack(RAW_BLOCK, len(block)) + block
+    return block_struct.pack(codec_id, len(compressed)) + compressed
+
+
+def split_blocks(data, block_size):
+    """
+    Splits data into blocks, the buffers of an iterator are joined and split again
+
+    Args:
+        data (bytes, memoryview or iterator): The data, or an iterator over its buffers
+        block_size (int): The size of the blocks, the last block may be smaller
+
+    Returns:
+        generator: The blocks
+    """
+    if not hasattr(data, "__next__"):
+        data = memoryview(data)
+        for offset in range(0, len(data), block_size):
+            yield data[offset : offset + block_size]
+        return
+
+    pending = bytearray()
+    for buffer in data:
+        pending += buffer
+        while len(pending) >= block_size:
+            yield bytes(pending[:block_size])
+            del pending[:block_size]
+    if pending:
+        yield bytes(pending)
+
+
+class BlockEncoder:
+    """
+    An iterator over the compressed blocks of some data, see compress_block(). The blocks are compressed by a
+    thread of their own a few blocks ahead of the sender, so compressing overlaps with sending. The codecs release
+    the GIL while they compress
+
+    Args:
+        data (bytes, memoryview or iterator): The data to compress, or an iterator over its buffers
+        codec_id (int): The codec to compress with
+        block_size (int): The size of the blocks before compression
+    """
+
+    def __init__(self, data, codec_id, block_size=COMPRESS_BLOCK_SIZE):
+        self.data = data
+        self.codec_id = codec_id
+        self.block_size = block_size
+        self.bytes_read = 0
+        self.bytes_encoded = 0
+        self.raw_blocks = 0
+        self.blocks = queue.Queue(ENCODE_AHEAD)
+        self.error = None
+        self.encoder = threading.Thread(target=self.encode_blocks, daemon=True)
+        self.encoder.start()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        block = self.blocks.get()
+        if block is None:
+            if self.error is not None:
+                raise self.error
+            raise StopIteration
+        return block
+
+    def encode_blocks(self):
+        """
+        Compressor thread, compresses the blocks in order and queues them for the sender
+
+        Returns:
+            None
+        """
+        try:
+            for block in split_blocks(self.data, self.block_size):
+                encoded = compress_block(block, self.codec_id)
+                self.bytes_read += len(block)
+                self.bytes_encoded += len(encoded)
+                if encoded[0] == RAW_BLOCK:
+                    self.raw_blocks += 1
+                self.blocks.put(encoded)
+        # The error is raised by the sender when it takes the next block
+        except Exception as e:
+            self.error = e
+        self.blocks.put(None)
+
+    def summary(self):
+        """
+        Returns a line describing how well the data compressed
+
+        Returns:
+            str: The summary
+        """
+        blocks = -(-self.bytes_read // self.block_size)
+        return (f"Compressed {self.bytes_read} bytes to {self.bytes_encoded} bytes, "
+                f"{self.raw_blocks} of {blocks} blocks sent raw")
+
+
+class BlockDecoder:
+    """
+    Decompresses a stream of blocks created by compress_block() as it arrives and writes the data to a target.
+    A block is decompressed once all of it has been written to the decoder. A block larger than max_block_size,
+    before or after decompression, is an error
+
+    Args:
+        write_func (callable): Takes the decompressed data
+        max_block_size (int): The largest block the sender may send
+    """
+
+    def __init__(self, write_func, max_block_size=COMPRESS_BLOCK_SIZE):
+        self.write_func = write_func
+        self.max_block_size = max_block_size
+        self.pending = bytearray()     # The part of the stream that does not form a whole block yet
+        self.bytes_written = 0
+
+    def write(self, data):
+        """
+        Appends data to the stream and writes the decompressed data of every block that is now complete
+
+        Args:
+            data (bytes-like object): The next part of the stream
+
+        Returns:
+            None
+        """
+        self.pending += data
+        offset = 0
+        while len(self.pending) - offset >= block_struct.size:
+            codec_id, length = block_struct.unpack_from(self.pending, offset)
+            # A compressed block is smaller than the block, else it is sent raw
+            if length > self.max_block_size:
+                raise ValueError(f"Block of {length} bytes is larger than {self.max_block_size} bytes")
+            end = offset + block_struct.size + length
+            if end > len(self.pending):
+                break
+            block = bytes(self.pending[offset + block_struct.size : end])
+            if codec_id != RAW_BLOCK:
+                if codec_id not in CODECS:
+                    raise ValueError(f"Block compressed with unknown codec {codec_id}")
+                block = CODECS[codec_id][1](block, self.max_block_size)
+                if len(block) > self.max_block_size:
+                    raise ValueError(f"Block decompresses to more than {self.max_block_size} bytes")
+            self.write_func(block)
+            self.bytes_written += len(block)
+            offset = end
+        del self.pending[:offset]
+
+    def close(self):
+        """
+        Checks that the stream ended with a whole block
+
+        Returns:
+            None
+        """
+        if self.pending:
+            raise ValueError(f"Compressed stream ended within a block, {len(self.pending)} bytes left")
@@ -0,0 +1,374 @@
+import time
+from collections import deque
+
+# Initial congestion window in packets (RFC 6928)
+INITIAL_CWND = 10
+# Smallest slow start threshold in packets
+MIN_SSTHRESH = 2
+# Smallest window of the delay-based controller in packets
+MIN_CWND = 4
+
+
+class CongestionController:
+    """
+    Base class of the congestion controllers used by the sliding window senders. The sender asks the controller
+    how many packets it may have in flight and reports ACKs, losses and timeouts back to it. The controller keeps
+    a history of its congestion window over time and statistics of the RTT samples and delivered packets, so the
+    transfer can be reported and different controllers can be compared
+
+    Args:
+        cwnd (float): The initial congestion window in packets
+    """
+
+    name = "base"
+
+    def __init__(self, cwnd):
+        self.cwnd = cwnd
+        self.rwnd = float("inf")    # The last window advertised by the receiver
+        self.start_time = time.monotonic()
+        self.history = []
+        self.record()
+
+        # Statistics of the transfer
+        self.delivered = 0      # Number of packets acknowledged
+        self.rtt_count = 0
+        self.rtt_sum = 0.0
+        self.min_rtt = None
+
+    def window(self, rwnd):
+        """
+        Returns the number of packets the sender may have in flight
+
+        Args:
+            rwnd (int): The window advertised by the receiver in packets
+
+        Returns:
+            int: The congestion window capped by the receiver's window, 0 if the receiver has no room left
+        """
+        self.rwnd = rwnd
+        return max(0, min(int(self.cwnd), rwnd))
+
+    def on_ack(self, acked, rtt):
+        """
+        Called when an ACK acknowledges new packets, updates the statistics and the congestion window
+
+        Args:
+            acked (int): The number of packets newly acknowledged
+            rtt (float or None): An RTT sample in seconds, None if the ACK gave no valid sample
+
+        Returns:
+            None
+        """
+        self.delivered += acked
+        if rtt is not None:
+            self.rtt_count += 1
+            self.rtt_sum += rtt
+            if self.min_rtt is None or rtt < self.min_rtt:
+                self.min_rtt = rtt
+
+        self.update_window(acked, rtt, time.monotonic())
+
+    def update_window(self, acked, rtt, now):
+        """
+        Adjusts the congestion window after an ACK, implemented by the controllers that change their window
+
+        Args:
+            acked (int): The number of packets newly acknowledged
+            rtt (float or None): An RTT sample in seconds, None if the ACK gave no valid sample
+            now (float): The current time from time.monotonic()
+
+        Returns:
+            None
+        """
+        pass
+
+    def on_loss(self):
+        """
+        Called when a packet loss is detected without a retransmission timeout
+
+        Returns:
+            None
+        """
+        pass
+
+    def on_timeout(self):
+        """
+        Called when the retransmission timer expires
+
+        Returns:
+            None
+        """
+        pass
+
+    def record(self):
+        """
+        Appends the current congestion window to the history, if it changed since the last entry
+
+        Returns:
+            None
+        """
+        cwnd = int(self.cwnd)
+        if not self.history or self.history[-1][1] != cwnd:
+            self.history.append((time.monotonic() - self.start_time, cwnd))
+
+    def summary(self):
+        """
+        Returns the statistics of the transfer as printable lines
+
+        Returns:
+            list[str]: One line per statistic
+        """
+        windows = [cwnd for _, cwnd in self.history]
+        lines = [f"Congestion control: {self.name}", f"Max cwnd: {max(windows)} packets"]
+
+        elapsed = time.monotonic() - self.start_time
+        lines.append(f"Throughput: {self.delivered / elapsed:.0f} packets/s")
+
+        # The RTT inflation is the average RTT relative to the smallest one, which shows how much queueing delay
+        # the transfer caused on the path
+        if self.rtt_count:
+            average_rtt = self.rtt_sum / self.rtt_count
+            lines.append(f"Average RTT: {average_rtt * 1000:.3f} ms, min RTT: {self.min_rtt * 1000:.3f} ms")
+            lines.append(f"RTT inflation: {average_rtt / self.min_rtt:.2f}x")
+        return lines
+
+
+class FixedWindow(CongestionController):
+    """
+    A congestion window that never changes, which is the behaviour of a plain Go-Back-N or Selective Repeat sender
+
+    Args:
+        window_size (int): The window size in packets
+    """
+
+    name = "fixed"
+
+    def __init__(self, window_size):
+        super().__init__(window_size)
+
+
+class RenoController(CongestionController):
+    """
+    Loss-based congestion control. The window grows by one packet per ACK in slow start and by one packet per
+    round trip in congestion avoidance, it is halved when a loss is detected and reset to one packet on a
+    retransmission timeout
+
+    Args:
+        cwnd (float): The initial congestion window in packets
+        ssthresh (float): The initial slow start threshold in packets
+    """
+
+    name = "reno"
+
+    def __init__(self, cwnd=INITIAL_CWND, ssthresh=float("inf")):
+        self.ssthresh = ssthresh
+        super().__init__(cwnd)
+
+    def update_window(self, acked, rtt, now):
+        # Do not grow the window beyond what the receiver allows, the sender could not use it
+        if self.cwnd >= self.rwnd:
+            return
+
+        if self.cwnd < self.ssthresh:
+            # Slow start, doubles the window every round trip
+            self.cwnd += acked
+        else:
+            # Congestion avoidance, additive increase of one packet per round trip
+            self.cwnd += acked / self.cwnd
+        self.record()
+
+    def on_loss(self):
+        # Multiplicative decrease
+        self.ssthresh = max(self.cwnd / 2, MIN_SSTHRESH)
+        self.cwnd = self.ssthresh
+        self.record()
+
+    def on_timeout(self):
+        # Restart from slow start
+        self.ssthresh = max(self.cwnd / 2, MIN_SSTHRESH)
+        self.cwnd = 1
+        self.record()
+
+
+class DelayBasedController(CongestionController):
+    """
+    Delay-based congestion control in the style of BBR. The controller estimates the bottleneck bandwidth as the
+    highest delivery rate of the last rounds and the propagation delay as the smallest RTT, and sets the window
+    to a small multiple of their product (the bandwidth-delay product) instead of filling the router queue until
+    packets are dropped. In startup the window doubles every round until the delivery rate stops growing
+
+    Args:
+        cwnd (float): The initial congestion window in packets
+    """
+
+    name = "delay"
+
+    # Window gain in startup and after the bottleneck bandwidth has been found
+    STARTUP_GAIN = 2.0
+    CWND_GAIN = 1.25
+    # Startup ends when the delivery rate grew less than 25% in three rounds in a row
+    FULL_BANDWIDTH_GROWTH = 1.25
+    FULL_BANDWIDTH_ROUNDS = 3
+    # Number of rounds the bottleneck bandwidth filter remembers
+    BANDWIDTH_FILTER_ROUNDS = 10
+    # Number of seconds the minimum RTT filter remembers
+    MIN_RTT_WINDOW = 10.0
+
+    def __init__(self, cwnd=INITIAL_CWND):
+        super().__init__(cwnd)
+        self.rate_samples = deque(maxlen=self.BANDWIDTH_FILTER_ROUNDS)     # Delivery rate per round in packets/s
+        self.path_rtt = None            # Minimum RTT of the last MIN_RTT_WINDOW seconds
+        self.path_rtt_time = 0.0
+        self.round_start = time.monotonic()
+        self.round_delivered = 0
+        self.full_bandwidth = 0.0
+        self.full_bandwidth_rounds = 0
+        self.filled_pipe = False
+
+    def bottleneck_bandwidth(self):
+        """
+        Returns the estimated bottleneck bandwidth
+
+        Returns:
+            float: The highest delivery rate of the last rounds in packets/s, 0 before the first round ended
+        """
+        return max(self.rate_samples, default=0.0)
+
+    def update_window(self, acked, rtt, now):
+        # Track the propagation delay, an old minimum expires so that route changes are picked up
+        if rtt is not None and (self.path_rtt is None or rtt <= self.path_rtt or now - self.path_rtt_time > self.MIN_RTT_WINDOW):
+            self.path_rtt = rtt
+            self.path_rtt_time = now
+
+        self.round_delivered += acked
+        if self.path_rtt is None or now - self.round_start < self.path_rtt:
+            return
+
+        # A round of one RTT has ended, take a delivery rate sample
+        self.rate_samples.append(self.round_delivered / (now - self.round_start))
+        self.round_start = now
+        self.round_delivered = 0
+        bandwidth = self.bottleneck_bandwidth()
+
+        # Leave startup once the delivery rate stops growing, the pipe is then full
+        if not self.filled_pipe:
+            if bandwidth >= self.full_bandwidth * self.FULL_BANDWIDTH_GROWTH:
+                self.full_bandwidth = bandwidth
+                self.full_bandwidth_rounds = 0
+            else:
+                self.full_bandwidth_rounds += 1
+                self.filled_pipe = self.full_bandwidth_rounds >= self.FULL_BANDWIDTH_ROUNDS
+
+        # Size the window to the bandwidth-delay product
+        gain = self.CWND_GAIN if self.filled_pipe else self.STARTUP_GAIN
+        self.cwnd = max(MIN_CWND, gain * bandwidth * self.path_rtt)
+        self.record()
+
+    def on_timeout(self):
+        # Fall back to a small window until the next round has measured the path again
+        self.cwnd = MIN_CWND
+        self.round_start = time.monotonic()
+        self.round_delivered = 0
+        self.record()
+
+    def summary(self):
+        lines = super().summary()
+        lines.append(f"Estimated bottleneck bandwidth: {self.bottleneck_bandwidth():.0f} packets/s")
+        return lines
+
+
+class Pacer:
+    """
+    Spreads the packets of the sliding window senders evenly over time instead of sending the whole window back
+    to back, which overflows the queue of the bottleneck router. The rate is either fixed or follows the
+    congestion window, gain * cwnd / SRTT. The pacer never waits itself: the sender stops once ready() is False
+    and the event loop sleeps until next_send_time, so ACKs and timers are handled while the sender is held back.
+    The selector wakes up with a granularity of about a millisecond, so a sender that wakes up late makes up for
+    up to MAX_LAG seconds with back to back packets and keeps the average rate
+
+    Args:
+        rate (float or None): The fixed pacing rate in bytes/s, if None the rate follows the congestion window
+        packet_size (int): The size of a full packet in bytes, used to turn the congestion window into bytes
+    """
+
+    # Pacing gain when the rate follows the congestion window, above 1 so pacing does not hold back window growth
+    GAIN = 1.25
+    # Lateness of the event loop a sender may make up for with back to back packets
+    MAX_LAG = 0.002
+
+    def __init__(self, rate=None, packet_size=1460):
+        self.rate = rate
+        self.packet_size = packet_size
+        self.next_send_time = 0.0   # When the next packet may be sent, on the time.monotonic() clock
+
+    def current_rate(self, cwnd, srtt):
+        """
+        Returns the pacing rate
+
+        Args:
+            cwnd (float): The congestion window in packets
+            srtt (float or None): The smoothed RTT in seconds, None before the first RTT sample
+
+        Returns:
+            float or None: The rate in bytes/s, None if the sender should not be paced yet
+        """
+        if self.rate is not None:
+            return self.rate
+        if not srtt:
+            return None
+        return self.GAIN * cwnd * self.packet_size / srtt
+
+    def ready(self, now):
+        """
+        Returns whether the next packet may be sent
+
+        Args:
+            now (float): The current time on the time.monotonic() clock
+
+        Returns:
+            bool: True if the send time of the next packet has come, else the sender waits until next_send_time
+        """
+        return now >= self.next_send_time
+
+    def on_send(self, nbytes, cwnd, srtt, now):
+        """
+        Schedules the packet after the one being sent
+
+        Args:
+            nbytes (int): The size of the packet being sent
+            cwnd (float): The congestion window in packets
+            srtt (float or None): The smoothed RTT in seconds, None before the first RTT sample
+            now (float): The current time on the time.monotonic() clock
+
+        Returns:
+            None
+        """
+        rate = self.current_rate(cwnd, srtt)
+        if not rate:
+            return
+        # An idle sender does not build up credit for a burst, a late one only for MAX_LAG seconds
+        self.next_send_time = max(self.next_send_time, now - self.MAX_LAG) + nbytes / rate
+
+
+# Congestion controllers selectable from the command line
+CONGESTION_CONTROLLERS = {
+    "fixed": FixedWindow,
+    "reno": RenoController,
+    "delay": DelayBasedController,
+}
+
+
+def create_controller(name, window_size):
+    """
+    Creates the congestion controller with the given name
+
+    Args:
+        name (str): The name of the controller, a key of CONGESTION_CONTROLLERS
+        window_size (int): The window size of the fixed controller
+
+    Returns:
+        CongestionController: The new controller
+    """
+    if name == "fixed":
+        return FixedWindow(window_size)
+    return CONGESTION_CONTROLLERS[name]()
@@ -0,0 +1,311 @@
+import hashlib
+import math
+from itertools import accumulate
+from struct import Struct
+
+# Bounds of the block size of a delta transfer, see delta_block_size()
+DELTA_MIN_BLOCK = 2048
+DELTA_MAX_BLOCK = 128 * 1024
+# Largest literal sent in one operation, longer literals are split
+DELTA_LITERAL_SIZE = 1024 * 1024
+# Number of blocks read from the basis file at once when a long run of blocks is copied
+COPY_CHUNK_BLOCKS = 64
+
+# Size of the basis file, at the start of the signatures
+basis_struct = Struct("!Q")
+# Weak rolling checksum and strong hash of every block of the basis file
+signature_struct = Struct("!I16s")
+# Operation of the delta stream, COPY_BLOCKS with the first block and the number of blocks, LITERAL with the size
+# of the data that follows, or DIGEST with the size of the strong hash of the whole file that follows, which ends
+# the stream
+op_struct = Struct("!BII")
+COPY_BLOCKS = 1
+LITERAL = 2
+DIGEST = 3
+
+
+def delta_block_size(size):
+    """
+    Chooses the block size of a delta transfer, about the square root of the file size like rsync, so the number
+    of signatures and the size of a block both grow slowly with the file
+
+    Args:
+        size (int): The size of the file in bytes
+
+    Returns:
+        int: The block size in bytes, a multiple of 1024
+    """
+    return max(DELTA_MIN_BLOCK, min(DELTA_MAX_BLOCK, math.isqrt(size) // 1024 * 1024))
+
+
+def weak_checksum(block):
+    """
+    Computes the rsync rolling checksum of a block, a = sum of the bytes and b = sum of the prefix sums, both
+    modulo 2^16
+
+    Args:
+        block (bytes or memoryview): The block
+
+    Returns:
+        tuple[int, int]: a and b
+    """
+    return sum(block) & 0xFFFF, sum(accumulate(block)) & 0xFFFF
+
+
+def strong_hash(block):
+    """
+    Computes the strong hash of a block, which confirms a match of the weak checksum
+
+    Args:
+        block (bytes or memoryview): The block
+
+    Returns:
+        bytes: The 16 byte BLAKE2b digest
+    """
+    return hashlib.blake2b(block, digest_size=16).digest()
+
+
+def block_signatures(basis, block_size):
+    """
+    Computes the signatures of the blocks of the receiver's copy of a file, sent to the sender of a delta transfer
+
+    Args:
+        basis (file object or None): The receiver's copy opened for reading, None if there is no copy
+        block_size (int): The block size in bytes
+
+    Returns:
+        bytes: The size of the file followed by the weak checksum and the strong hash of every block
+    """
+    signatures = bytearray(basis_struct.size)
+    size = 0
+    while basis is not None:
+        block = basis.read(block_size)
+        if not block:
+            break
+        a, b = weak_checksum(block)
+        signatures += signature_struct.pack(b << 16 | a, strong_hash(block))
+        size += len(block)
+    basis_struct.pack_into(signatures, 0, size)
+    return bytes(signatures)
+
+
+class DeltaEncoder:
+    """
+    An iterator over the delta stream that turns the receiver's copy of a file into data, like rsync. The data is
+    searched for blocks of the copy: at every position the strong hash is looked up first, which finds the blocks
+    of an unchanged region without rolling. Past a change the weak checksum is rolled a byte at a time until a
+    block matches again. Matching blocks are sent as references and the rest as literal data, so only the changed
+    regions go over the network. The stream ends with the strong hash of the whole data, so the receiver can tell
+    whether the file it rebuilt is the data
+
+    Args:
+        data (bytes or memoryview): The new version of the file
+        signatures (bytes): The signatures of the receiver's copy from block_signatures()
+        block_size (int): The block size the signatures were computed with
+    """
+
+    def __init__(self, data, signatures, block_size):
+        self.data = memoryview(data)
+        self.block_size = block_size
+        self.strong_index = {}     # Index of the first block with each strong hash
+        self.weak_index = set()    # Weak checksums of the full blocks
+        basis_size = basis_struct.unpack_from(signatures)[0]
+        for index, offset in enumerate(range(basis_struct.size, len(signatures), signature_struct.size)):
+            weak, strong = signature_struct.unpack_from(signatures, offset)
+            self.strong_index.setdefault(strong, index)
+            # The last block of the copy may be short, it can only match the end of the data
+            if (index + 1) * block_size <= basis_size:
+                self.weak_index.add(weak)
+        self.copied_blocks = 0
+        self.literal_bytes = 0
+        self.ops = self.encode()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.ops)
+
+    def encode(self):
+        """
+        Generates the operations of the delta stream, runs of consecutive blocks are sent as one operation
+
+        Returns:
+            generator: The encoded operations, the literal data as slices of the data
+        """
+        data, block_size = self.data, self.block_size
+        size = len(data)
+        position = literal_start = 0
+        run_start, run_length = 0, 0    # The run of blocks to copy that is not sent yet
+
+        while position < size:
+            end = min(position + block_size, size)
+            index = self.strong_index.get(strong_hash(data[position:end]))
+            if index is None and end - position == block_size:
+                # Roll the weak checksum forward until it matches a block and the strong hash confirms it
+                a, b = weak_checksum(data[position:end])
+                while True:
+                    if (b << 16 | a) in self.weak_index:
+                        index = self.strong_index.get(strong_hash(data[position:position + block_size]))
+                        if index is not None:
+                            break
+                    if position + block_size >= size:
+                        break
+                    out_byte, in_byte = data[position], data[position + block_size]
+                    a = (a - out_byte + in_byte) & 0xFFFF
+                    b = (b - block_size * out_byte + a) & 0xFFFF
+                    position += 1
+                end = position + block_size
+            if index is None:
+                break
+
+            # Send the literal data before the block and the run of blocks unless the block continues it
+            if literal_start < position or index != run_start + run_length:
+                if run_length:
+                    yield op_struct.pack(COPY_BLOCKS, run_start, run_length)
+                yield from self.literal(literal_start, position)
+                run_start, run_length = index, 0
+            run_length += 1
+            self.copied_blocks += 1
+            position = literal_start = end
+
+        if run_length:
+            yield op_struct.pack(COPY_BLOCKS, run_start, run_length)
+        yield from self.literal(literal_start, size)
+
+        digest = strong_hash(data)
+        yield op_struct.pack(DIGEST, len(digest), 0)
+        yield digest
+
+    def literal(self, start, end):
+        """
+        Generates the literal operations of a range of the data
+
+        Args:
+            start (int): The offset of the first byte
+            end (int): The offset after the last byte
+
+        Returns:
+            generator: The encoded operations
+        """
+        for offset in range(start, end, DELTA_LITERAL_SIZE):
+            chunk = self.data[offset : min(offset + DELTA_LITERAL_SIZE, end)]
+            self.literal_bytes += len(chunk)
+            yield op_struct.pack(LITERAL, len(chunk), 0)
+            yield chunk
+
+    def summary(self):
+        """
+        Returns a line describing how much of the data was found in the receiver's copy
+
+        Returns:
+            str: The summary
+        """
+        return (f"Delta: {self.copied_blocks} blocks of {self.block_size} bytes copied from the server's copy, "
+                f"{self.literal_bytes} of {len(self.data)} bytes sent")
+
+
+class DeltaDecoder:
+    """
+    Rebuilds a file from a delta stream created by DeltaEncoder and the receiver's copy as the stream arrives.
+    An operation is carried out once all of it has been written to the decoder. Block references beyond the end
+    of the copy are an error, and matches() tells whether the rebuilt file has the digest the sender sent
+
+    Args:
+        target (file object): Where the rebuilt file is written
+        basis (file object or None): The receiver's copy opened for reading, None if there is no copy
+        block_size (int): The block size of the transfer
+    """
+
+    def __init__(self, target, basis, block_size):
+        self.target = target
+        self.basis = basis
+        self.block_size = block_size
+        self.pending = bytearray()     # The part of the stream that does not form a whole operation yet
+        self.bytes_written = 0
+        self.basis_blocks = -(-basis.seek(0, 2) // block_size) if basis is not None else 0
+        self.hash = hashlib.blake2b(digest_size=16)    # Strong hash of the rebuilt file, see strong_hash()
+        self.digest = None      # The strong hash of the sender's file, once the end of the stream arrived
+
+    def write(self, data):
+        """
+        Appends data to the stream and carries out every operation that is now complete
+
+        Args:
+            data (bytes-like object): The next part of the stream
+
+        Returns:
+            None
+        """
+        self.pending += data
+        offset = 0
+        while len(self.pending) - offset >= op_struct.size:
+            op, value, count = op_struct.unpack_from(self.pending, offset)
+            if op == COPY_BLOCKS:
+                self.copy_blocks(value, count)
+                offset += op_struct.size
+            elif op == LITERAL:
+                end = offset + op_struct.size + value
+                if end > len(self.pending):
+                    break
+                literal = self.pending[offset + op_struct.size : end]
+                self.target.write(literal)
+                self.hash.update(literal)
+                self.bytes_written += value
+                offset = end
+            elif op == DIGEST:
+                if value != self.hash.digest_size:
+                    raise ValueError(f"Delta stream ends with a digest of {value} bytes")
+                end = offset + op_struct.size + value
+                if end > len(self.pending):
+                    break
+                self.digest = bytes(self.pending[offset + op_struct.size : end])
+                offset = end
+            else:
+                raise ValueError(f"Unknown delta operation {op}")
+        del self.pending[:offset]
+
+    def copy_blocks(self, first, count):
+        """
+        Copies a run of blocks of the receiver's copy to the target
+
+        Args:
+            first (int): The index of the first block
+            count (int): The number of blocks
+
+        Returns:
+            None
+        """
+        if self.basis is None:
+            raise ValueError("Delta stream refers to blocks, but there is no copy of the file")
+        if first + count > self.basis_blocks:
+            raise ValueError(f"Delta stream refers to blocks {first} to {first + count - 1}, but the copy of the "
+                             f"file has {self.basis_blocks} blocks")
+        self.basis.seek(first * self.block_size)
+        for chunk_start in range(0, count, COPY_CHUNK_BLOCKS):
+            blocks = self.basis.read(min(COPY_CHUNK_BLOCKS, count - chunk_start) * self.block_size)
+            self.target.write(blocks)
+            self.hash.update(blocks)
+            self.bytes_written += len(blocks)
+
+    def close(self):
+        """
+        Checks that the stream ended with a whole operation and the digest of the file
+
+        Returns:
+            None
+        """
+        if self.pending:
+            raise ValueError(f"Delta stream ended within an operation, {len(self.pending)} bytes left")
+        if self.digest is None:
+            raise ValueError("Delta stream ended without the digest of the file")
+
+    def matches(self):
+        """
+        Tells whether the rebuilt file is the sender's file, it is not if the receiver's copy changed after its
+        signatures were computed
+
+        Returns:
+            bool: True if the strong hash of the rebuilt file is the digest the sender sent
+        """
+        return self.digest == self.hash.digest()
@@ -0,0 +1,527 @@
+import asyncio
+import collections
+from DRTP import *
+
+# Size of the DRTP header in bytes
+HEADER_SIZE = header_struct.size
+
+
+class TransportSocket:
+    """
+    A socket-like wrapper around an asyncio datagram transport, so a DRTPConnection can send its packets
+    through the event loop instead of a blocking socket
+
+    Args:
+        transport (asyncio.DatagramTransport): The transport to send with
+    """
+
+    __slots__ = ("transport",)
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def sendto(self, data, addr):
+        self.transport.sendto(data, addr)
+
+    def sendmsg(self, buffers, ancdata, flags, addr):
+        # The transport has no scatter-gather send, the header and the payload are joined into one datagram
+        self.transport.sendto(b"".join(buffers), addr)
+
+
+class AsyncSink(BufferedSink):
+    """
+    A BufferedSink that never blocks the event loop. The flushed blocks of a session are written one after the
+    other by the loop's default executor, a thread pool shared by all sessions, instead of a writer thread per
+    session. Flushing does not wait for a full backlog, the session's advertised window is the free space of the
+    sink, so a sender is held back by the window while the target catches up. close() returns at once and the
+    future done is resolved once everything has been written. Created on the event loop by the sessions
+
+    Args:
+        see BufferedSink
+    """
+
+    def __init__(self, target, buffer_size=WRITE_BUFFER_SIZE, max_backlog=WRITE_BACKLOG_SIZE, offset=0,
+                 compressed=False):
+        self.loop = asyncio.get_running_loop()
+        self.pending = collections.deque()    # Flushed blocks that wait for the block being written
+        self.writing = False
+        self.closing = False
+        self.complete = True
+        self.done = self.loop.create_future()
+        super().__init__(target, buffer_size, max_backlog, offset, compressed)
+
+    def start_writer(self):
+        # The blocks are written by the executor, see write_next()
+        pass
+
+    def flush(self):
+        """
+        Hands all buffered data to the executor without waiting
+
+        Returns:
+            None
+        """
+        if self.error is not None:
+            raise self.error
+
+        if self.buffer:
+            data, self.buffer = self.buffer, bytearray()
+            self.backlog += len(data)
+            self.bytes_written += len(data)
+            self.pending.append(data)
+            self.write_next()
+
+    def write_next(self):
+        """
+        Writes the next flushed block in the executor unless a block is being written, the blocks of a session
+        are written in order. Finishes the sink once everything is written after close()
+
+        Returns:
+            None
+        """
+        if self.writing:
+            return
+        if self.pending:
+            data = self.pending.popleft()
+            self.writing = True
+            future = self.loop.run_in_executor(None, self.write_func, data)
+            future.add_done_callback(lambda future: self.block_written(future, len(data)))
+        elif self.closing:
+            self.closing = False
+            # A compressed block that was cut off is only an error if the stream ended
+            if self.decoder is not None and self.complete and self.error is None:
+                self.writing = True
+                future = self.loop.run_in_executor(None, self.decoder.close)
+                future.add_done_callback(self.finished)
+            else:
+                self.finished()
+
+    def block_written(self, future, size):
+        """
+        Called on the event loop when a block was written, starts writing the next one
+
+        Args:
+            future (asyncio.Future): The write
+            size (int): The size of the block
+
+        Returns:
+            None
+        """
+        self.writing = False
+        self.backlog -= size
+        if self.error is None and future.exception() is not None:
+            self.error = future.exception()
+        # The rest of the data is dropped after an error, the error is reported by done
+        if self.error is not None:
+            while self.pending:
+                self.backlog -= len(self.pending.popleft())
+        self.write_next()
+
+    def finished(self, future=None):
+        """
+        Resolves done once everything was written
+
+        Args:
+            future (asyncio.Future): The close of the decoder, None if there is no decoder to close
+
+        Returns:
+            None
+        """
+        self.writing = False
+        if future is not None and self.error is None and future.exception() is not None:
+            self.error = future.exception()
+        # Count the decompressed bytes written to the target, not the bytes received
+        if self.decoder is not None:
+            self.bytes_written = self.decoder.bytes_written
+        if self.error is not None:
+            self.done.set_exception(self.error)
+        else:
+            self.done.set_result(self.bytes_written)
+
+    def close(self, complete=True):
+        """
+        Flushes the buffer, the writes go on in the background until done is resolved
+
+        Args:
+            complete (bool): Whether the stream ended, a compressed block that was cut off is only an error then
+
+        Returns:
+            None
+        """
+        if self.closing or self.done.done():
+            return
+        self.closing = True
+        self.complete = complete
+        if self.error is None:
+            self.flush()
+        self.write_next()
+
+
+class TimerProtocol(asyncio.DatagramProtocol):
+    """
+    Base class of the DRTP datagram protocols. The retransmission timers of the connections are loop timers
+    that fire at next_deadline(). A timer is only moved when a deadline comes earlier than the scheduled one,
+    a timer that fires early finds nothing expired and is scheduled again, so most packets do not touch the
+    loop's timer heap
+    """
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.transport = None
+        self.timers = {}    # The scheduled (deadline, TimerHandle) of every connection with a running timer
+
+    def schedule(self, connection):
+        """
+        Makes sure a loop timer fires no later than the next deadline of the connection
+
+        Args:
+            connection (DRTPConnection): The connection
+
+        Returns:
+            None
+        """
+        deadline = connection.next_deadline()
+        if deadline is None:
+            return
+
+        scheduled = self.timers.get(connection)
+        if scheduled is not None:
+            if scheduled[0] <= deadline:
+                return
+            scheduled[1].cancel()
+
+        handle = self.loop.call_later(max(deadline - time.monotonic(), 0), self.timer_expired, connection)
+        self.timers[connection] = (deadline, handle)
+
+    def timer_expired(self, connection):
+        """
+        Runs the timers of the connection when its loop timer fires
+
+        Args:
+            connection (DRTPConnection): The connection
+
+        Returns:
+            None
+        """
+        del self.timers[connection]
+        connection.on_timer()
+        self.connection_updated(connection)
+
+    def connection_updated(self, connection):
+        """
+        Called after a packet or a timer was handled by a connection
+
+        Args:
+            connection (DRTPConnection): The connection
+
+        Returns:
+            None
+        """
+        self.schedule(connection)
+
+    def error_received(self, exc):
+        # An ICMP error, e.g. port unreachable while the receiver is not up yet, the retransmission timer keeps going
+        print("Error:", exc)
+
+    def cancel_timers(self):
+        """
+        Cancels the loop timers of all connections
+
+        Returns:
+            None
+        """
+        for deadline, handle in self.timers.values():
+            handle.cancel()
+        self.timers.clear()
+
+
+class DRTPSender(TimerProtocol):
+    """
+    The sending side of a DRTP connection on the asyncio event loop. Created by open_sender()
+
+    Args:
+        connection (DRTPConnection): The connection to drive, its socket is set to the transport
+    """
+
+    def __init__(self, connection):
+        super().__init__()
+        self.connection = connection
+        self.waiter = None      # Future the coroutine waiting for the connection to change waits on
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.connection.sock = TransportSocket(transport)
+
+    def datagram_received(self, data, addr):
+        # A datagram too short to hold a header is dropped
+        if len(data) < HEADER_SIZE:
+            return
+        seq_num, ack_num, flags, window = header_struct.unpack_from(data)
+        self.connection.handle_packet(seq_num, ack_num, flags, window, memoryview(data)[HEADER_SIZE:], addr)
+        self.connection_updated(self.connection)
+
+    def connection_updated(self, connection):
+        # Send the packets the ACK made room for and wake up the waiting coroutine
+        if connection.state == "ESTABLISHED":
+            connection.fill_window()
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+        self.schedule(connection)
+
+    async def wait_until(self, condition):
+        """
+        Waits until the condition holds, it is checked again every time the connection handled a packet or a timer
+
+        Args:
+            condition (callable): Returns True once the wait is over
+
+        Returns:
+            None
+        """
+        while not condition():
+            self.waiter = self.loop.create_future()
+            await self.waiter
+
+    async def connect(self):
+        """
+        Performs the three-way handshake with the receiver
+
+        Returns:
+            dict[int, bytes]: The handshake options accepted by the receiver
+        """
+        self.connection.start_connect()
+        self.schedule(self.connection)
+        await self.wait_until(lambda: self.connection.state != "SYN_SENT")
+        return self.connection.options
+
+    async def send(self, data):
+        """
+        Sends data to the receiver and returns once all of it has been acknowledged, the connection is
+        established first if needed
+
+        Args:
+            data (bytes or memoryview): The data to send
+
+        Returns:
+            None
+        """
+        if self.connection.state == "CLOSED":
+            await self.connect()
+
+        self.connection.start_send(data)
+        self.schedule(self.connection)
+        await self.wait_until(self.connection.sent)
+        self.connection.finish_send()
+
+    async def close(self):
+        """
+        Sends the FIN, waits until it is acknowledged or given up on and closes the transport
+
+        Returns:
+            None
+        """
+        self.connection.start_close()
+        self.schedule(self.connection)
+        await self.wait_until(lambda: self.connection.state != "FIN_SENT")
+        self.cancel_timers()
+        self.transport.close()
+
+
+class DRTPServerProtocol(TimerProtocol):
+    """
+    The receiving side of DRTP on the asyncio event loop, serving many senders at once on one endpoint. The
+    datagrams are routed to the sessions by a DRTPServer. The sessions write through an AsyncSink, and
+    end_session is called once all of a session's data has been written. Created by start_server()
+
+    Args:
+        method (str): The reliability method of the sessions, "SAW", "GBN" or "SR"
+        window_size (int): The reorder buffer of an SR receiver in packets
+        open_session (callable): Called with the sender's address and connection id when a new session starts,
+            returns the sink the session writes to
+        end_session (callable): Called with the DRTPConnection when a session has received the FIN or was
+            aborted, its result is None if it was aborted. May be None
+        skip_ack (bool): Whether every session ignores its first data packet, for test cases
+    """
+
+    def __init__(self, method, window_size, open_session, end_session=None, skip_ack=False):
+        super().__init__()
+        self.method = method
+        self.window_size = window_size
+        self.open_session = open_session
+        self.end_session = end_session
+        self.skip_ack = skip_ack
+        self.server = None
+        self.expiry_timer = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server = DRTPServer(TransportSocket(transport), self.method, self.window_size, self.open_session,
+                                 self.session_ended, self.skip_ack, sink_class=AsyncSink)
+        self.expiry_timer = self.loop.call_later(1.0, self.expire_sessions)
+
+    def datagram_received(self, data, addr):
+        # A datagram too short to hold a header is dropped
+        if len(data) < HEADER_SIZE:
+            return
+        seq_num, ack_num, flags, window = header_struct.unpack_from(data)
+        connection = self.server.handle_packet(seq_num, ack_num, flags, window, memoryview(data)[HEADER_SIZE:], addr)
+        if connection is not None:
+            self.connection_updated(connection)
+
+    def session_ended(self, connection):
+        """
+        Called by the DRTPServer when a session has received the FIN or was aborted, end_session is called once
+        the sink of the session has written everything
+
+        Args:
+            connection (DRTPConnection): The session
+
+        Returns:
+            None
+        """
+        if connection.received_data is None:
+            self.report_session(connection)
+        else:
+            connection.received_data.done.add_done_callback(lambda done: self.sink_closed(connection, done))
+
+    def sink_closed(self, connection, done):
+        """
+        Called when the sink of a session that ended has written everything
+
+        Args:
+            connection (DRTPConnection): The session
+            done (asyncio.Future): The done future of the sink
+
+        Returns:
+            None
+        """
+        if done.exception() is not None:
+            print("Error writing the received data:", done.exception())
+            connection.result = None
+        # The result was taken when the FIN arrived, before the data was written
+        elif connection.result is not None:
+            connection.result = sink_result(connection.received_data, connection.memory)
+        self.report_session(connection)
+
+    def report_session(self, connection):
+        if self.end_session is not None:
+            self.end_session(connection)
+
+    def expire_sessions(self):
+        """
+        Removes the idle sessions once a second
+
+        Returns:
+            None
+        """
+        self.server.run_timers()
+        self.expiry_timer = self.loop.call_later(1.0, self.expire_sessions)
+
+    def close(self):
+        """
+        Stops serving, the unfinished sessions are reported as aborted
+
+        Returns:
+            None
+        """
+        self.expiry_timer.cancel()
+        self.cancel_timers()
+        self.server.close()
+        self.transport.close()
+
+
+async def open_sender(addr, method="GBN", window_size=5, rto=None, cc=None, sack=False, connection_id=0, pacer=None):
+    """
+    Opens the sending side of a DRTP connection on the running event loop, the handshake is done by
+    connect() or by the first send()
+
+    Args:
+        addr (tuple): IP address and port number of the receiver
+        method (str): The reliability method, "SAW", "GBN" or "SR"
+        window_size (int): The size of the sliding window in packets
+        rto (RTOEstimator): Retransmission timer, a default one is created if None
+        cc (CongestionController): Congestion controller, a fixed window of window_size packets is used if None
+        sack (bool): Whether to ask the receiver for selective acknowledgements in the handshake
+        connection_id (int): The connection id, a random one is chosen if 0
+        pacer (Pacer): Spreads the packets evenly over time, the sender waits for it on a loop timer. Packets are
+            sent back to back if None
+
+    Returns:
+        DRTPSender: The sender
+    """
+    loop = asyncio.get_running_loop()
+    connection = DRTPConnection(None, addr, method, window_size, rto, cc, pacer, sack, connection_id=connection_id)
+    transport, sender = await loop.create_datagram_endpoint(lambda: DRTPSender(connection), local_addr=("0.0.0.0", 0))
+    return sender
+
+
+async def send_data(addr, data, method="GBN", window_size=5, rto=None, cc=None, sack=False, pacer=None):
+    """
+    Sends data to a receiver over a new DRTP connection and closes it
+
+    Args:
+        addr (tuple): IP address and port number of the receiver
+        data (bytes or memoryview): The data to send
+        method (str): The reliability method, "SAW", "GBN" or "SR"
+        window_size (int): The size of the sliding window in packets
+        rto (RTOEstimator): Retransmission timer, a default one is created if None
+        cc (CongestionController): Congestion controller, a fixed window of window_size packets is used if None
+        sack (bool): Whether to ask the receiver for selective acknowledgements in the handshake
+        pacer (Pacer): Spreads the packets evenly over time, packets are sent back to back if None
+
+    Returns:
+        None
+    """
+    sender = await open_sender(addr, method, window_size, rto, cc, sack, pacer=pacer)
+    await sender.send(data)
+    await sender.close()
+
+
+async def start_server(local_addr, method, window_size, open_session, end_session=None, skip_ack=False):
+    """
+    Starts receiving from any number of senders on the running event loop
+
+    Args:
+        local_addr (tuple): IP address and port number to bind to
+        method (str): The reliability method of the sessions, "SAW", "GBN" or "SR"
+        window_size (int): The reorder buffer of an SR receiver in packets
+        open_session (callable): Called with the sender's address and connection id when a new session starts,
+            returns the sink the session writes to
+        end_session (callable): Called with the DRTPConnection when a session has received the FIN or was
+            aborted, its result is None if it was aborted. May be None
+        skip_ack (bool): Whether every session ignores its first data packet, for test cases
+
+    Returns:
+        DRTPServerProtocol: The server, stopped by its close() method
+    """
+    loop = asyncio.get_running_loop()
+    transport, server = await loop.create_datagram_endpoint(
+        lambda: DRTPServerProtocol(method, window_size, open_session, end_session, skip_ack), local_addr=local_addr)
+    return server
+
+
+async def receive_data(local_addr, method="GBN", window_size=5, sink=None, skip_ack=False):
+    """
+    Receives a single transfer and stops serving
+
+    Args:
+        local_addr (tuple): IP address and port number to bind to
+        method (str): The reliability method, "SAW", "GBN" or "SR"
+        window_size (int): The reorder buffer of an SR receiver in packets
+        sink (file object or callable): Where in-order data is written as it arrives, if None the data is kept in memory
+        skip_ack (bool): Whether to ignore the first data packet, for test cases
+
+    Returns:
+        bytes or int: All of the received data if no sink was given, else the number of bytes written to the sink
+    """
+    done = asyncio.get_running_loop().create_future()
+
+    def end_session(connection):
+        if not done.done():
+            done.set_result(connection.result)
+
+    server = await start_server(local_addr, method, window_size, lambda addr, connection_id: sink, end_session, skip_ack)
+    try:
+        return await done
+    finally:
+        server.close()
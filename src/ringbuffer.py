@@ -0,0 +1,206 @@
+# Initial number of slots of a ring buffer, a power of two
+RING_SLOTS = 64
+
+
+class RingBuffer:
+    """
+    A window of packets keyed by sequence number, for the unacked packets of a sender and the out-of-order packets
+    of a receiver. The packet with sequence number seq is stored in slot seq % capacity, and a bitmap has bit i set
+    if packet base + i is held. Inserting, looking up and removing a packet are O(1), and sliding the window is
+    O(1) per packet slid over, so the cost per packet does not grow with the window size. The bitmap is the SACK
+    bitmap of a receiver and picks out the packets a SACK acknowledges on the sender. The buffer doubles its
+    capacity when a packet beyond it is inserted
+
+    Args:
+        base (int): The sequence number of the first slot of the window
+        capacity (int): The initial number of slots, rounded up to a power of two
+    """
+
+    __slots__ = ("base", "mask", "slots", "bits", "count")
+
+    def __init__(self, base=1, capacity=RING_SLOTS):
+        size = 1
+        while size < capacity:
+            size *= 2
+        self.base = base
+        self.mask = size - 1
+        self.slots = [None] * size
+        self.bits = 0       # Bit i is set if packet base + i is held
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, seq_num):
+        return (0 <= seq_num - self.base <= self.mask) and self.slots[seq_num & self.mask] is not None
+
+    def __iter__(self):
+        # The sequence numbers of the packets held, lowest first, found from the set bits of the bitmap
+        bits = self.bits
+        while bits:
+            lowest = bits & -bits
+            yield self.base + lowest.bit_length() - 1
+            bits ^= lowest
+
+    def get(self, seq_num):
+        """
+        Returns a packet
+
+        Args:
+            seq_num (int): The sequence number of the packet
+
+        Returns:
+            object: The packet, None if it is not held
+        """
+        if 0 <= seq_num - self.base <= self.mask:
+            return self.slots[seq_num & self.mask]
+        return None
+
+    def put(self, seq_num, packet):
+        """
+        Stores a packet at or above the base of the window
+
+        Args:
+            seq_num (int): The sequence number of the packet
+            packet (object): The packet, not None
+
+        Returns:
+            None
+        """
+        offset = seq_num - self.base
+        if offset > self.mask:
+            self.grow(offset + 1)
+
+        index = seq_num & self.mask
+        if self.slots[index] is None:
+            self.count += 1
+            self.bits |= 1 << offset
+        self.slots[index] = packet
+
+    def pop(self, seq_num):
+        """
+        Removes a packet
+
+        Args:
+            seq_num (int): The sequence number of the packet
+
+        Returns:
+            object: The packet, None if it was not held
+        """
+        if seq_num not in self:
+            return None
+        index = seq_num & self.mask
+        packet = self.slots[index]
+        self.slots[index] = None
+        self.bits &= ~(1 << (seq_num - self.base))
+        self.count -= 1
+        return packet
+
+    def first(self):
+        """
+        Returns the lowest sequence number held
+
+        Returns:
+            int or None: The sequence number, None if the buffer is empty
+        """
+        if not self.bits:
+            return None
+        return self.base + (self.bits & -self.bits).bit_length() - 1
+
+    def advance(self, base):
+        """
+        Slides the window forward, packets below the new base are dropped
+
+        Args:
+            base (int): The new base sequence number
+
+        Returns:
+            None
+        """
+        shift = base - self.base
+        if shift <= 0:
+            return
+        # Clear the slots slid over that still hold a packet, only they have a bit set
+        dropped = self.bits & ((1 << shift) - 1)
+        while dropped:
+            lowest = dropped & -dropped
+            self.slots[(self.base + lowest.bit_length() - 1) & self.mask] = None
+            self.count -= 1
+            dropped ^= lowest
+        self.bits >>= shift
+        self.base = base
+
+    def pop_in_order(self):
+        """
+        Removes the packets held contiguously from the base of the window and slides the window past them
+
+        Returns:
+            list: The packets in sequence number order, empty if the base packet is not held
+        """
+        # The number of trailing one bits is the length of the contiguous run
+        run = (~self.bits & (self.bits + 1)).bit_length() - 1
+        packets = []
+        for seq_num in range(self.base, self.base + run):
+            index = seq_num & self.mask
+            packets.append(self.slots[index])
+            self.slots[index] = None
+        self.bits >>= run
+        self.base += run
+        self.count -= run
+        return packets
+
+    def bitmap(self, start):
+        """
+        Returns the bitmap of the packets held, aligned so that bit i stands for packet start + i
+
+        Args:
+            start (int): The sequence number of bit 0
+
+        Returns:
+            int: The bitmap
+        """
+        shift = start - self.base
+        return self.bits >> shift if shift >= 0 else self.bits << -shift
+
+    def select(self, bitmap, start):
+        """
+        Returns the packets held among those set in a bitmap, e.g. the unacked packets a SACK acknowledges
+
+        Args:
+            bitmap (int): Bit i stands for packet start + i
+            start (int): The sequence number of bit 0
+
+        Returns:
+            list[int]: The sequence numbers of the packets held that are set in the bitmap, lowest first
+        """
+        shift = start - self.base
+        bits = self.bits & (bitmap << shift if shift >= 0 else bitmap >> -shift)
+        selected = []
+        while bits:
+            lowest = bits & -bits
+            selected.append(self.base + lowest.bit_length() - 1)
+            bits ^= lowest
+        return selected
+
+    def grow(self, size):
+        """
+        Doubles the number of slots until the window holds size packets, the packets are moved to their new slots
+
+        Args:
+            size (int): The number of packets from the base the window must hold
+
+        Returns:
+            None
+        """
+        capacity = len(self.slots)
+        while capacity < size:
+            capacity *= 2
+        old_slots, old_mask = self.slots, self.mask
+        self.slots = [None] * capacity
+        self.mask = capacity - 1
+        bits = self.bits
+        while bits:
+            lowest = bits & -bits
+            seq_num = self.base + lowest.bit_length() - 1
+            self.slots[seq_num & self.mask] = old_slots[seq_num & old_mask]
+            bits ^= lowest
@@ -0,0 +1,61 @@
+import asyncio
+import io
+import os
+import threading
+
+from drtp_async import *
+
+
+def test_sessions_share_the_loop():
+    async def main():
+        blobs = [os.urandom(200000 + i) for i in range(8)]
+        sinks = {}
+        results = {}
+        done = asyncio.get_running_loop().create_future()
+
+        def open_session(addr, connection_id):
+            sinks[addr] = io.BytesIO()
+            return sinks[addr]
+
+        def end_session(connection):
+            # The data is all written to the sink once the session is reported
+            results[connection.addr] = (connection.result, sinks[connection.addr].getvalue())
+            if len(results) == len(blobs):
+                done.set_result(None)
+
+        threads = threading.active_count()
+        server = await start_server(("127.0.0.1", 0), "SR", 32, open_session, end_session)
+        addr = server.transport.get_extra_info("sockname")
+        # Runt datagrams are dropped without disturbing the sessions
+        server.transport.sendto(b"", addr)
+        server.transport.sendto(b"\x00" * (HEADER_SIZE - 1), addr)
+        await asyncio.gather(*(send_data(addr, blob, "SR", 32) for blob in blobs))
+        await asyncio.wait_for(done, 30)
+        server.close()
+
+        assert sorted(data for result, data in results.values()) == sorted(blobs)
+        assert all(result == len(data) for result, data in results.values())
+        # The writes run on the shared executor, not on a thread per session
+        assert threading.active_count() - threads < len(blobs)
+
+    asyncio.run(main())
+
+
+def test_receive_into_memory():
+    async def main():
+        data = os.urandom(100000)
+        done = asyncio.get_running_loop().create_future()
+        # Without a sink the session collects the data in memory
+        server = await start_server(("127.0.0.1", 0), "GBN", 16, lambda addr, connection_id: None,
+                                    lambda connection: done.set_result(connection.result))
+        addr = server.transport.get_extra_info("sockname")
+        await send_data(addr, data, "GBN", 16, pacer=Pacer(100e6 / 8))
+        assert await asyncio.wait_for(done, 30) == data
+        server.close()
+
+    asyncio.run(main())
+
+
+if __name__ == "__main__":
+    test_sessions_share_the_loop()
+    test_receive_into_memory()
@@ -0,0 +1,97 @@
+import os
+import stat
+import tempfile
+
+from batch import *
+
+
+def write_stream(writer, stream, step):
+    for offset in range(0, len(stream), step):
+        writer.write(stream[offset : offset + step])
+    writer.close()
+
+
+def test_round_trip():
+    with tempfile.TemporaryDirectory() as root:
+        os.makedirs(os.path.join(root, "tree", "sub"))
+        files = {"tree/a": b"", "tree/b": os.urandom(5000), "tree/sub/c": os.urandom(BATCH_CHUNK_SIZE + 3)}
+        for name, data in files.items():
+            with open(os.path.join(root, name), "wb") as f:
+                f.write(data)
+
+        encoder = BatchEncoder([os.path.join(root, "tree")])
+        stream = b"".join(bytes(chunk) for chunk in encoder)
+        assert len(stream) == len(encoder)
+
+        # The headers may be split anywhere between the writes
+        for step in (1, 13, len(stream)):
+            output = os.path.join(root, f"out{step}")
+            writer = BatchWriter(output, "single")
+            write_stream(writer, stream, step)
+            assert writer.files == len(files)
+            for name, data in files.items():
+                with open(os.path.join(output, name), "rb") as f:
+                    assert f.read() == data
+
+
+def test_mode_is_masked():
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "tool")
+        open(path, "wb").close()
+        os.chmod(path, 0o4755)
+
+        # The sender does not send the setuid bit
+        stream = b"".join(bytes(chunk) for chunk in BatchEncoder([path]))
+        assert file_header_struct.unpack_from(stream, len(BATCH_MAGIC))[1] == 0o755
+
+        # Nor does the receiver apply special bits or bits the umask takes away
+        umask = os.umask(0o022)
+        try:
+            writer = BatchWriter(os.path.join(root, "out"), "single")
+            write_stream(writer, BATCH_MAGIC + file_header_struct.pack(4, 0o6777, 0) + b"tool", 1024)
+        finally:
+            os.umask(umask)
+        assert stat.S_IMODE(os.stat(os.path.join(root, "out", "tool")).st_mode) == 0o755
+
+
+def test_names_outside_the_directory_are_refused():
+    with tempfile.TemporaryDirectory() as root:
+        for name in (b"../escape", b"/etc/escape", b"a/../../escape", b"a//b", b"./a"):
+            writer = BatchWriter(os.path.join(root, "out"), "single")
+            try:
+                writer.write(BATCH_MAGIC + file_header_struct.pack(len(name), 0o644, 1) + name + b"x")
+            except ValueError:
+                pass
+            else:
+                raise AssertionError(f"{name!r} was accepted")
+        assert os.listdir(root) == ["out"]
+        assert os.listdir(os.path.join(root, "out")) == []
+
+
+def test_stream_without_magic_is_a_single_file():
+    with tempfile.TemporaryDirectory() as root:
+        for data in (b"", b"abc", os.urandom(100000)):
+            writer = BatchWriter(root, "single")
+            write_stream(writer, data, 333)
+            with open(os.path.join(root, "single"), "rb") as f:
+                assert f.read() == data
+
+
+def test_truncated_batch_is_an_error():
+    with tempfile.TemporaryDirectory() as root:
+        writer = BatchWriter(root, "single")
+        writer.write(BATCH_MAGIC + file_header_struct.pack(1, 0o644, 10) + b"a" + b"short")
+        try:
+            writer.close()
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("a truncated batch was accepted")
+
+
+if __name__ == "__main__":
+    test_round_trip()
+    test_mode_is_masked()
+    test_names_outside_the_directory_are_refused()
+    test_stream_without_magic_is_a_single_file()
+    test_truncated_batch_is_an_error()
@@ -0,0 +1,82 @@
+import os
+import tempfile
+
+from checkpoint import *
+
+
+def receive_part(file_path, data):
+    # Write the data as the receiver does and save a checkpoint at its end
+    with open(file_path, "w+b") as file:
+        output = CheckpointedFile(file, file_path, load_checkpoint(file_path))
+        output.write(data)
+        output.save()
+        return output.checkpoint(), output.offset
+
+
+def test_resume_from_checkpoint():
+    with tempfile.TemporaryDirectory() as root:
+        file_path = os.path.join(root, "file")
+        data = os.urandom(100000)
+        receive_part(file_path, data[:60000])
+
+        offset, data_hash = load_checkpoint(file_path)
+        assert offset == 60000
+        assert data_hash.digest() == prefix_digest(data, offset)
+
+        # The rest of the file continues the hash of the part that was kept
+        with open(file_path, "r+b") as file:
+            output = CheckpointedFile(file, file_path, (offset, data_hash))
+            output.seek(offset)
+            output.write(data[offset:])
+            output.save()
+        with open(file_path, "rb") as f:
+            assert f.read() == data
+        assert load_checkpoint(file_path)[1].digest() == prefix_digest(data, len(data))
+
+        remove_checkpoint(file_path)
+        assert not os.path.exists(checkpoint_path(file_path))
+        assert not os.path.exists(checkpoint_path(file_path) + ".tmp")
+
+
+def test_checkpoint_mismatch_starts_over():
+    with tempfile.TemporaryDirectory() as root:
+        file_path = os.path.join(root, "file")
+        receive_part(file_path, b"a" * 5000)
+
+        # Data that changed after the checkpoint was saved
+        with open(file_path, "r+b") as f:
+            f.write(b"b")
+        offset, data_hash = load_checkpoint(file_path)
+        assert offset == 0 and data_hash.digest() == new_hash().digest()
+
+        # A checkpoint ahead of the data that reached the disk
+        receive_part(file_path, b"a" * 5000)
+        with open(file_path, "r+b") as f:
+            f.truncate(4000)
+        assert load_checkpoint(file_path)[0] == 0
+
+        # A torn checkpoint
+        receive_part(file_path, b"a" * 5000)
+        with open(checkpoint_path(file_path), "r+b") as f:
+            f.truncate(5)
+        assert load_checkpoint(file_path)[0] == 0
+
+
+def test_seek_only_to_the_checkpoint():
+    with tempfile.TemporaryDirectory() as root:
+        file_path = os.path.join(root, "file")
+        receive_part(file_path, b"a" * 5000)
+        with open(file_path, "r+b") as file:
+            output = CheckpointedFile(file, file_path, load_checkpoint(file_path))
+            try:
+                output.seek(4000)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError("continued the file away from its checkpoint")
+
+
+if __name__ == "__main__":
+    test_resume_from_checkpoint()
+    test_checkpoint_mismatch_starts_over()
+    test_seek_only_to_the_checkpoint()
@@ -0,0 +1,106 @@
+import os
+import zlib
+
+from compressor import *
+
+
+def decode(blocks):
+    output = bytearray()
+    decoder = BlockDecoder(output.extend)
+    stream = b"".join(blocks)
+    # The blocks may be split anywhere between the writes
+    for offset in range(0, len(stream), 1000):
+        decoder.write(stream[offset : offset + 1000])
+    decoder.close()
+    return bytes(output)
+
+
+def test_incompressible_block_is_sent_raw():
+    block = os.urandom(SAMPLE_SIZE * 4)
+    for codec_id in CODECS:
+        encoded = compress_block(block, codec_id)
+        assert block_struct.unpack_from(encoded) == (RAW_BLOCK, len(block))
+        assert encoded[block_struct.size:] == block
+    # A small block is compressed without a sample, but is still sent raw if it does not shrink
+    encoded = compress_block(os.urandom(100), CODEC_IDS["zlib"])
+    assert encoded[0] == RAW_BLOCK
+
+
+def test_compressible_block_shrinks():
+    block = b"timestamp,value\n" * 10000
+    for codec_id in CODECS:
+        encoded = compress_block(block, codec_id)
+        codec, length = block_struct.unpack_from(encoded)
+        assert codec == codec_id and length < len(block) // 10
+        assert decode([encoded]) == block
+
+
+def test_round_trip_of_mixed_data():
+    data = os.urandom(100000) + b"a" * 150000 + os.urandom(30000)
+    encoder = BlockEncoder(data, CODEC_IDS["zlib"], block_size=50000)
+    assert decode(encoder) == data
+    assert encoder.bytes_read == len(data)
+    # The two random blocks at the start and the short random block at the end go raw
+    assert encoder.raw_blocks == 3
+    assert "3 of 6 blocks sent raw" in encoder.summary()
+
+
+def test_buffers_of_an_iterator_are_joined_into_blocks():
+    data = os.urandom(100000) + b"a" * 180000
+    buffers = iter([data[offset : offset + 7000] for offset in range(0, len(data), 7000)])
+    assert [len(block) for block in split_blocks(buffers, 100000)] == [100000, 100000, 80000]
+    assert decode(BlockEncoder(iter([data]), CODEC_IDS["zlib"], block_size=50000)) == data
+
+
+def test_truncated_stream_is_an_error():
+    decoder = BlockDecoder(lambda data: None)
+    decoder.write(compress_block(b"a" * 1000, CODEC_IDS["zlib"])[:-1])
+    try:
+        decoder.close()
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("a truncated stream was accepted")
+
+
+def test_decompression_is_bounded():
+    # A small block that would expand far beyond the block size
+    bomb = b"\0" * (COMPRESS_BLOCK_SIZE * 64)
+    for codec_id in CODECS:
+        compressed = CODECS[codec_id][0](bomb)
+        assert len(compressed) < COMPRESS_BLOCK_SIZE
+        decoder = BlockDecoder(lambda data: None)
+        try:
+            decoder.write(block_struct.pack(codec_id, len(compressed)) + compressed)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("decompressed a block larger than the block size")
+
+    # A block header that announces more than a block is refused before the data arrives
+    decoder = BlockDecoder(lambda data: None)
+    try:
+        decoder.write(block_struct.pack(RAW_BLOCK, COMPRESS_BLOCK_SIZE + 1))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("accepted a block larger than the block size")
+
+    # A compressed block cut off within its compressed data
+    compressed = zlib.compress(os.urandom(1000) * 10)[:-10]
+    decoder = BlockDecoder(lambda data: None)
+    try:
+        decoder.write(block_struct.pack(CODEC_IDS["zlib"], len(compressed)) + compressed)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("accepted a truncated compressed block")
+
+
+if __name__ == "__main__":
+    test_incompressible_block_is_sent_raw()
+    test_compressible_block_shrinks()
+    test_round_trip_of_mixed_data()
+    test_buffers_of_an_iterator_are_joined_into_blocks()
+    test_truncated_stream_is_an_error()
+    test_decompression_is_bounded()
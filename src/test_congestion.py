@@ -0,0 +1,41 @@
+from congestion import *
+
+
+def test_pacer_spaces_packets():
+    pacer = Pacer(rate=1000)
+    assert pacer.ready(10.0)
+    pacer.on_send(100, 1, None, 10.0)
+    # The next packet may go out 100 bytes / 1000 bytes/s later
+    assert not pacer.ready(10.05)
+    assert pacer.ready(10.1)
+
+
+def test_pacer_makes_up_for_late_wakeups_only_briefly():
+    pacer = Pacer(rate=1000000)
+    pacer.on_send(1000, 1, None, 10.0)
+    # Woken up a millisecond late, the sender may send the packet it missed right away
+    pacer.on_send(1000, 1, None, 10.002)
+    assert pacer.ready(10.002)
+    # An idle sender does not build up credit for a burst
+    pacer.on_send(1000, 1, None, 20.0)
+    pacer.on_send(1000, 1, None, 20.0)
+    pacer.on_send(1000, 1, None, 20.0)
+    assert not pacer.ready(20.0)
+
+
+def test_pacer_follows_the_congestion_window():
+    pacer = Pacer(packet_size=1000)
+    # No pacing before the first RTT sample
+    pacer.on_send(1000, 10, None, 10.0)
+    assert pacer.ready(10.0)
+    # 10 packets of 1000 bytes per 0.1 s at a gain of 1.25
+    assert abs(pacer.current_rate(10, 0.1) - 125000) < 1e-6
+    pacer.on_send(1000, 10, 0.1, 10.0)
+    send_time = 10.0 - Pacer.MAX_LAG + 0.008
+    assert not pacer.ready(send_time - 0.0001) and pacer.ready(send_time + 0.0001)
+
+
+if __name__ == "__main__":
+    test_pacer_spaces_packets()
+    test_pacer_makes_up_for_late_wakeups_only_briefly()
+    test_pacer_follows_the_congestion_window()
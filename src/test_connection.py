@@ -0,0 +1,97 @@
+import os
+import threading
+from socket import *
+
+from DRTP import *
+
+
+def transfer(send_func, recv_func, data):
+    # Receive on an ephemeral port of the loopback interface while the sender runs in a thread
+    receiver = socket(AF_INET, SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    sender = socket(AF_INET, SOCK_DGRAM)
+    errors = []
+
+    def run_sender():
+        try:
+            send_func(sender, receiver.getsockname(), data)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            sender.close()
+
+    t = threading.Thread(target=run_sender, daemon=True)
+    t.start()
+    received = recv_func(receiver)
+    t.join(30)
+    assert not t.is_alive() and not errors
+    return received
+
+
+def test_stop_and_wait_with_loss():
+    data = os.urandom(50000)
+    received = transfer(lambda sock, addr, data: SEND_SAW(sock, addr, data),
+                        lambda sock: RECV_SAW(sock, True), data)
+    assert received == data
+
+
+def test_go_back_n_with_loss():
+    data = os.urandom(300000)
+    # The sender skips packet 5 and the receiver ignores the first data packet it gets
+    received = transfer(lambda sock, addr, data: SEND_GBN(sock, addr, data, 10, True),
+                        lambda sock: RECV_GBN(sock, True), data)
+    assert received == data
+
+
+def test_selective_repeat_with_loss():
+    data = os.urandom(300000)
+    received = transfer(lambda sock, addr, data: SEND_SR(sock, addr, data, 10, True),
+                        lambda sock: RECV_SR(sock, True, 10), data)
+    assert received == data
+
+
+def test_selective_repeat_with_sack_and_loss():
+    data = os.urandom(300000)
+    received = transfer(lambda sock, addr, data: SEND_SR(sock, addr, data, 32, True, sack=True),
+                        lambda sock: RECV_SR(sock, True, 32), data)
+    assert received == data
+
+
+def test_empty_transfer():
+    received = transfer(lambda sock, addr, data: SEND_GBN(sock, addr, data, 10, False),
+                        lambda sock: RECV_GBN(sock, False), b"")
+    assert received == b""
+
+
+def test_receive_window():
+    receiver = socket(AF_INET, SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    sender = socket(AF_INET, SOCK_DGRAM)
+    sender.bind(("127.0.0.1", 0))
+    # A GBN receiver without FEC buffers nothing, only the room in its sink limits the window
+    sink_packets = WRITE_BACKLOG_SIZE // DEFAULT_MSS
+    for method, fec, window in (("GBN", 0, sink_packets), ("GBN", 4, ADVERTISED_WINDOW), ("SR", 0, 500), ("SAW", 0, 1)):
+        connection = DRTPConnection(receiver, None, method, 500)
+        options = {OPTION_FEC: bytes([fec])} if fec else {}
+        connection.handle_packet(0, 0, 8, 0, encode_options(options), sender.getsockname())
+        assert connection.advertised_window() == window
+        connection.received_data.close()
+    receiver.close()
+    sender.close()
+
+
+def test_go_back_n_with_a_large_window():
+    data = os.urandom(2000000)
+    received = transfer(lambda sock, addr, data: SEND_GBN(sock, addr, data, 500, True),
+                        lambda sock: RECV_GBN(sock, False), data)
+    assert received == data
+
+
+if __name__ == "__main__":
+    test_stop_and_wait_with_loss()
+    test_go_back_n_with_loss()
+    test_selective_repeat_with_loss()
+    test_selective_repeat_with_sack_and_loss()
+    test_empty_transfer()
+    test_receive_window()
+    test_go_back_n_with_a_large_window()
@@ -0,0 +1,135 @@
+import io
+import os
+import random
+
+from delta import *
+
+BLOCK_SIZE = 2048
+
+
+def transfer(basis, data, step=None):
+    # Encode the data against the signatures of the basis and rebuild it from the basis, as the two ends do
+    basis_file = io.BytesIO(basis) if basis is not None else None
+    encoder = DeltaEncoder(data, block_signatures(basis_file, BLOCK_SIZE), BLOCK_SIZE)
+    stream = b"".join(bytes(op) for op in encoder)
+
+    target = io.BytesIO()
+    decoder = DeltaDecoder(target, io.BytesIO(basis) if basis is not None else None, BLOCK_SIZE)
+    step = step or len(stream) or 1
+    for offset in range(0, len(stream), step):
+        decoder.write(stream[offset : offset + step])
+    decoder.close()
+    assert target.getvalue() == data and decoder.matches()
+    assert decoder.bytes_written == len(data)
+    return encoder
+
+
+def test_identical_data_is_copied():
+    basis = os.urandom(BLOCK_SIZE * 20 + 100)
+    encoder = transfer(basis, basis)
+    # The short last block matches the end of the data
+    assert encoder.literal_bytes == 0
+    assert encoder.copied_blocks == 21
+
+
+def test_insertions_deletions_and_edits():
+    rng = random.Random(1)
+    basis = bytes(rng.getrandbits(8) for _ in range(BLOCK_SIZE * 40))
+    data = bytearray(basis)
+    data[5000:5000] = b"inserted" * 100                      # Insertion, the blocks after it are shifted
+    del data[30000:33000]                                     # Deletion
+    data[60000:60010] = b"x" * 10                             # Edit in place
+    data += b"appended"
+    data = bytes(data)
+
+    # The operations may be split anywhere between the writes
+    for step in (1, 7, None):
+        encoder = transfer(basis, data, step)
+    # Only the changed regions and the blocks they touch are sent
+    assert encoder.literal_bytes < 6 * BLOCK_SIZE + 1000
+    assert encoder.copied_blocks >= 33
+
+
+def test_moved_blocks_are_copied():
+    basis = os.urandom(BLOCK_SIZE * 8)
+    data = basis[BLOCK_SIZE * 4:] + basis[:BLOCK_SIZE * 4]
+    encoder = transfer(basis, data)
+    assert encoder.literal_bytes == 0
+
+
+def test_without_basis_everything_is_literal():
+    data = os.urandom(BLOCK_SIZE * 3 + 5)
+    encoder = transfer(None, data)
+    assert encoder.copied_blocks == 0 and encoder.literal_bytes == len(data)
+    assert block_signatures(None, BLOCK_SIZE) == basis_struct.pack(0)
+    transfer(os.urandom(1000), b"")
+
+
+def test_block_references_need_a_basis():
+    decoder = DeltaDecoder(io.BytesIO(), None, BLOCK_SIZE)
+    try:
+        decoder.write(op_struct.pack(COPY_BLOCKS, 0, 1))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("copied a block without a copy of the file")
+
+
+def test_truncated_stream_is_an_error():
+    decoder = DeltaDecoder(io.BytesIO(), None, BLOCK_SIZE)
+    decoder.write(op_struct.pack(LITERAL, 10, 0) + b"short")
+    try:
+        decoder.close()
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("a truncated delta stream was accepted")
+
+
+def test_blocks_beyond_the_copy_are_refused():
+    basis = os.urandom(BLOCK_SIZE * 3 + 100)
+    for first, count in ((4, 1), (3, 2), (0, 5)):
+        decoder = DeltaDecoder(io.BytesIO(), io.BytesIO(basis), BLOCK_SIZE)
+        try:
+            decoder.write(op_struct.pack(COPY_BLOCKS, first, count))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"copied blocks {first} to {first + count - 1} of a copy of 4 blocks")
+
+
+def test_stale_copy_does_not_match():
+    basis = os.urandom(BLOCK_SIZE * 10)
+    data = basis[:BLOCK_SIZE * 5] + b"changed" + basis[BLOCK_SIZE * 5:]
+    stream = b"".join(bytes(op) for op in DeltaEncoder(data, block_signatures(io.BytesIO(basis), BLOCK_SIZE),
+                                                       BLOCK_SIZE))
+
+    # The copy changed after its signatures were sent, the rebuilt file is not the sender's file
+    stale = bytearray(basis)
+    stale[BLOCK_SIZE * 2] ^= 0xFF
+    target = io.BytesIO()
+    decoder = DeltaDecoder(target, io.BytesIO(bytes(stale)), BLOCK_SIZE)
+    decoder.write(stream)
+    decoder.close()
+    assert len(target.getvalue()) == len(data) and not decoder.matches()
+
+    # A stream cut off before its digest is incomplete
+    decoder = DeltaDecoder(io.BytesIO(), io.BytesIO(basis), BLOCK_SIZE)
+    decoder.write(stream[:-(op_struct.size + 16)])
+    try:
+        decoder.close()
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("a delta stream without its digest was accepted")
+
+
+if __name__ == "__main__":
+    test_identical_data_is_copied()
+    test_insertions_deletions_and_edits()
+    test_moved_blocks_are_copied()
+    test_without_basis_everything_is_literal()
+    test_block_references_need_a_basis()
+    test_truncated_stream_is_an_error()
+    test_blocks_beyond_the_copy_are_refused()
+    test_stale_copy_does_not_match()
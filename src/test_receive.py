@@ -0,0 +1,52 @@
+from socket import *
+
+from DRTP import *
+
+
+def open_pair():
+    receiver = socket(AF_INET, SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    receiver.settimeout(1)
+    sender = socket(AF_INET, SOCK_DGRAM)
+    return sender, receiver
+
+
+def test_runt_datagram_is_dropped():
+    sender, receiver = open_pair()
+    pool = ReceiveBufferPool(slots=1)
+    addr = receiver.getsockname()
+
+    # The only buffer of the pool holds a valid ACK when the runt arrives
+    sender.sendto(create_packet(0, 7, 4, 5, b""), addr)
+    assert pool.recv(receiver)[:4] == (0, 7, 4, 5)
+    for runt in (b"", b"\x00" * (header_struct.size - 1)):
+        sender.sendto(runt, addr)
+        assert pool.recv(receiver) is None
+
+    sender.sendto(create_packet(3, 0, 0, 0, b"data"), addr)
+    seq_num, ack_num, flags, win, payload, _ = pool.recv(receiver)
+    assert (seq_num, bytes(payload)) == (3, b"data")
+    sender.close()
+    receiver.close()
+
+
+def test_coalesced_runt_datagram_is_dropped():
+    sender, receiver = open_pair()
+    pool = ReceiveBufferPool()
+    addr = receiver.getsockname()
+
+    # Without UDP_GRO every datagram is a single segment, an empty one must not stop the event loop
+    for runt in (b"", b"\x00" * (header_struct.size - 1)):
+        sender.sendto(runt, addr)
+        assert pool.recv_coalesced(receiver) == []
+
+    sender.sendto(create_packet(3, 0, 0, 0, b"data"), addr)
+    packets = pool.recv_coalesced(receiver)
+    assert [(packet[0], bytes(packet[4])) for packet in packets] == [(3, b"data")]
+    sender.close()
+    receiver.close()
+
+
+if __name__ == "__main__":
+    test_runt_datagram_is_dropped()
+    test_coalesced_runt_datagram_is_dropped()
@@ -0,0 +1,76 @@
+from ringbuffer import *
+from DRTP import encode_sack, decode_sack
+
+
+def test_window_wraps_around():
+    ring = RingBuffer(base=1, capacity=4)
+    # Slide the window several times around the four slots
+    for seq_num in range(1, 40):
+        ring.put(seq_num, f"packet {seq_num}")
+        if seq_num >= 4:
+            assert ring.pop(seq_num - 3) == f"packet {seq_num - 3}"
+            ring.advance(seq_num - 2)
+        assert len(ring.slots) == 4
+    assert list(ring) == [37, 38, 39]
+    assert ring.get(39) == "packet 39" and ring.get(35) is None
+    assert 36 not in ring and 37 in ring
+
+
+def test_grow_keeps_packets():
+    ring = RingBuffer(base=10, capacity=4)
+    ring.put(10, "a")
+    ring.put(12, "c")
+    ring.put(30, "z")
+    assert len(ring.slots) == 32
+    assert [ring.get(seq_num) for seq_num in (10, 11, 12, 30)] == ["a", None, "c", "z"]
+    assert len(ring) == 3 and ring.first() == 10
+
+
+def test_pop_in_order_stops_at_the_first_gap():
+    ring = RingBuffer(base=1, capacity=8)
+    for seq_num in (1, 2, 3, 5, 6):
+        ring.put(seq_num, seq_num)
+    assert ring.pop_in_order() == [1, 2, 3]
+    assert ring.base == 4 and ring.pop_in_order() == []
+    ring.put(4, 4)
+    assert ring.pop_in_order() == [4, 5, 6]
+    assert len(ring) == 0 and ring.first() is None
+
+
+def test_advance_drops_packets_below_the_base():
+    ring = RingBuffer(base=1, capacity=8)
+    for seq_num in (1, 3, 4, 7):
+        ring.put(seq_num, seq_num)
+    ring.advance(4)
+    assert list(ring) == [4, 7] and len(ring) == 2
+    # The slot of a dropped packet is free for the packet that wraps onto it
+    ring.put(11, 11)
+    assert ring.get(11) == 11 and 3 not in ring
+
+
+def test_sack_bitmap_round_trip():
+    # Receiver: packets 5, 6 and 9 arrived above the cumulative ACK of 3, packet 4 is missing
+    receiver = RingBuffer(base=4, capacity=8)
+    for seq_num in (5, 6, 9):
+        receiver.put(seq_num, b"")
+    ack_num = 3
+    payload = encode_sack(receiver.bitmap(ack_num + 1))
+    assert payload == bytes([0b100110])
+
+    # Sender: packets 4 to 10 are unacked, the SACK picks out the packets the receiver holds
+    sender = RingBuffer(base=4, capacity=8)
+    for seq_num in range(4, 11):
+        sender.put(seq_num, b"")
+    assert sender.select(decode_sack(payload), ack_num + 1) == [5, 6, 9]
+    # The bitmap is aligned to any start, e.g. after the sender's window slid
+    sender.advance(6)
+    assert sender.select(decode_sack(payload), ack_num + 1) == [6, 9]
+    assert encode_sack(RingBuffer().bitmap(1)) == b""
+
+
+if __name__ == "__main__":
+    test_window_wraps_around()
+    test_grow_keeps_packets()
+    test_pop_in_order_stops_at_the_first_gap()
+    test_advance_drops_packets_below_the_base()
+    test_sack_bitmap_round_trip()
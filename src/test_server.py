@@ -0,0 +1,80 @@
+import io
+from socket import *
+
+from DRTP import *
+
+
+def open_server(method="GBN"):
+    # Drive a server by handing it packets, its ACKs go to a socket of the test
+    sock = socket(AF_INET, SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sender = socket(AF_INET, SOCK_DGRAM)
+    sender.bind(("127.0.0.1", 0))
+    sinks = {}
+    ended = []
+
+    def open_session(addr, connection_id):
+        sinks[connection_id] = io.BytesIO()
+        return sinks[connection_id]
+
+    server = DRTPServer(sock, method, 16, open_session, ended.append)
+    return server, sender, sinks, ended
+
+
+def start_session(server, addr, connection_id, options=None):
+    options = {OPTION_CONNECTION_ID: connection_id.to_bytes(4, "big"), **(options or {})}
+    server.handle_packet(0, 0, 8, 0, encode_options(options), addr)
+    server.handle_packet(0, connection_id, 4, 0, b"", addr)
+
+
+def test_aborted_compressed_session():
+    server, sender, sinks, ended = open_server()
+    addr = sender.getsockname()
+    compression = {OPTION_COMPRESSION: CODEC_IDS["zlib"].to_bytes(1, "big")}
+    start_session(server, addr, 1, compression)
+    # The session stops within its first block
+    server.handle_packet(1, 1, 0, 0, compress_block(b"a" * 100000, CODEC_IDS["zlib"])[:20], addr)
+    server.close()
+    assert len(ended) == 1 and ended[0].result is None
+    assert sinks[1].getvalue() == b""
+    server.sock.close()
+    sender.close()
+
+
+
+def test_failed_session_does_not_stop_the_others():
+    server, sender, sinks, ended = open_server()
+    addr = sender.getsockname()
+    compression = {OPTION_COMPRESSION: CODEC_IDS["zlib"].to_bytes(1, "big")}
+    start_session(server, addr, 1, compression)
+    start_session(server, addr, 2, compression)
+    start_session(server, addr, 3)
+
+    # A block that claims to be compressed but does not decompress, the error comes up when the sink is closed
+    corrupt = block_struct.pack(CODEC_IDS["zlib"], 100) + b"x" * 100
+    server.handle_packet(1, 1, 0, 0, corrupt, addr)
+    data = b"compressible " * 100
+    server.handle_packet(1, 2, 0, 0, compress_block(data, CODEC_IDS["zlib"]), addr)
+    assert server.handle_packet(2, 1, 2, 0, b"", addr) is None
+    assert [connection.result for connection in ended] == [None]
+    assert len(server.sessions) == 2
+
+    server.handle_packet(2, 2, 2, 0, b"", addr)
+    assert ended[1].result == len(data) and sinks[2].getvalue() == data
+
+    # An error in a timer only ends its session as well, here the delayed ACK cannot be sent
+    server.handle_packet(1, 3, 0, 0, b"data", addr)
+    session = server.sessions[(addr, 3)]
+    session.sock = socket(AF_INET, SOCK_DGRAM)
+    session.sock.close()
+    session.ack_deadline = 0.0
+    server.run_timers()
+    assert ended[2] is session and session.result is None
+    assert list(server.sessions) == [(addr, 2)]
+    server.sock.close()
+    sender.close()
+
+
+if __name__ == "__main__":
+    test_aborted_compressed_session()
+    test_failed_session_does_not_stop_the_others()
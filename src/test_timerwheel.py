@@ -0,0 +1,68 @@
+from timerwheel import *
+
+
+def new_wheel():
+    # Ticks of a second on a wheel of 8 slots, the times are relative to the tick the wheel starts at
+    wheel = TimerWheel(resolution=1.0, slots=8)
+    return wheel, float(wheel.current_tick)
+
+
+def test_timers_expire_in_their_tick():
+    wheel, start = new_wheel()
+    wheel.schedule("a", start + 2.5)
+    wheel.schedule("b", start + 3.5)
+    assert wheel.next_deadline() == start + 3
+    assert wheel.expire(start + 2.0) == []
+    assert wheel.expire(start + 3.0) == ["a"]
+    assert wheel.next_deadline() == start + 4
+    assert wheel.expire(start + 4.0) == ["b"]
+    assert len(wheel) == 0 and wheel.next_deadline() is None
+
+
+def test_timer_beyond_one_turn_waits_for_its_turn():
+    wheel, start = new_wheel()
+    # Both timers hash to the same slot, one turn of the wheel apart
+    wheel.schedule("near", start + 2.5)
+    wheel.schedule("far", start + 10.5)
+    assert wheel.expire(start + 3.0) == ["near"]
+    assert "far" in wheel
+    # The slot comes round again before the far timer's turn, nothing expires early
+    assert wheel.expire(start + 8.0) == []
+    assert wheel.expire(start + 11.0) == ["far"]
+
+
+def test_expire_after_more_than_a_turn():
+    wheel, start = new_wheel()
+    for i in range(20):
+        wheel.schedule(i, start + i + 0.5)
+    assert sorted(wheel.expire(start + 100.0)) == list(range(20))
+    assert len(wheel) == 0
+
+
+def test_cancel_and_reschedule():
+    wheel, start = new_wheel()
+    wheel.schedule("a", start + 1.5)
+    wheel.schedule("b", start + 1.5)
+    wheel.cancel("a")
+    wheel.cancel("missing")
+    # Moving a timer takes it out of its old slot
+    wheel.schedule("b", start + 5.5)
+    assert "a" not in wheel and len(wheel) == 1
+    assert wheel.expire(start + 2.0) == []
+    assert wheel.expire(start + 6.0) == ["b"]
+
+
+def test_past_deadline_expires_next():
+    wheel, start = new_wheel()
+    wheel.expire(start + 4.0)
+    wheel.schedule("late", start + 1.0)
+    assert wheel.next_deadline() == start + 5
+    assert wheel.expire(start + 5.0) == ["late"]
+
+
+if __name__ == "__main__":
+    test_timers_expire_in_their_tick()
+    test_timer_beyond_one_turn_waits_for_its_turn()
+    test_expire_after_more_than_a_turn()
+    test_cancel_and_reschedule()
+    test_past_deadline_expires_next()
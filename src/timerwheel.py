@@ -0,0 +1,117 @@
+import time
+
+# Number of seconds covered by one slot of the wheel
+TIMER_RESOLUTION = 0.001
+# Number of slots of the wheel, a power of two
+TIMER_SLOTS = 1024
+
+
+class TimerWheel:
+    """
+    A hashed timer wheel for the per-packet retransmission deadlines of a sender. A timer is hashed into the slot
+    of its deadline tick modulo the number of slots, so scheduling, rescheduling and cancelling a timer are O(1)
+    regardless of how many packets are in flight. expire() only visits the slots of the ticks that have passed,
+    a timer further away than one turn of the wheel stays in its slot until its turn comes. Timers fire at most
+    one resolution late
+
+    Args:
+        resolution (float): The number of seconds covered by one slot
+        slots (int): The number of slots, a power of two
+    """
+
+    def __init__(self, resolution=TIMER_RESOLUTION, slots=TIMER_SLOTS):
+        self.resolution = resolution
+        self.mask = slots - 1
+        self.slots = [{} for _ in range(slots)]     # Deadlines of the timers in each slot, keyed by timer
+        self.timers = {}                            # Slot of every scheduled timer
+        self.current_tick = int(time.monotonic() / resolution)     # The oldest tick that has not fully passed
+        self.first_tick = None      # No slot between current_tick and first_tick has a timer, None if unknown
+
+    def __len__(self):
+        return len(self.timers)
+
+    def __contains__(self, key):
+        return key in self.timers
+
+    def schedule(self, key, deadline):
+        """
+        Starts a timer, or moves it if it is already running
+
+        Args:
+            key (hashable): The timer, e.g. the sequence number of a packet
+            deadline (float): When the timer expires, on the time.monotonic() clock
+
+        Returns:
+            None
+        """
+        index = self.timers.get(key)
+        if index is not None:
+            del self.slots[index][key]
+
+        # A deadline that already passed goes into the slot that expires next
+        tick = max(int(deadline / self.resolution), self.current_tick)
+        index = tick & self.mask
+        self.slots[index][key] = deadline
+        self.timers[key] = index
+        if self.first_tick is not None and tick < self.first_tick:
+            self.first_tick = tick
+
+    def cancel(self, key):
+        """
+        Stops a timer, if it is running
+
+        Args:
+            key (hashable): The timer
+
+        Returns:
+            None
+        """
+        index = self.timers.pop(key, None)
+        if index is not None:
+            del self.slots[index][key]
+
+    def expire(self, now):
+        """
+        Removes and returns the timers that have expired
+
+        Args:
+            now (float): The current time on the time.monotonic() clock
+
+        Returns:
+            list: The expired timers
+        """
+        expired = []
+        end_tick = int(now / self.resolution)
+        # Every slot is visited once at most, even if more than a turn of the wheel has passed
+        for tick in range(self.current_tick, min(end_tick, self.current_tick + len(self.slots))):
+            slot = self.slots[tick & self.mask]
+            if not slot:
+                continue
+            for key, deadline in list(slot.items()):
+                if deadline <= now:
+                    del slot[key]
+                    del self.timers[key]
+                    expired.append(key)
+
+        if end_tick > self.current_tick:
+            self.current_tick = end_tick
+        return expired
+
+    def next_deadline(self):
+        """
+        Returns when expire() should be called next. The search for the first slot with a timer resumes where
+        the last one ended, so it is amortised O(1). The time may be early if the timers in that slot belong to
+        a later turn of the wheel, expire() then finds nothing
+
+        Returns:
+            float or None: The end of the first tick with a timer, None if no timer is running
+        """
+        if not self.timers:
+            return None
+
+        start = self.current_tick if self.first_tick is None else max(self.first_tick, self.current_tick)
+        for tick in range(start, start + len(self.slots)):
+            if self.slots[tick & self.mask]:
+                self.first_tick = tick
+                return (tick + 1) * self.resolution
+        return None